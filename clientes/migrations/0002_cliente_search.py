@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:04
+
+import unicodedata
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# Copia de clientes.models.normalize_search_text a la fecha de la migración
+def normalize_search_text(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def backfill_nombre_busqueda(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    batch = []
+    for cliente in Cliente.objects.only('pk', 'nombre').iterator(chunk_size=2000):
+        cliente.nombre_busqueda = normalize_search_text(cliente.nombre)
+        batch.append(cliente)
+        if len(batch) >= 2000:
+            Cliente.objects.bulk_update(batch, ['nombre_busqueda'])
+            batch = []
+    if batch:
+        Cliente.objects.bulk_update(batch, ['nombre_busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='cliente',
+            name='nombre_busqueda',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Nombre para Búsqueda'),
+        ),
+        migrations.RunPython(backfill_nombre_busqueda, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nombre_busqueda'], name='clientes_nombre_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('codigo'), name='text_pattern_ops'), name='clientes_codigo_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('ruc_dni'), name='text_pattern_ops'), name='clientes_ruc_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nombre_busqueda'], name='clientes_nombre_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('codigo'), name='gin_trgm_ops'), name='clientes_codigo_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('ruc_dni'), name='gin_trgm_ops'), name='clientes_ruc_trgm_idx'),
+        ),
+    ]
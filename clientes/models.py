@@ -1,4 +1,16 @@
+import unicodedata
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
+
+
+def normalize_search_text(text):
+    """Minúsculas, sin tildes y con espacios simples (para búsquedas)."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
 
 class Cliente(models.Model):
     """
@@ -18,6 +30,8 @@ class Cliente(models.Model):
     # Información básica
     codigo = models.CharField(max_length=20, unique=True, verbose_name='Código')
     nombre = models.CharField(max_length=200, verbose_name='Nombre o Razón Social')
+    # Nombre normalizado (sin tildes, minúsculas), mantenido en save()
+    nombre_busqueda = models.CharField(max_length=200, editable=False, default='', verbose_name='Nombre para Búsqueda')
     tipo = models.CharField(max_length=10, choices=TIPO_CLIENTE, default='natural', verbose_name='Tipo')
     
     # Información de contacto
@@ -54,6 +68,24 @@ class Cliente(models.Model):
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
         ordering = ['nombre']
+        indexes = [
+            # Prefijos (LIKE 'x%') sin depender de la collation; código y RUC/DNI
+            # sobre UPPER(), que es lo que comparan iexact/istartswith/icontains
+            models.Index(fields=['nombre_busqueda'], name='clientes_nombre_prefix_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(OpClass(Upper('codigo'), name='text_pattern_ops'), name='clientes_codigo_prefix_idx'),
+            models.Index(OpClass(Upper('ruc_dni'), name='text_pattern_ops'), name='clientes_ruc_prefix_idx'),
+            # Similitud y subcadenas (pg_trgm)
+            GinIndex(fields=['nombre_busqueda'], name='clientes_nombre_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(OpClass(Upper('codigo'), name='gin_trgm_ops'), name='clientes_codigo_trgm_idx'),
+            GinIndex(OpClass(Upper('ruc_dni'), name='gin_trgm_ops'), name='clientes_ruc_trgm_idx'),
+        ]
     
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
+
+    def save(self, *args, **kwargs):
+        self.nombre_busqueda = normalize_search_text(self.nombre)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nombre' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nombre_busqueda'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,73 @@
+"""
+Búsqueda de clientes con ranking para el autocompletado.
+
+Los resultados se arman por niveles, cada uno servido por un índice y con
+LIMIT, y se detiene en cuanto se completa el límite:
+
+1. Coincidencia exacta de código o RUC/DNI, sin distinguir mayúsculas
+   (índices text_pattern_ops sobre UPPER()).
+2. Prefijo del nombre normalizado, sin tildes (índice varchar_pattern_ops,
+   recorrido en orden: el LIMIT corta temprano).
+3. Prefijo de código o RUC/DNI, sin distinguir mayúsculas (mismos índices).
+4. Subcadena de código o RUC/DNI (GIN gin_trgm_ops sobre UPPER()).
+5. Similitud por trigramas o subcadena del nombre normalizado (GIN
+   gin_trgm_ops), ordenado por similitud. Fuera de PostgreSQL se usa
+   `contains` sobre el nombre normalizado.
+
+Los niveles de subcadena requieren al menos MIN_FUZZY_LENGTH caracteres:
+con menos, los índices de trigramas no sirven.
+"""
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import Q
+
+from .models import Cliente, normalize_search_text
+
+
+RESULT_FIELDS = ('id', 'codigo', 'nombre')
+MIN_FUZZY_LENGTH = 3
+
+
+def _ranked_querysets(q, limit):
+    q = (q or '').strip()
+    term = normalize_search_text(q)
+    qs = Cliente.objects.order_by()
+    if not term:
+        yield qs.order_by('nombre')[:limit]
+        return
+    yield qs.filter(Q(codigo__iexact=q) | Q(ruc_dni__iexact=q))[:limit]
+    yield qs.filter(nombre_busqueda__startswith=term).order_by('nombre_busqueda')[:limit]
+    yield qs.filter(Q(codigo__istartswith=q) | Q(ruc_dni__istartswith=q)).order_by('codigo')[:limit]
+    if len(term) < MIN_FUZZY_LENGTH:
+        return
+    yield qs.filter(Q(codigo__icontains=q) | Q(ruc_dni__icontains=q)).order_by('codigo')[:limit]
+    if connections[qs.db].vendor == 'postgresql':
+        yield (
+            qs.filter(Q(nombre_busqueda__trigram_similar=term) | Q(nombre_busqueda__contains=term))
+            .annotate(similarity=TrigramSimilarity('nombre_busqueda', term))
+            .order_by('-similarity', 'nombre_busqueda')[:limit]
+        )
+    else:
+        yield qs.filter(nombre_busqueda__contains=term).order_by('nombre_busqueda')[:limit]
+
+
+def search_clientes(q, limit=20):
+    """Retorna hasta `limit` dicts (id, codigo, nombre) en orden de relevancia."""
+    results = {}
+    for qs in _ranked_querysets(q, limit):
+        for row in qs.values(*RESULT_FIELDS):
+            results.setdefault(row['id'], row)
+        if len(results) >= limit:
+            break
+    return list(results.values())[:limit]
+
+
+async def asearch_clientes(q, limit=20):
+    """Versión async de search_clientes (ORM async)."""
+    results = {}
+    for qs in _ranked_querysets(q, limit):
+        async for row in qs.values(*RESULT_FIELDS):
+            results.setdefault(row['id'], row)
+        if len(results) >= limit:
+            break
+    return list(results.values())[:limit]
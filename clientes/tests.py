@@ -1,3 +1,67 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Cliente
+from .search import search_clientes
+
+
+class ClienteSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for codigo, nombre, ruc_dni in (
+            ('C100', 'José Álvarez', '1790011'),
+            ('C200', 'Josefina Pérez', '1790022'),
+            ('JOS', 'Comercial Andrés', '1790033'),
+            ('C300', 'Ferretería San José', '1790044'),
+            ('C400', 'María Gómez', '1790055'),
+        ):
+            Cliente.objects.create(
+                codigo=codigo, nombre=nombre, ruc_dni=ruc_dni, direccion='Calle 1', telefono='555',
+            )
+
+    def names(self, q, limit=20):
+        return [row['nombre'] for row in search_clientes(q, limit)]
+
+    def test_exact_code_first_then_name_prefix_then_substring(self):
+        self.assertEqual(
+            self.names('JOS'),
+            ['Comercial Andrés', 'José Álvarez', 'Josefina Pérez', 'Ferretería San José'],
+        )
+
+    def test_accents_and_case_are_ignored(self):
+        self.assertEqual(self.names('JOSE ALVAREZ'), ['José Álvarez'])
+        self.assertEqual(self.names('ferreteria'), ['Ferretería San José'])
+
+    def test_code_and_id_prefix(self):
+        self.assertEqual(
+            self.names('C'),
+            ['Comercial Andrés', 'José Álvarez', 'Josefina Pérez', 'Ferretería San José', 'María Gómez'],
+        )
+        self.assertEqual(self.names('1790055'), ['María Gómez'])
+
+    def test_code_match_ignores_case(self):
+        for codigo, nombre, ruc_dni in (('ABC-01', 'Zeta Comercial', '1790066'), ('C500', 'Abc-01 Ltda', '1790077')):
+            Cliente.objects.create(codigo=codigo, nombre=nombre, ruc_dni=ruc_dni, direccion='Calle 1', telefono='555')
+        self.assertEqual(self.names('abc-01'), ['Zeta Comercial', 'Abc-01 Ltda'])
+        self.assertEqual(self.names('abc'), ['Abc-01 Ltda', 'Zeta Comercial'])
+
+    def test_code_and_id_substring(self):
+        self.assertEqual(self.names('0044'), ['Ferretería San José'])
+        self.assertEqual(self.names('400'), ['María Gómez'])
+
+    def test_stops_once_the_limit_is_filled(self):
+        # Código exacto y prefijo del nombre bastan: no se consultan los demás niveles
+        with self.assertNumQueries(2):
+            self.assertEqual(self.names('JOS', limit=2), ['Comercial Andrés', 'José Álvarez'])
+
+    def test_saving_the_name_refreshes_the_search_column(self):
+        cliente = Cliente.objects.get(codigo='C400')
+        cliente.nombre = 'Ánibal Ruiz'
+        cliente.save(update_fields=['nombre'])
+        self.assertEqual(self.names('anibal'), ['Ánibal Ruiz'])
+
+    def test_autocomplete_endpoint(self):
+        response = self.client.get(reverse('clientes:api_buscar'), {'q': 'maria'})
+        self.assertEqual(response.json(), {
+            'results': [{'id': Cliente.objects.get(codigo='C400').pk, 'text': 'C400 - María Gómez'}],
+        })
@@ -2,7 +2,7 @@ from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from .models import Cliente
 from django.http import JsonResponse
-from django.db.models import Q
+from .search import asearch_clientes
 
 
 class ClienteListView(ListView):
@@ -33,17 +33,15 @@ class ClienteDeleteView(DeleteView):
     success_url = reverse_lazy('clientes:list')
 
 
-def clientes_search(request):
-    q = request.GET.get('q', '').strip()
-    qs = Cliente.objects.all()
-    if q:
-        qs = qs.filter(Q(nombre__icontains=q) | Q(codigo__icontains=q) | Q(ruc_dni__icontains=q))
+async def clientes_search(request):
+    # Vista async: bajo ASGI la espera a la base no ocupa un hilo por petición
+    rows = await asearch_clientes(request.GET.get('q', ''), limit=20)
     results = [
         {
-            'id': c.id,
-            'text': f"{c.codigo} - {c.nombre}",
+            'id': c['id'],
+            'text': f"{c['codigo']} - {c['nombre']}",
         }
-        for c in qs.order_by('nombre')[:20]
+        for c in rows
     ]
     return JsonResponse({'results': results})
 
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Aplicaciones personalizadas
     'clientes',
     'productos',
@@ -94,6 +95,28 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Con varios workers conviene una caché compartida, p. ej.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y
+# CACHE_LOCATION=redis://127.0.0.1:6379/1. Sin configurar, cada proceso tiene la suya.
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Segundos en caché de impuestos, tramos de precio y árbol de categorías. Las
+# señales solo limpian la caché que ve el proceso que hizo el cambio: con la
+# caché local los demás workers dependen de que la entrada venza.
+CATALOG_CACHE_TIMEOUT = config(
+    'CATALOG_CACHE_TIMEOUT', default=30 if CACHE_BACKEND.endswith('LocMemCache') else 3600, cast=int,
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,6 +158,9 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Hilos para generar miniaturas y variantes de ProductImage (0 = en línea)
+PRODUCT_IMAGE_WORKERS = config('PRODUCT_IMAGE_WORKERS', default=2, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -20,6 +20,7 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('clientes/', include('clientes.urls', namespace='clientes')),
+    path('inventario/', include('inventario.urls', namespace='inventario')),
     path('facturas/', include('facturas.urls', namespace='facturas')),
     path('productos/', include('productos.urls', namespace='productos')),
 ]
@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import Invoice, InvoicePayment, InvoiceLineItem, LineItemTax
+from .models import (
+    Invoice,
+    InvoicePayment,
+    InvoiceLineItem,
+    LineItemTax,
+    InvoiceSequence,
+    InvoiceNumberBlock,
+    InvoiceNumberGap,
+)
+from .services import autofill_line_items, deferred_invoice_recalc
 
 
 class LineItemTaxInline(admin.TabularInline):
@@ -15,11 +24,22 @@ class InvoiceLineItemInline(admin.TabularInline):
 
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
-    list_display = ("number", "date", "customer", "warehouse", "status", "total")
+    list_display = ("number", "date", "customer", "warehouse", "status", "total", "amount_paid", "balance_due")
     list_filter = ("status", "warehouse")
     search_fields = ("number", "customer__nombre", "customer__codigo")
     inlines = [InvoiceLineItemInline]
 
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not InvoiceLineItem:
+            return super().save_formset(request, form, formset, change)
+        with deferred_invoice_recalc():
+            instances = formset.save(commit=False)
+            for obj in formset.deleted_objects:
+                obj.delete()
+            for instance in autofill_line_items(instances):
+                instance.save()
+            formset.save_m2m()
+
 
 @admin.register(InvoicePayment)
 class InvoicePaymentAdmin(admin.ModelAdmin):
@@ -33,7 +53,47 @@ class InvoiceLineItemAdmin(admin.ModelAdmin):
     list_display = ("invoice", "sku", "name", "quantity", "unit_price", "total")
     search_fields = ("invoice__number", "sku", "name")
 
+    def save_model(self, request, obj, form, change):
+        autofill_line_items([obj])
+        super().save_model(request, obj, form, change)
+
 
 @admin.register(LineItemTax)
 class LineItemTaxAdmin(admin.ModelAdmin):
     list_display = ("line_item", "name", "tax_type", "rate", "amount")
+
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ("code", "name", "warehouse", "prefix", "next_number", "block_size", "is_active")
+    list_filter = ("is_active", "warehouse")
+    search_fields = ("code", "name", "prefix")
+
+    def get_readonly_fields(self, request, obj=None):
+        # Solo al crear: los bloques avanzan next_number en la base y un
+        # formulario viejo lo haría retroceder (números duplicados)
+        if obj is not None:
+            return ("next_number",)
+        return ()
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=[
+                f.name for f in obj._meta.concrete_fields if not f.primary_key and f.name != "next_number"
+            ])
+        else:
+            super().save_model(request, obj, form, change)
+
+
+@admin.register(InvoiceNumberBlock)
+class InvoiceNumberBlockAdmin(admin.ModelAdmin):
+    list_display = ("sequence", "first_number", "last_number", "host", "pid", "reserved_at", "released_at")
+    list_filter = ("sequence",)
+    readonly_fields = ("sequence", "first_number", "last_number", "host", "pid", "reserved_at", "released_at")
+
+
+@admin.register(InvoiceNumberGap)
+class InvoiceNumberGapAdmin(admin.ModelAdmin):
+    list_display = ("sequence", "first_number", "last_number", "reason", "detected_at")
+    list_filter = ("sequence", "reason")
+    readonly_fields = ("sequence", "first_number", "last_number", "reason", "detected_at")
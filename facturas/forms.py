@@ -1,6 +1,6 @@
 from django import forms
 from django.forms import inlineformset_factory
-from .models import Invoice, InvoiceLineItem
+from .models import Invoice, InvoiceLineItem, InvoiceSequence
 
 
 class InvoiceForm(forms.ModelForm):
@@ -8,6 +8,22 @@ class InvoiceForm(forms.ModelForm):
         model = Invoice
         fields = ['number', 'customer', 'warehouse', 'currency', 'status', 'notes']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Vacío = se asigna desde la secuencia de la bodega al guardar
+        self.fields['number'].required = False
+        self.fields['number'].help_text = 'Dejar vacío para numerar automáticamente'
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get('number') and not self.instance.number and cleaned.get('warehouse'):
+            from .numbering import resolve_sequence
+            try:
+                resolve_sequence(warehouse_id=cleaned['warehouse'].pk)
+            except InvoiceSequence.DoesNotExist:
+                self.add_error('number', 'No hay secuencia de numeración activa para esta bodega; ingrese el número.')
+        return cleaned
+
 
 class InvoiceLineItemForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from facturas.models import InvoiceSequence, InvoiceNumberGap
+from facturas.numbering import find_number_gaps
+
+
+class Command(BaseCommand):
+    help = 'Detecta números de factura reservados que no se usaron y opcionalmente los registra como saltos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sequence', help='Código de la secuencia a auditar (por defecto todas)')
+        parser.add_argument(
+            '--older-than', type=float, default=24,
+            help='Solo bloques reservados hace más de N horas (los recientes pueden estar en uso). Por defecto 24.',
+        )
+        parser.add_argument('--record', action='store_true', help='Registrar los saltos nuevos en InvoiceNumberGap')
+
+    def handle(self, *args, **options):
+        sequences = InvoiceSequence.objects.all()
+        if options['sequence']:
+            sequences = sequences.filter(code=options['sequence'])
+            if not sequences.exists():
+                raise CommandError(f"No existe la secuencia {options['sequence']}")
+        reserved_before = timezone.now() - timedelta(hours=options['older_than'])
+
+        for sequence in sequences:
+            gaps = find_number_gaps(sequence, reserved_before=reserved_before)
+            known = set(sequence.gaps.values_list('first_number', 'last_number'))
+            new_gaps = [gap for gap in gaps if gap not in known]
+            self.stdout.write(f"{sequence.code}: {len(gaps)} saltos ({len(new_gaps)} sin registrar)")
+            for first_number, last_number in gaps:
+                self.stdout.write(f"  {sequence.format_number(first_number)} - {sequence.format_number(last_number)}")
+            if options['record'] and new_gaps:
+                InvoiceNumberGap.objects.bulk_create([
+                    InvoiceNumberGap(sequence=sequence, first_number=first, last_number=last, reason='unused')
+                    for first, last in new_gaps
+                ])
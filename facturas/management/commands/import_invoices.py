@@ -0,0 +1,319 @@
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from clientes.models import Cliente
+from inventario.models import Warehouse
+from productos.models import DiscountType, Product, ProductPresentation
+from facturas.models import Invoice, InvoiceLineItem, InvoicePayment, InvoiceStatus, LineItemTax, PaymentMethod
+from facturas.numbering import allocate_invoice_number
+from facturas.services import post_invoice_to_stock
+from facturas.taxes import build_line_taxes
+
+
+class RecordError(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa facturas desde un archivo JSONL (una factura por línea, con sus '
+        '"lines" y "payments") usando bulk_create por bloques.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo JSONL')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Facturas por transacción (por defecto 500)')
+        parser.add_argument('--offset', type=int, default=0, help='Número de líneas del archivo a omitir (reanudar)')
+        parser.add_argument('--checkpoint', help='Archivo donde se guarda el offset del último bloque confirmado')
+        parser.add_argument(
+            '--post', action='store_true',
+            help='Descontar stock y registrar kardex de las facturas emitidas, en la misma transacción de cada bloque',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero')
+
+        offset = options['offset']
+        if options['checkpoint'] and not offset:
+            try:
+                with open(options['checkpoint']) as fh:
+                    offset = int(fh.read().strip() or 0)
+            except FileNotFoundError:
+                pass
+
+        self.warehouses = dict(Warehouse.objects.values_list('code', 'pk'))
+        self.customers = {}
+        self.presentations = {}
+        self.products = {}
+        self.imported = self.skipped = self.failed = 0
+        self.post = options['post']
+        started = time.monotonic()
+
+        try:
+            fh = open(options['path'], encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(str(exc))
+        with fh:
+            lines = enumerate(islice(fh, offset, None), start=offset + 1)
+            while True:
+                chunk = list(islice(lines, chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+                offset = chunk[-1][0]
+                if options['checkpoint']:
+                    with open(options['checkpoint'], 'w') as cp:
+                        cp.write(str(offset))
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"línea {offset}: {self.imported} importadas, {self.skipped} existentes, "
+                    f"{self.failed} con error ({self.imported / elapsed if elapsed else 0:.0f} facturas/s)"
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo: {self.imported} facturas en {elapsed:.1f}s. Reanudar con --offset {offset}"
+        ))
+
+    # ------------------------------------------------------------------
+    # Resolución en memoria (se completa por bloque con consultas __in)
+    # ------------------------------------------------------------------
+    def load_lookups(self, records):
+        customer_codes = {r.get('customer') for r in records} - set(self.customers) - {None}
+        if customer_codes:
+            self.customers.update(Cliente.objects.filter(codigo__in=customer_codes).values_list('codigo', 'pk'))
+            missing = customer_codes - set(self.customers)
+            if missing:
+                self.customers.update(Cliente.objects.filter(ruc_dni__in=missing).values_list('ruc_dni', 'pk'))
+
+        skus = {line.get('sku') for r in records for line in r.get('lines', [])}
+        skus -= set(self.presentations) | set(self.products) | {None}
+        if skus:
+            for row in ProductPresentation.objects.filter(sku__in=skus).values_list(
+                'sku', 'pk', 'product_id', 'name', 'product__name', 'unit_of_measure', 'base_price',
+            ):
+                self.presentations[row[0]] = row[1:]
+            missing = skus - set(self.presentations)
+            if missing:
+                for row in Product.objects.filter(sku__in=missing).values_list(
+                    'sku', 'pk', 'name', 'unit_of_measure', 'base_price',
+                ):
+                    self.products[row[0]] = row[1:]
+
+    def build_invoice(self, record):
+        try:
+            warehouse_id = self.warehouses[record['warehouse']]
+        except KeyError:
+            raise RecordError(f"bodega desconocida {record.get('warehouse')!r}")
+        customer_id = self.customers.get(record.get('customer'))
+        if customer_id is None:
+            raise RecordError(f"cliente desconocido {record.get('customer')!r}")
+        status = record.get('status', InvoiceStatus.DRAFT)
+        if status not in InvoiceStatus.values:
+            raise RecordError(f"estado inválido {status!r}")
+
+        invoice = Invoice(
+            number=record.get('number') or '',
+            customer_id=customer_id,
+            warehouse_id=warehouse_id,
+            currency=record.get('currency', 'COP'),
+            status=status,
+            notes=record.get('notes', ''),
+        )
+        date = record.get('date')
+        try:
+            invoice._import_date = parse_datetime(date) if date else None
+        except (ValueError, TypeError):
+            invoice._import_date = None
+        if date and invoice._import_date is None:
+            raise RecordError(f"fecha inválida {date!r}")
+
+        items = []
+        for data in record.get('lines', []):
+            sku = data.get('sku')
+            try:
+                quantity = self.decimal(data['quantity'])
+                item = InvoiceLineItem(
+                    sku=sku or '',
+                    quantity=quantity,
+                    discount_type=self.discount_type(data.get('discount_type')),
+                    discount_value=self.decimal(data.get('discount_value', '0.00')),
+                    discount_reason=data.get('discount_reason', ''),
+                    description=data.get('description', ''),
+                    batch_number=data.get('batch_number', ''),
+                    serial_number=data.get('serial_number', ''),
+                )
+                unit_price = data.get('unit_price')
+                if sku in self.presentations:
+                    presentation_id, product_id, pres_name, product_name, unit, base_price = self.presentations[sku]
+                    item.presentation_id = presentation_id
+                    item.presentation_name = pres_name
+                elif sku in self.products:
+                    product_id, product_name, unit, base_price = self.products[sku]
+                else:
+                    raise RecordError(f"SKU desconocido {sku!r}")
+                item.product_id = product_id
+                item.name = data.get('name') or product_name
+                item.unit_of_measure = data.get('unit_of_measure') or unit
+                item.unit_price = self.decimal(unit_price) if unit_price not in (None, '') else base_price
+            except (KeyError, InvalidOperation, TypeError, ValueError) as exc:
+                raise RecordError(f"línea inválida {data!r}: {exc}")
+            items.append(item)
+
+        try:
+            payments = [
+                InvoicePayment(method=p['method'], amount=self.decimal(p['amount']), reference=p.get('reference', ''))
+                for p in record.get('payments', [])
+            ]
+        except (KeyError, InvalidOperation, TypeError, ValueError) as exc:
+            raise RecordError(f"pago inválido: {exc}")
+        for payment in payments:
+            if payment.method not in PaymentMethod.values:
+                raise RecordError(f"método de pago inválido {payment.method!r}")
+        # bulk_create no dispara las señales de pagos
+        invoice.amount_paid = sum((p.amount for p in payments), Decimal('0.00'))
+        return invoice, items, payments
+
+    @staticmethod
+    def check_shape(record):
+        """Valida la forma del registro antes de resolver nada sobre él."""
+        if not isinstance(record, dict):
+            raise RecordError(f"se esperaba un objeto, no {type(record).__name__}")
+        for key in ('lines', 'payments'):
+            entries = record.get(key, [])
+            if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+                raise RecordError(f"{key!r} debe ser una lista de objetos")
+        keys = [record.get('number'), record.get('warehouse'), record.get('customer')]
+        keys += [line.get('sku') for line in record.get('lines', [])]
+        if any(isinstance(key, (list, dict)) for key in keys):
+            raise RecordError('número, bodega, cliente y SKU deben ser valores simples')
+
+    @staticmethod
+    def decimal(value):
+        """Decimal finito; NaN e Infinity no son importes válidos."""
+        value = Decimal(str(value))
+        if not value.is_finite():
+            raise ValueError(f"valor no finito {value}")
+        return value
+
+    @staticmethod
+    def discount_type(value):
+        if value and value not in DiscountType.values:
+            raise RecordError(f"tipo de descuento inválido {value!r}")
+        return value or None
+
+    @staticmethod
+    def set_totals(invoice, items):
+        """Totales de cabecera a partir de las líneas ya calculadas con impuestos."""
+        invoice.subtotal = sum((i.subtotal for i in items), Decimal('0.00'))
+        invoice.total_discount = sum((i.discount_amount for i in items), Decimal('0.00'))
+        invoice.total_tax = sum((i.total_tax for i in items), Decimal('0.00'))
+        invoice.total = invoice.subtotal + invoice.total_tax
+        invoice.balance_due = invoice.total - invoice.amount_paid
+
+    # ------------------------------------------------------------------
+    def import_chunk(self, chunk):
+        records = []
+        for lineno, raw in chunk:
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError as exc:
+                self.report_error(lineno, f"JSON inválido: {exc}")
+                continue
+            try:
+                self.check_shape(record)
+            except RecordError as exc:
+                self.report_error(lineno, str(exc))
+                continue
+            records.append((lineno, record))
+        self.load_lookups([r for _, r in records])
+
+        built = []
+        for lineno, record in records:
+            try:
+                built.append(self.build_invoice(record))
+            except (RecordError, ValueError, TypeError, AttributeError) as exc:
+                # Un registro malo se reporta y el bloque sigue
+                self.report_error(lineno, str(exc))
+
+        numbers = [inv.number for inv, _, _ in built if inv.number]
+        existing = set(Invoice.objects.filter(number__in=numbers).values_list('number', flat=True))
+        seen = set()
+        fresh = []
+        for entry in built:
+            number = entry[0].number
+            if number and (number in existing or number in seen):
+                self.skipped += 1
+                continue
+            seen.add(number)
+            fresh.append(entry)
+        if not fresh:
+            return
+
+        # Impuestos de todo el bloque de una vez (una resolución por bloque)
+        taxes = build_line_taxes([item for _, invoice_items, _ in fresh for item in invoice_items])
+        for invoice, invoice_items, _ in fresh:
+            self.set_totals(invoice, invoice_items)
+        self.assign_numbers([inv for inv, _, _ in fresh if not inv.number], seen)
+
+        with transaction.atomic():
+            invoices = Invoice.objects.bulk_create([inv for inv, _, _ in fresh])
+            # auto_now_add pisa la fecha al insertar; restaurar la original
+            dated = []
+            for invoice in invoices:
+                if invoice._import_date:
+                    invoice.date = invoice.created_at = invoice._import_date
+                    dated.append(invoice)
+            if dated:
+                Invoice.objects.bulk_update(dated, ['date', 'created_at'])
+
+            items, payments = [], []
+            for invoice, invoice_items, invoice_payments in fresh:
+                for item in invoice_items:
+                    item.invoice_id = invoice.pk
+                    items.append(item)
+                for payment in invoice_payments:
+                    payment.invoice_id = invoice.pk
+                    payments.append(payment)
+            InvoiceLineItem.objects.bulk_create(items)
+            LineItemTax.objects.bulk_create(taxes)
+            InvoicePayment.objects.bulk_create(payments)
+
+            # Dentro del bloque: al reanudar desde el checkpoint no quedan facturas sin emitir
+            if self.post:
+                for invoice in invoices:
+                    if invoice.status == InvoiceStatus.POSTED:
+                        post_invoice_to_stock(invoice)
+
+        self.imported += len(invoices)
+
+    @staticmethod
+    def assign_numbers(invoices, taken):
+        """
+        Numera desde la secuencia las facturas que no traen número. Los números
+        que ya existen en la tabla o en el bloque (p. ej. facturas importadas
+        antes con número propio) se descartan y se toma el siguiente.
+        """
+        pending = invoices
+        while pending:
+            for invoice in pending:
+                invoice.number = allocate_invoice_number(warehouse_id=invoice.warehouse_id)
+            numbers = {invoice.number for invoice in pending}
+            clashes = set(Invoice.objects.filter(number__in=numbers).values_list('number', flat=True))
+            clashes |= numbers & taken
+            taken |= numbers - clashes
+            pending = [invoice for invoice in pending if invoice.number in clashes]
+
+    def report_error(self, lineno, message):
+        self.failed += 1
+        self.stderr.write(f"línea {lineno}: {message}")
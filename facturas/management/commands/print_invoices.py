@@ -0,0 +1,103 @@
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dtime, timedelta
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.dateparse import parse_date
+from django.utils.timezone import make_aware
+
+# Los modelos se importan dentro de las funciones: con el método 'spawn'
+# (macOS, Windows) el hijo importa este módulo antes de _init_worker, y
+# todavía no hay apps cargadas.
+
+
+def _render_pages(invoice_ids):
+    """Worker: flujos de página de un grupo de facturas (para el PDF combinado)."""
+    from facturas.pdf import invoice_queryset, render_invoice_pages
+
+    return [
+        (invoice.pk, render_invoice_pages(invoice))
+        for invoice in invoice_queryset().filter(pk__in=invoice_ids)
+    ]
+
+
+def _cache_pdfs(invoice_ids):
+    """Worker: asegura el PDF en caché de cada factura y retorna (número, ruta)."""
+    from facturas.pdf import get_invoice_pdf, invoice_queryset
+
+    return [
+        (invoice.pk, invoice.number, str(get_invoice_pdf(invoice)))
+        for invoice in invoice_queryset().filter(pk__in=invoice_ids)
+    ]
+
+
+def _init_worker():
+    # Con 'spawn' el hijo arranca sin Django configurado; con 'fork' ya lo
+    # está. En ambos casos abre su propia conexión.
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Genera en lote los PDF de las facturas emitidas de un rango de fechas (un PDF combinado o un ZIP).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', required=True, help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--to', dest='date_to', required=True, help='Fecha final inclusive (AAAA-MM-DD)')
+        parser.add_argument('--output', required=True, help='Archivo de salida (.pdf o .zip)')
+        parser.add_argument('--format', choices=['pdf', 'zip'], help='Por defecto según la extensión de --output')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos de renderizado')
+        parser.add_argument('--batch-size', type=int, default=200, help='Facturas por tarea')
+
+    def handle(self, *args, **options):
+        from facturas.models import Invoice, InvoiceStatus
+        from facturas.pdf import build_pdf
+
+        date_from, date_to = parse_date(options['date_from']), parse_date(options['date_to'])
+        if not date_from or not date_to:
+            raise CommandError('Fechas inválidas, use AAAA-MM-DD')
+        fmt = options['format'] or ('zip' if options['output'].lower().endswith('.zip') else 'pdf')
+
+        invoice_ids = list(
+            Invoice.objects.filter(
+                status=InvoiceStatus.POSTED,
+                date__gte=make_aware(datetime.combine(date_from, dtime.min)),
+                date__lt=make_aware(datetime.combine(date_to + timedelta(days=1), dtime.min)),
+            ).order_by('date', 'id').values_list('pk', flat=True)
+        )
+        if not invoice_ids:
+            self.stdout.write('No hay facturas emitidas en el rango.')
+            return
+
+        size = max(options['batch_size'], 1)
+        batches = [invoice_ids[i:i + size] for i in range(0, len(invoice_ids), size)]
+        started = time.monotonic()
+        connections.close_all()
+        worker = _render_pages if fmt == 'pdf' else _cache_pdfs
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1), initializer=_init_worker) as pool:
+            results = {}
+            for done, batch_result in enumerate(pool.map(worker, batches), start=1):
+                for row in batch_result:
+                    results[row[0]] = row[1:]
+                self.stdout.write(f'{min(done * size, len(invoice_ids))}/{len(invoice_ids)} facturas')
+
+        if fmt == 'pdf':
+            pages = [page for pk in invoice_ids for page in results[pk][0]]
+            with open(options['output'], 'wb') as fh:
+                fh.write(build_pdf(pages))
+        else:
+            with zipfile.ZipFile(options['output'], 'w', compression=zipfile.ZIP_STORED) as zf:
+                for pk in invoice_ids:
+                    number, path = results[pk]
+                    zf.write(path, arcname=f'factura-{number}.pdf')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(invoice_ids)} facturas en {elapsed:.1f}s -> {options['output']}"
+        ))
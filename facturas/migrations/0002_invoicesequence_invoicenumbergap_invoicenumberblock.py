@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0001_initial'),
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(help_text='Ej: W1-CAJA1', max_length=20, unique=True, verbose_name='Código')),
+                ('name', models.CharField(blank=True, max_length=100, verbose_name='Nombre')),
+                ('prefix', models.CharField(blank=True, help_text='Ej: F001-', max_length=10, verbose_name='Prefijo')),
+                ('padding', models.PositiveSmallIntegerField(default=8, verbose_name='Dígitos')),
+                ('next_number', models.PositiveBigIntegerField(default=1, verbose_name='Siguiente Número Libre')),
+                ('block_size', models.PositiveIntegerField(default=50, help_text='Números reservados por proceso en cada viaje a la base de datos', verbose_name='Tamaño de Bloque')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+                ('warehouse', models.ForeignKey(blank=True, help_text='Vacío para la secuencia por defecto', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='invoice_sequences', to='inventario.warehouse', verbose_name='Bodega')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Facturas',
+                'verbose_name_plural': 'Secuencias de Facturas',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InvoiceNumberGap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_number', models.PositiveBigIntegerField(verbose_name='Desde')),
+                ('last_number', models.PositiveBigIntegerField(verbose_name='Hasta')),
+                ('reason', models.CharField(choices=[('released', 'Sobrante de bloque liberado'), ('unused', 'Detectado por auditoría')], max_length=10, verbose_name='Motivo')),
+                ('detected_at', models.DateTimeField(auto_now_add=True, verbose_name='Registrado')),
+                ('sequence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gaps', to='facturas.invoicesequence', verbose_name='Secuencia')),
+            ],
+            options={
+                'verbose_name': 'Salto de Numeración',
+                'verbose_name_plural': 'Saltos de Numeración',
+                'ordering': ['sequence', 'first_number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InvoiceNumberBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_number', models.PositiveBigIntegerField(verbose_name='Desde')),
+                ('last_number', models.PositiveBigIntegerField(verbose_name='Hasta')),
+                ('host', models.CharField(blank=True, max_length=255, verbose_name='Servidor')),
+                ('pid', models.PositiveIntegerField(blank=True, null=True, verbose_name='Proceso')),
+                ('reserved_at', models.DateTimeField(verbose_name='Reservado')),
+                ('released_at', models.DateTimeField(blank=True, null=True, verbose_name='Liberado')),
+                ('sequence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='facturas.invoicesequence', verbose_name='Secuencia')),
+            ],
+            options={
+                'verbose_name': 'Bloque de Numeración',
+                'verbose_name_plural': 'Bloques de Numeración',
+                'ordering': ['sequence', 'first_number'],
+            },
+        ),
+    ]
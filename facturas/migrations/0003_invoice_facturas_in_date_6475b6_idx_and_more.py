@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+        ('facturas', '0002_invoicesequence_invoicenumbergap_invoicenumberblock'),
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['date', 'id'], name='facturas_in_date_6475b6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'date', 'id'], name='facturas_in_status_90377e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['warehouse', 'date', 'id'], name='facturas_in_warehou_b48a6d_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:55
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_balances(apps, schema_editor):
+    Invoice = apps.get_model('facturas', 'Invoice')
+    InvoicePayment = apps.get_model('facturas', 'InvoicePayment')
+    paid = (
+        InvoicePayment.objects.filter(invoice_id=OuterRef('pk'))
+        .order_by().values('invoice_id').annotate(s=Sum('amount')).values('s')
+    )
+    Invoice.objects.update(
+        amount_paid=Coalesce(Subquery(paid), Value(Decimal('0.00')), output_field=DecimalField(max_digits=15, decimal_places=2)),
+    )
+    Invoice.objects.update(balance_due=F('total') - F('amount_paid'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+        ('facturas', '0003_invoice_facturas_in_date_6475b6_idx_and_more'),
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Pagado'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='balance_due',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Saldo'),
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('balance_due__gt', 0), ('status', 'posted')), fields=['customer', 'date'], name='facturas_inv_open_ar_idx'),
+        ),
+    ]
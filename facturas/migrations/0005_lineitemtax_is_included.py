@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0004_invoice_amount_paid_invoice_balance_due_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lineitemtax',
+            name='is_included',
+            field=models.BooleanField(default=False, verbose_name='Incluido en Precio'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
 from decimal import Decimal
 
 
@@ -15,6 +17,47 @@ class PaymentMethod(models.TextChoices):
     CREDIT = 'credit', 'Crédito'
 
 
+class InvoiceQuerySet(models.QuerySet):
+    def aggregate_totals(self):
+        """
+        Anota agg_subtotal, agg_discount y agg_tax calculados en SQL a partir
+        de las líneas y sus impuestos (subconsultas escalares, sin N+1). Los
+        impuestos incluidos en el precio se descuentan del subtotal. Cada
+        línea se redondea a centavos antes de sumar, igual que create_invoice
+        y que las columnas guardadas de la línea.
+        """
+        decimal_field = models.DecimalField(max_digits=30, decimal_places=9)
+        gross = ExpressionWrapper(F('unit_price') * F('quantity'), output_field=decimal_field)
+        discount = Case(
+            When(discount_type=DiscountType.PERCENTAGE, then=gross * F('discount_value') * Value(Decimal('0.01'))),
+            When(discount_type=DiscountType.FIXED, then=F('discount_value')),
+            default=Value(Decimal('0.00')),
+            output_field=decimal_field,
+        )
+        line_subtotal = Round(gross - discount, 2, output_field=decimal_field)
+        line_discount = Round(discount, 2, output_field=decimal_field)
+        lines = InvoiceLineItem.objects.filter(invoice_id=OuterRef('pk')).order_by().values('invoice_id')
+        taxes = LineItemTax.objects.filter(line_item__invoice_id=OuterRef('pk')).order_by().values('line_item__invoice_id')
+        zero = Value(Decimal('0.00'))
+        return self.annotate(
+            agg_subtotal=Coalesce(
+                Subquery(lines.annotate(s=Sum(line_subtotal)).values('s')),
+                zero, output_field=decimal_field,
+            ) - Coalesce(
+                Subquery(taxes.filter(is_included=True).annotate(s=Sum('amount')).values('s')),
+                zero, output_field=decimal_field,
+            ),
+            agg_discount=Coalesce(
+                Subquery(lines.annotate(s=Sum(line_discount)).values('s')),
+                zero, output_field=decimal_field,
+            ),
+            agg_tax=Coalesce(
+                Subquery(taxes.annotate(s=Sum('amount')).values('s')),
+                zero, output_field=decimal_field,
+            ),
+        )
+
+
 class Invoice(models.Model):
     """Cabecera de factura de venta"""
     number = models.CharField('Número', max_length=30, unique=True)
@@ -42,61 +85,89 @@ class Invoice(models.Model):
     total_tax = models.DecimalField('Total Impuestos', max_digits=15, decimal_places=2, default=Decimal('0.00'))
     total = models.DecimalField('Total', max_digits=15, decimal_places=2, default=Decimal('0.00'))
 
+    # Mantenidos por las señales de pagos con expresiones F (ver signals.py)
+    amount_paid = models.DecimalField('Pagado', max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    balance_due = models.DecimalField('Saldo', max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
     notes = models.TextField('Notas', blank=True)
     created_at = models.DateTimeField('Creado', auto_now_add=True)
     updated_at = models.DateTimeField('Actualizado', auto_now=True)
 
+    objects = InvoiceQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Factura'
         verbose_name_plural = 'Facturas'
         ordering = ['-date']
+        indexes = [
+            # Paginación por cursor (date, id) y sus filtros
+            models.Index(fields=['date', 'id']),
+            models.Index(fields=['status', 'date', 'id']),
+            models.Index(fields=['warehouse', 'date', 'id']),
+            # Cartera: solo facturas emitidas con saldo pendiente
+            models.Index(
+                fields=['customer', 'date'],
+                name='facturas_inv_open_ar_idx',
+                condition=models.Q(status='posted', balance_due__gt=0),
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"FAC-{self.number}"
 
     def recalculate_totals(self):
-        """Recalcula totales a partir de las líneas."""
-        agg_subtotal = Decimal('0.00')
-        agg_discount = Decimal('0.00')
-        agg_tax = Decimal('0.00')
-        for line in self.line_items.all():
-            line.calculate_totals()
-            agg_subtotal += line.subtotal
-            agg_discount += line.discount_amount
-            agg_tax += line.total_tax
-        self.subtotal = agg_subtotal
-        self.total_discount = agg_discount
-        self.total_tax = agg_tax
+        """
+        Recalcula totales a partir de las líneas.
+
+        Subtotal, descuento e impuestos se obtienen en una sola consulta
+        agregada sobre InvoiceLineItem y LineItemTax, con la misma aritmética
+        que InvoiceLineItem.calculate_totals.
+        """
+        totals = Invoice.objects.filter(pk=self.pk).aggregate_totals().values(
+            'agg_subtotal', 'agg_discount', 'agg_tax'
+        ).first() or {}
+        self.subtotal = totals.get('agg_subtotal', Decimal('0.00'))
+        self.total_discount = totals.get('agg_discount', Decimal('0.00'))
+        self.total_tax = totals.get('agg_tax', Decimal('0.00'))
         self.total = self.subtotal + self.total_tax
         return self.total
 
     def clean(self):
         from django.core.exceptions import ValidationError
         # Validar stock suficiente al emitir
-        if self.status == InvoiceStatus.POSTED:
+        if self.status == InvoiceStatus.POSTED and self.pk:
             # Cargar líneas existentes (en edición). Si es creación con formset, esta validación se aplicará al actualizar a Emitida
             insufficient = []
             # Importación perezosa para evitar ciclos
-            from inventario.models import StockItem
-            for line in self.line_items.select_related('presentation', 'product').all():
+            from inventario.services import check_stock_availability
+            requested = []
+            skus = {}
+            for presentation_id, quantity, sku, name, presentation_sku in self.line_items.values_list(
+                'presentation_id', 'quantity', 'sku', 'name', 'presentation__sku'
+            ):
                 # Requiere presentación para descontar inventario de forma precisa
-                if not line.presentation_id:
-                    insufficient.append(f"Línea {line.sku or line.name}: falta seleccionar Presentación")
+                if not presentation_id:
+                    insufficient.append(f"Línea {sku or name}: falta seleccionar Presentación")
                     continue
-                try:
-                    stock = StockItem.objects.get(warehouse=self.warehouse, presentation=line.presentation)
-                    available = stock.quantity - stock.reserved_quantity
-                    if line.quantity > available:
-                        insufficient.append(
-                            f"{line.presentation.sku}: stock insuficiente en {self.warehouse.code}. Disponible {available}, requerido {line.quantity}"
-                        )
-                except StockItem.DoesNotExist:
-                    insufficient.append(f"{line.presentation.sku}: no existe stock en bodega {self.warehouse.code}")
+                requested.append((presentation_id, quantity))
+                skus[presentation_id] = presentation_sku
+            try:
+                shortfalls = check_stock_availability(self.warehouse_id, requested, skus=skus)
+            except ValueError as exc:
+                raise ValidationError({'status': [str(exc)]})
+            insufficient += [shortfall.message(self.warehouse.code) for shortfall in shortfalls]
             if insufficient:
                 raise ValidationError({
                     'status': ['No se puede Emitir por falta de stock:'] + insufficient
                 })
 
+    def save(self, *args, **kwargs):
+        # Asignar número desde la secuencia de la bodega si no se digitó
+        if not self.number:
+            from .numbering import allocate_invoice_number
+            self.number = allocate_invoice_number(warehouse_id=self.warehouse_id)
+        super().save(*args, **kwargs)
+
 
 class InvoicePayment(models.Model):
     """Pagos aplicados a una factura"""
@@ -114,6 +185,83 @@ class InvoicePayment(models.Model):
         return f"{self.invoice.number} - {self.method}: {self.amount}"
 
 
+class InvoiceSequence(models.Model):
+    """
+    Secuencia de numeración de facturas por bodega o punto de venta.
+    Los números se reservan por bloques (ver facturas.numbering).
+    """
+    code = models.CharField('Código', max_length=20, unique=True, help_text='Ej: W1-CAJA1')
+    name = models.CharField('Nombre', max_length=100, blank=True)
+    warehouse = models.ForeignKey(
+        'inventario.Warehouse',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='invoice_sequences',
+        verbose_name='Bodega',
+        help_text='Vacío para la secuencia por defecto'
+    )
+    prefix = models.CharField('Prefijo', max_length=10, blank=True, help_text='Ej: F001-')
+    padding = models.PositiveSmallIntegerField('Dígitos', default=8)
+    next_number = models.PositiveBigIntegerField('Siguiente Número Libre', default=1)
+    block_size = models.PositiveIntegerField('Tamaño de Bloque', default=50, help_text='Números reservados por proceso en cada viaje a la base de datos')
+    is_active = models.BooleanField('Activo', default=True)
+    created_at = models.DateTimeField('Creado', auto_now_add=True)
+    updated_at = models.DateTimeField('Actualizado', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Secuencia de Facturas'
+        verbose_name_plural = 'Secuencias de Facturas'
+        ordering = ['code']
+
+    def __str__(self) -> str:
+        return f"{self.code} ({self.prefix})"
+
+    def format_number(self, number: int) -> str:
+        return f"{self.prefix}{number:0{self.padding}d}"
+
+
+class InvoiceNumberBlock(models.Model):
+    """Bloque de números reservado por un proceso (bitácora de auditoría)"""
+    sequence = models.ForeignKey(InvoiceSequence, on_delete=models.CASCADE, related_name='blocks', verbose_name='Secuencia')
+    first_number = models.PositiveBigIntegerField('Desde')
+    last_number = models.PositiveBigIntegerField('Hasta')
+    host = models.CharField('Servidor', max_length=255, blank=True)
+    pid = models.PositiveIntegerField('Proceso', null=True, blank=True)
+    reserved_at = models.DateTimeField('Reservado')
+    released_at = models.DateTimeField('Liberado', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Bloque de Numeración'
+        verbose_name_plural = 'Bloques de Numeración'
+        ordering = ['sequence', 'first_number']
+
+    def __str__(self) -> str:
+        return f"{self.sequence.code}: {self.first_number}-{self.last_number}"
+
+
+class InvoiceNumberGap(models.Model):
+    """Rango de números reservados que no llegaron a usarse"""
+    REASON = [
+        ('released', 'Sobrante de bloque liberado'),
+        ('unused', 'Detectado por auditoría'),
+    ]
+
+    sequence = models.ForeignKey(InvoiceSequence, on_delete=models.CASCADE, related_name='gaps', verbose_name='Secuencia')
+    first_number = models.PositiveBigIntegerField('Desde')
+    last_number = models.PositiveBigIntegerField('Hasta')
+    reason = models.CharField('Motivo', max_length=10, choices=REASON)
+    detected_at = models.DateTimeField('Registrado', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Salto de Numeración'
+        verbose_name_plural = 'Saltos de Numeración'
+        ordering = ['sequence', 'first_number']
+
+    def __str__(self) -> str:
+        return f"{self.sequence.code}: {self.first_number}-{self.last_number} ({self.reason})"
+
+
 # Importaciones al final para evitar ciclos entre apps
 from productos.models import (  # noqa: E402
     UnitOfMeasure,
@@ -215,8 +363,12 @@ class InvoiceLineItem(models.Model):
     def __str__(self):
         return f"{self.sku} - {self.name} x {self.quantity}"
 
-    def calculate_totals(self):
-        """Calcula subtotal, descuentos, impuestos y total"""
+    def calculate_totals(self, taxes=None):
+        """
+        Calcula subtotal, descuentos, impuestos y total.
+        `taxes` permite pasar los impuestos ya conocidos (p. ej. líneas aún no
+        guardadas en cargas masivas) en lugar de consultar line_taxes.
+        """
         subtotal_before_discount = self.unit_price * self.quantity
 
         # Calcular descuento
@@ -230,10 +382,14 @@ class InvoiceLineItem(models.Model):
         # Subtotal después de descuento
         self.subtotal = subtotal_before_discount - self.discount_amount
 
-        # Calcular impuestos
+        # Calcular impuestos (los incluidos en el precio salen del subtotal)
         self.total_tax = Decimal('0.00')
-        for tax in self.line_taxes.all():
+        if taxes is None:
+            taxes = self.line_taxes.all()
+        for tax in taxes:
             self.total_tax += tax.amount
+            if tax.is_included:
+                self.subtotal -= tax.amount
 
         # Total
         self.total = self.subtotal + self.total_tax
@@ -253,6 +409,7 @@ class LineItemTax(models.Model):
     rate = models.DecimalField('Tasa (%)', max_digits=5, decimal_places=2)
     base = models.DecimalField('Base Gravable', max_digits=15, decimal_places=2)
     amount = models.DecimalField('Monto', max_digits=15, decimal_places=2)
+    is_included = models.BooleanField('Incluido en Precio', default=False)
 
     class Meta:
         verbose_name = 'Impuesto de Línea'
@@ -0,0 +1,220 @@
+"""
+Numeración de facturas por secuencias con reserva de bloques.
+
+Cada proceso reserva bloques de `block_size` números de una secuencia y los
+entrega desde memoria, de modo que emitir un número normalmente no requiere
+viaje a la base de datos. La reserva se hace en una conexión propia de cada
+hilo (las de Django no se comparten entre hilos), fuera de la transacción de
+la factura: queda confirmada aunque esta se revierta, así ningún otro
+proceso puede recibir los mismos números.
+
+Los bloques reservados quedan en InvoiceNumberBlock; los sobrantes que un
+proceso libera se registran en InvoiceNumberGap y el comando
+`audit_invoice_numbers` detecta el resto de saltos.
+"""
+import atexit
+import os
+import socket
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .models import Invoice, InvoiceSequence, InvoiceNumberBlock, InvoiceNumberGap
+
+
+class _Block:
+    __slots__ = ('sequence_id', 'block_id', 'prefix', 'padding', 'next_number', 'last_number')
+
+    def __init__(self, sequence_id, block_id, prefix, padding, first_number, last_number):
+        self.sequence_id = sequence_id
+        self.block_id = block_id
+        self.prefix = prefix
+        self.padding = padding
+        self.next_number = first_number
+        self.last_number = last_number
+
+    @property
+    def exhausted(self):
+        return self.next_number > self.last_number
+
+
+_lock = threading.RLock()
+_pid = None
+_local = threading.local()
+_blocks = {}      # sequence_id -> _Block
+_sequences = {}   # ('warehouse', id) | ('code', code) -> sequence_id
+
+
+def _check_fork():
+    """Descarta el estado heredado de un proceso padre (p. ej. workers de gunicorn)."""
+    global _pid
+    pid = os.getpid()
+    if _pid != pid:
+        _pid = pid
+        _blocks.clear()
+        _sequences.clear()
+
+
+def _private_connection():
+    # Una por hilo y por proceso; la heredada de un fork no se cierra porque
+    # el socket sigue siendo del padre
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    return _local.connection
+
+
+def clear_sequence_cache():
+    with _lock:
+        _sequences.clear()
+
+
+def resolve_sequence(warehouse_id=None, sequence_code=None) -> int:
+    """
+    Retorna el id de la secuencia activa a usar: la indicada por código
+    (punto de venta), la de la bodega o, en su defecto, la secuencia general.
+    """
+    key = ('code', sequence_code) if sequence_code else ('warehouse', warehouse_id)
+    with _lock:
+        _check_fork()
+        if key in _sequences:
+            return _sequences[key]
+    qs = InvoiceSequence.objects.filter(is_active=True).order_by('pk')
+    if sequence_code:
+        sequence_id = qs.filter(code=sequence_code).values_list('pk', flat=True).first()
+    else:
+        sequence_id = (
+            qs.filter(warehouse_id=warehouse_id).values_list('pk', flat=True).first()
+            or qs.filter(warehouse__isnull=True).values_list('pk', flat=True).first()
+        )
+    if sequence_id is None:
+        raise InvoiceSequence.DoesNotExist('No hay una secuencia de facturas activa para asignar el número.')
+    with _lock:
+        _sequences[key] = sequence_id
+    return sequence_id
+
+
+def _reserve_block(sequence_id: int) -> _Block:
+    conn = _private_connection()
+    qn = conn.ops.quote_name
+    seq_table = qn(InvoiceSequence._meta.db_table)
+    block_table = qn(InvoiceNumberBlock._meta.db_table)
+    now = conn.ops.adapt_datetimefield_value(timezone.now())
+    conn.set_autocommit(False)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {seq_table} SET next_number = next_number + block_size "
+                f"WHERE id = %s AND is_active "
+                f"RETURNING next_number - block_size, next_number - 1, prefix, padding",
+                [sequence_id],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise InvoiceSequence.DoesNotExist(f'La secuencia {sequence_id} no existe o está inactiva.')
+            first_number, last_number, prefix, padding = row
+            cursor.execute(
+                f"INSERT INTO {block_table} (sequence_id, first_number, last_number, host, pid, reserved_at) "
+                f"VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+                [sequence_id, first_number, last_number, socket.gethostname()[:255], os.getpid(), now],
+            )
+            block_id = cursor.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+    finally:
+        if conn.connection is not None:
+            conn.set_autocommit(True)
+    return _Block(sequence_id, block_id, prefix, padding, first_number, last_number)
+
+
+def allocate_invoice_number(warehouse_id=None, sequence_code=None) -> str:
+    """Entrega el siguiente número de factura de la secuencia correspondiente."""
+    sequence_id = resolve_sequence(warehouse_id=warehouse_id, sequence_code=sequence_code)
+    with _lock:
+        _check_fork()
+        block = _blocks.get(sequence_id)
+        if block is None or block.exhausted:
+            block = _blocks[sequence_id] = _reserve_block(sequence_id)
+        number = block.next_number
+        block.next_number += 1
+        return f"{block.prefix}{number:0{block.padding}d}"
+
+
+def release_blocks():
+    """
+    Libera los bloques en memoria del proceso y registra los números no usados
+    como saltos. Se ejecuta al terminar el proceso y al modificar secuencias.
+    """
+    with _lock:
+        _check_fork()
+        blocks = list(_blocks.values())
+        _blocks.clear()
+        _sequences.clear()
+        if not blocks:
+            return
+        conn = _private_connection()
+        qn = conn.ops.quote_name
+        now = conn.ops.adapt_datetimefield_value(timezone.now())
+        with conn.cursor() as cursor:
+            for block in blocks:
+                cursor.execute(
+                    f"UPDATE {qn(InvoiceNumberBlock._meta.db_table)} SET released_at = %s WHERE id = %s",
+                    [now, block.block_id],
+                )
+                if not block.exhausted:
+                    cursor.execute(
+                        f"INSERT INTO {qn(InvoiceNumberGap._meta.db_table)} "
+                        f"(sequence_id, first_number, last_number, reason, detected_at) VALUES (%s, %s, %s, %s, %s)",
+                        [block.sequence_id, block.next_number, block.last_number, 'released', now],
+                    )
+
+
+def _release_at_exit():
+    try:
+        release_blocks()
+    except Exception:
+        # Al apagar no hay a quién reportar; la auditoría detectará el salto
+        pass
+
+
+atexit.register(_release_at_exit)
+
+
+def find_number_gaps(sequence: InvoiceSequence, reserved_before=None):
+    """
+    Compara los bloques reservados de la secuencia con los números de factura
+    emitidos y retorna los rangos (desde, hasta) no utilizados. Con
+    `reserved_before` se omiten los bloques recientes que aún pueden estar en uso.
+    """
+    blocks = sequence.blocks.order_by('first_number')
+    if reserved_before is not None:
+        blocks = blocks.filter(reserved_at__lt=reserved_before)
+    blocks = list(blocks.values_list('first_number', 'last_number'))
+    if not blocks:
+        return []
+
+    prefix = sequence.prefix
+    used = set()
+    for number in Invoice.objects.filter(number__startswith=prefix).values_list('number', flat=True).iterator():
+        suffix = number[len(prefix):]
+        if suffix.isdigit():
+            used.add(int(suffix))
+
+    gaps = []
+    for first_number, last_number in blocks:
+        start = None
+        for number in range(first_number, last_number + 1):
+            if number in used:
+                if start is not None:
+                    gaps.append((start, number - 1))
+                    start = None
+            elif start is None:
+                start = number
+        if start is not None:
+            gaps.append((start, last_number))
+    return gaps
@@ -0,0 +1,67 @@
+import json
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# Por debajo de este tamaño estimado se hace COUNT(*) exacto
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    """
+    Cuenta aproximada de filas. En PostgreSQL usa la estimación del
+    planificador (EXPLAIN) y solo recurre a COUNT(*) si el resultado es pequeño;
+    en otros motores hace el conteo exacto.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), True
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_THRESHOLD:
+        return queryset.count(), True
+    return estimate, False
+
+
+class KeysetPage:
+    """
+    Página por cursor (keyset) sobre el orden descendente (campo fecha, id).
+    Evita OFFSET: cada página filtra por la última clave de la anterior.
+    """
+
+    def __init__(self, queryset, field, per_page, cursor=None):
+        self.field = field
+        self.per_page = per_page
+        queryset = queryset.order_by(f'-{field}', '-pk')
+        after = self.decode(cursor)
+        if after is not None:
+            value, pk = after
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+        rows = list(queryset[:per_page + 1])
+        self.has_next = len(rows) > per_page
+        self.object_list = rows[:per_page]
+        self.is_first = after is None
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        last = self.object_list[-1]
+        return f"{getattr(last, self.field).isoformat()}~{last.pk}"
+
+    @staticmethod
+    def decode(cursor):
+        if not cursor:
+            return None
+        value, _, pk = cursor.rpartition('~')
+        value = parse_datetime(value) if value else None
+        if value is None or not pk.isdigit():
+            return None
+        return value, int(pk)
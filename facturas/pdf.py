@@ -0,0 +1,198 @@
+"""
+Generación de facturas en PDF sin dependencias externas.
+
+Se escribe directamente un PDF sencillo (A4, Helvetica, WinAnsiEncoding) con el
+mismo contenido que la plantilla invoice_print.html. Los PDF individuales se
+guardan en disco con una clave (id, updated_at), de modo que reimprimir una
+factura sin cambios solo lee el archivo.
+"""
+import os
+import tempfile
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Invoice
+
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 en puntos
+MARGIN = 40
+CACHE_DIR = 'invoices/pdf'
+
+# Anchos Helvetica (1/1000 em) para alinear cifras a la derecha
+_WIDTHS = {c: 556 for c in '0123456789'}
+_WIDTHS.update({'.': 278, ',': 278, '-': 333, ' ': 278, '%': 889, '$': 556})
+
+
+def _text_width(text, size):
+    return sum(_WIDTHS.get(c, 556) for c in text) * size / 1000
+
+
+def _escape(text):
+    raw = str(text).encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'').replace(b'\n', b' ')
+
+
+class _Page:
+    __slots__ = ('ops',)
+
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, y, text, size=9, bold=False, align='left'):
+        if align == 'right':
+            x -= _text_width(str(text), size)
+        font = b'/F2' if bold else b'/F1'
+        self.ops.append(b'BT %s %d Tf %.2f %.2f Td (%s) Tj ET' % (font, size, x, y, _escape(text)))
+
+    def line(self, x1, y1, x2, y2):
+        self.ops.append(b'%.2f %.2f m %.2f %.2f l S' % (x1, y1, x2, y2))
+
+    def stream(self):
+        return zlib.compress(b'0.5 w\n' + b'\n'.join(self.ops))
+
+
+def build_pdf(page_streams):
+    """Arma un documento PDF a partir de flujos de contenido ya comprimidos."""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # Pages, se completa al final
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    kids = []
+    for stream in page_streams:
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (PAGE_WIDTH, PAGE_HEIGHT, content_ref)
+        )
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def invoice_queryset():
+    return Invoice.objects.select_related('customer', 'warehouse').prefetch_related('line_items__line_taxes')
+
+
+def render_invoice_pages(invoice):
+    """Retorna los flujos de contenido (uno por página) de una factura."""
+    columns = [  # (título, x, alineación)
+        ('SKU', MARGIN, 'left'),
+        ('Descripción', MARGIN + 80, 'left'),
+        ('Cant.', 330, 'right'),
+        ('Unidad', 338, 'left'),
+        ('Precio', 440, 'right'),
+        ('Desc.', 490, 'right'),
+        ('Importe', PAGE_WIDTH - MARGIN, 'right'),
+    ]
+    date = timezone.localtime(invoice.date).strftime('%Y-%m-%d %H:%M') if invoice.date else ''
+    pages = []
+
+    def new_page():
+        page = _Page()
+        y = PAGE_HEIGHT - MARGIN
+        page.text(MARGIN, y - 12, 'Sistema de Facturación', size=14, bold=True)
+        page.text(MARGIN, y - 26, 'Documento no fiscal', size=8)
+        right = PAGE_WIDTH - MARGIN
+        page.text(right, y - 12, f'Factura: {invoice.number}', size=10, bold=True, align='right')
+        page.text(right, y - 26, f'Fecha: {date}', align='right')
+        page.text(right, y - 38, f'Estado: {invoice.get_status_display()}', align='right')
+        y -= 64
+        if not pages:
+            customer = invoice.customer
+            page.text(MARGIN, y, 'Cliente', bold=True)
+            page.text(MARGIN, y - 13, customer.nombre)
+            page.text(MARGIN, y - 25, f'{customer.codigo} · {customer.ruc_dni}', size=8)
+            page.text(MARGIN, y - 36, customer.direccion[:90], size=8)
+            page.text(320, y, 'Detalles', bold=True)
+            page.text(320, y - 13, f'Bodega: {invoice.warehouse}')
+            page.text(320, y - 25, f'Moneda: {invoice.currency}')
+            y -= 60
+        for title, x, align in columns:
+            page.text(x, y, title, bold=True, align=align)
+        page.line(MARGIN, y - 4, PAGE_WIDTH - MARGIN, y - 4)
+        pages.append(page)
+        return page, y - 16
+
+    page, y = new_page()
+    # En el orden en que se cargaron, sea cual sea el prefetch recibido
+    lines = sorted(invoice.line_items.all(), key=lambda line: line.pk)
+    for line in lines:
+        if y < MARGIN + 90:
+            page, y = new_page()
+        line.calculate_totals(taxes=line.line_taxes.all())
+        description = line.name + (f' — {line.presentation_name}' if line.presentation_name else '')
+        values = [
+            line.sku, description[:48], line.quantity, line.get_unit_of_measure_display(),
+            line.unit_price, f'{line.discount_amount:.2f}', f'{line.total:.2f}',
+        ]
+        for (_, x, align), value in zip(columns, values):
+            page.text(x, y, value, align=align)
+        y -= 14
+    if not lines:
+        page.text(MARGIN, y, 'No hay ítems.', size=8)
+        y -= 14
+
+    page.line(MARGIN, y + 8, PAGE_WIDTH - MARGIN, y + 8)
+    for label, value in (
+        ('Subtotal', invoice.subtotal),
+        ('Descuento', invoice.total_discount),
+        ('Impuestos', invoice.total_tax),
+        ('Total', invoice.total),
+    ):
+        bold = label == 'Total'
+        page.text(490, y - 6, label, bold=bold, align='right')
+        page.text(PAGE_WIDTH - MARGIN, y - 6, value, bold=bold, align='right')
+        y -= 14
+    if invoice.notes:
+        page.text(MARGIN, y - 10, f'Notas: {invoice.notes[:110]}', size=8)
+    return [p.stream() for p in pages]
+
+
+def render_invoice_pdf(invoice):
+    return build_pdf(render_invoice_pages(invoice))
+
+
+def cached_pdf_path(invoice):
+    """Ruta del PDF en caché; cambia cuando cambia updated_at."""
+    stamp = int(invoice.updated_at.timestamp() * 1_000_000)
+    return Path(settings.MEDIA_ROOT) / CACHE_DIR / f'{invoice.pk}-{stamp}.pdf'
+
+
+def get_invoice_pdf(invoice):
+    """
+    Retorna la ruta del PDF de la factura, generándolo solo si no existe en
+    caché para su updated_at actual. Elimina versiones anteriores.
+    """
+    path = cached_pdf_path(invoice)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not hasattr(invoice, '_prefetched_objects_cache'):
+        invoice = invoice_queryset().get(pk=invoice.pk)
+    data = render_invoice_pdf(invoice)
+    # Escritura atómica: otro proceso nunca ve un archivo a medias
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+    for old in path.parent.glob(f'{invoice.pk}-*.pdf'):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
@@ -0,0 +1,46 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Invoice, InvoiceStatus
+
+
+AGING_BUCKETS = [
+    ('d0_30', 'Hasta 30 días', 0, 30),
+    ('d31_60', '31 a 60 días', 31, 60),
+    ('d61_90', '61 a 90 días', 61, 90),
+    ('d90_plus', 'Más de 90 días', 91, None),
+]
+
+
+def ar_aging(as_of=None, customer_id=None):
+    """
+    Antigüedad de cartera por cliente en una sola consulta agrupada sobre
+    Invoice.balance_due. Retorna (filas por cliente, totales generales).
+    """
+    as_of = as_of or timezone.now()
+    qs = Invoice.objects.filter(status=InvoiceStatus.POSTED, balance_due__gt=0)
+    if customer_id:
+        qs = qs.filter(customer_id=customer_id)
+
+    money = DecimalField(max_digits=15, decimal_places=2)
+    zero = Value(Decimal('0.00'))
+    buckets = {}
+    for key, _, low, high in AGING_BUCKETS:
+        # Más antiguo que `low` días y, si hay tope, no más que `high`
+        condition = Q(date__lte=as_of - timedelta(days=low)) if low else Q(date__lte=as_of)
+        if high is not None:
+            condition &= Q(date__gt=as_of - timedelta(days=high + 1))
+        buckets[key] = Coalesce(Sum('balance_due', filter=condition), zero, output_field=money)
+
+    rows = list(
+        qs.order_by()
+        .values('customer_id', 'customer__codigo', 'customer__nombre')
+        .annotate(total=Sum('balance_due'), **buckets)
+        .order_by('-total')
+    )
+    totals = {key: sum((row[key] for row in rows), Decimal('0.00')) for key in [*buckets, 'total']}
+    return rows, totals
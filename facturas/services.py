@@ -0,0 +1,343 @@
+from contextlib import contextmanager
+from decimal import ROUND_HALF_UP, Decimal
+from functools import partial
+
+from asgiref.local import Local
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from clientes.models import Cliente
+from inventario.models import StockItem, Warehouse
+from inventario.services import check_stock_availability, refresh_product_stock
+from kardex.models import KardexEntry
+from productos.models import DiscountType, Product, ProductPresentation
+from productos.pricing import resolve_unit_prices
+from .models import Invoice, InvoiceLineItem, InvoicePayment, InvoiceStatus, LineItemTax
+from .taxes import apply_invoice_taxes, build_line_taxes
+
+
+_deferred = Local()
+
+
+def recalc_invoice(invoice_id: int, line_ids=()):
+    """
+    Recalcula los totales de la factura. Los impuestos se reconstruyen solo en
+    borradores y solo para `line_ids` (las líneas modificadas): una factura
+    emitida o anulada conserva las tasas con que se emitió.
+    """
+    try:
+        inv = Invoice.objects.get(pk=invoice_id)
+    except Invoice.DoesNotExist:
+        return
+    if line_ids and inv.status == InvoiceStatus.DRAFT:
+        apply_invoice_taxes(invoice_id, line_ids)
+    inv.recalculate_totals()
+    # El saldo se calcula en SQL para no pisar pagos concurrentes
+    inv.balance_due = inv.total - F('amount_paid')
+    # updated_at también: invalida el PDF en caché
+    inv.save(update_fields=['subtotal', 'total_discount', 'total_tax', 'total', 'balance_due', 'updated_at'])
+
+
+def _recalc_invoices(pending):
+    with transaction.atomic():
+        for invoice_id, line_ids in pending:
+            recalc_invoice(invoice_id, line_ids)
+
+
+def schedule_invoice_recalc(invoice_id: int, line_id=None):
+    """
+    Recalcula los totales de la factura (y los impuestos de la línea
+    modificada `line_id`), o los marca como pendientes si hay un bloque
+    deferred_invoice_recalc() activo.
+    """
+    pending = getattr(_deferred, 'invoices', None)
+    line_ids = {line_id} if line_id is not None else set()
+    if pending is None:
+        recalc_invoice(invoice_id, line_ids)
+    else:
+        pending.setdefault(invoice_id, set()).update(line_ids)
+
+
+@contextmanager
+def deferred_invoice_recalc():
+    """
+    Agrupa los recálculos de totales de facturas.
+
+    Mientras el bloque está activo, las señales de líneas solo acumulan los ids
+    de factura y de líneas modificadas. Al salir se registra un único
+    transaction.on_commit que recalcula cada factura una sola vez (de inmediato
+    si no hay transacción abierta). Si el bloque termina con excepción no se
+    recalcula nada. Puede usarse también como decorador.
+    """
+    pending = getattr(_deferred, 'invoices', None)
+    if pending is not None:
+        # Bloque anidado: el externo se encarga del recálculo
+        yield pending
+        return
+    _deferred.invoices = pending = {}
+    try:
+        yield pending
+    finally:
+        _deferred.invoices = None
+    if pending:
+        transaction.on_commit(partial(_recalc_invoices, sorted(pending.items())))
+
+
+def autofill_line_items(items):
+    """
+    Completa SKU, nombre, unidad y precio de las líneas con presentación. El
+    precio faltante se toma de los tramos por volumen (productos.pricing).
+
+    Las presentaciones y productos que no estén ya cargados en las líneas se
+    traen con un in_bulk por modelo, así el costo es constante sin importar
+    cuántas líneas haya. Lo usan las vistas de factura y el admin.
+    """
+    presentation_field = InvoiceLineItem._meta.get_field('presentation')
+    product_field = InvoiceLineItem._meta.get_field('product')
+    presentations = ProductPresentation.objects.in_bulk({
+        it.presentation_id for it in items
+        if it.presentation_id and not presentation_field.is_cached(it)
+    })
+    products = Product.objects.in_bulk({
+        it.product_id for it in items
+        if it.product_id and not product_field.is_cached(it)
+    })
+    unpriced = [it for it in items if it.presentation_id and not it.unit_price]
+    prices = resolve_unit_prices((it.presentation_id, it.product_id, it.quantity or 0) for it in unpriced)
+    for it, resolved in zip(unpriced, prices):
+        if resolved is not None:
+            it.unit_price = resolved[0]
+    for it in items:
+        if it.presentation_id in presentations:
+            it.presentation = presentations[it.presentation_id]
+        if it.product_id in products:
+            it.product = products[it.product_id]
+        # Autocompletar desde presentación si falta
+        if it.presentation_id:
+            if not it.sku:
+                it.sku = it.presentation.sku or it.product.sku
+            if not it.name:
+                it.name = it.product.name
+            if not it.unit_of_measure:
+                it.unit_of_measure = it.presentation.unit_of_measure
+    return items
+
+
+def post_invoice_to_stock(invoice: Invoice):
+    """
+    Descuenta inventario y registra el kardex de salida de una factura emitida.
+
+    Trabaja por conjuntos: bloquea todos los StockItem afectados en una sola
+    consulta ordenada, aplica los descuentos con un único bulk_update y
+    escribe el kardex con bulk_create; luego recalcula el resumen
+    ProductStock de los productos tocados. El número de sentencias no depende
+    de la cantidad de líneas.
+    """
+    lines = list(
+        InvoiceLineItem.objects
+        .filter(invoice_id=invoice.pk, presentation__isnull=False)
+        .order_by('pk')
+        .values_list('presentation_id', 'quantity', 'presentation__cost', 'presentation__product_id')
+    )
+    # Solo procesamos salidas por presentaciones
+    if not lines:
+        return []
+
+    presentation_ids = sorted({line[0] for line in lines})
+
+    with transaction.atomic():
+        # Crear los StockItem que falten sin pisar los existentes
+        StockItem.objects.bulk_create(
+            [
+                StockItem(
+                    warehouse_id=invoice.warehouse_id,
+                    presentation_id=presentation_id,
+                    quantity=Decimal('0.000'),
+                    reserved_quantity=Decimal('0.000'),
+                )
+                for presentation_id in presentation_ids
+            ],
+            ignore_conflicts=True,
+        )
+        # Bloqueo en orden estable para evitar interbloqueos entre facturas concurrentes
+        stocks = {
+            stock.presentation_id: stock
+            for stock in StockItem.objects.select_for_update()
+            .filter(warehouse_id=invoice.warehouse_id, presentation_id__in=presentation_ids)
+            .order_by('pk')
+        }
+
+        entries = []
+        for presentation_id, qty, cost, _ in lines:
+            stock = stocks[presentation_id]
+            stock.quantity = stock.quantity - qty
+            unit_cost = cost or Decimal('0.00')
+            entries.append(KardexEntry(
+                warehouse_id=invoice.warehouse_id,
+                presentation_id=presentation_id,
+                movement_type='out',
+                reference=str(invoice.number),
+                reference_type='invoice',
+                qty_out=qty,
+                balance_qty=stock.quantity,
+                unit_cost=unit_cost,
+                movement_cost=(unit_cost * qty),
+                average_cost=unit_cost,
+            ))
+
+        now = timezone.now()
+        for stock in stocks.values():
+            stock.updated_at = now
+        StockItem.objects.bulk_update(list(stocks.values()), ['quantity', 'updated_at'])
+        # bulk_update no emite señales: el resumen por producto se actualiza aquí
+        refresh_product_stock(line[3] for line in lines)
+        return KardexEntry.objects.bulk_create(entries)
+
+
+def _quantize_fields(instance, *names):
+    # Redondea a los decimales de cada campo, como quedará guardado: la
+    # instancia en memoria y las sumas de la factura coinciden con la base
+    for name in names:
+        exponent = Decimal(1).scaleb(-instance._meta.get_field(name).decimal_places)
+        setattr(instance, name, Decimal(getattr(instance, name)).quantize(exponent, rounding=ROUND_HALF_UP))
+
+
+def create_invoice(customer_id, warehouse_id, lines, payments=(), number='', sequence_code=None,
+                   currency='COP', status=InvoiceStatus.DRAFT, notes=''):
+    """
+    Crea una factura completa (cabecera, líneas y pagos) con un número acotado
+    de consultas, sin formsets.
+
+    `lines` es una lista de dicts con 'presentation' o 'product' (ids),
+    'quantity' y opcionalmente 'unit_price', 'discount_type', 'discount_value',
+    'name' y 'description'. Las presentaciones y productos se cargan con un
+    in_bulk por modelo; si falta el precio se usa el de los tramos por volumen
+    o el precio base. Los impuestos
+    de las líneas se resuelven con facturas.taxes. Si la factura se crea
+    Emitida se valida el stock y se descuenta inventario.
+    Lanza ValidationError con los errores encontrados.
+    """
+    errors = {}
+    if status not in InvoiceStatus.values:
+        errors['status'] = [f'Estado inválido: {status}']
+    if not lines:
+        errors['lines'] = ['La factura debe tener al menos una línea']
+    warehouse_code = Warehouse.objects.filter(pk=warehouse_id).values_list('code', flat=True).first()
+    if warehouse_code is None:
+        errors['warehouse'] = ['Bodega inexistente']
+    if not Cliente.objects.filter(pk=customer_id).exists():
+        errors['customer'] = ['Cliente inexistente']
+
+    presentations = ProductPresentation.objects.select_related('product').in_bulk(
+        {line['presentation'] for line in lines if line.get('presentation')}
+    )
+    products = Product.objects.in_bulk(
+        {line['product'] for line in lines if line.get('product') and not line.get('presentation')}
+    )
+
+    prices = resolve_unit_prices(
+        (line.get('presentation'), line.get('product'), line['quantity']) for line in lines
+    )
+    items = []
+    line_errors = []
+    for index, line in enumerate(lines, start=1):
+        presentation = presentations.get(line.get('presentation')) if line.get('presentation') else None
+        product = presentation.product if presentation else products.get(line.get('product'))
+        if product is None:
+            line_errors.append(f'Línea {index}: presentación o producto inexistente')
+            continue
+        quantity = line['quantity']
+        if quantity <= 0:
+            line_errors.append(f'Línea {index}: la cantidad debe ser mayor que cero')
+            continue
+        discount_type = line.get('discount_type') or None
+        if discount_type and discount_type not in DiscountType.values:
+            line_errors.append(f'Línea {index}: tipo de descuento inválido')
+            continue
+        source = presentation or product
+        unit_price = line.get('unit_price')
+        if unit_price is None:
+            resolved = prices[index - 1]
+            unit_price = resolved[0] if resolved else source.base_price
+        item = InvoiceLineItem(
+            product=product,
+            presentation=presentation,
+            sku=source.sku or product.sku,
+            name=line.get('name') or product.name,
+            presentation_name=presentation.name if presentation else '',
+            description=line.get('description', ''),
+            quantity=quantity,
+            unit_of_measure=source.unit_of_measure,
+            unit_price=unit_price,
+            discount_type=discount_type,
+            discount_value=line.get('discount_value') or Decimal('0.00'),
+        )
+        _quantize_fields(item, 'quantity', 'unit_price', 'discount_value')
+        items.append(item)
+    if line_errors:
+        errors['lines'] = line_errors
+    if errors:
+        raise ValidationError(errors)
+
+    taxes = build_line_taxes(items)
+    for item in items:
+        _quantize_fields(item, 'discount_amount', 'subtotal', 'total_tax', 'total')
+
+    if status == InvoiceStatus.POSTED:
+        shortfalls = check_stock_availability(
+            warehouse_id,
+            [(item.presentation_id, item.quantity) for item in items if item.presentation_id],
+            skus={item.presentation_id: item.sku for item in items if item.presentation_id},
+        )
+        if shortfalls:
+            raise ValidationError({
+                'status': ['No se puede Emitir por falta de stock:'] + [s.message(warehouse_code) for s in shortfalls]
+            })
+
+    invoice = Invoice(
+        number=number,
+        customer_id=customer_id,
+        warehouse_id=warehouse_id,
+        currency=currency,
+        status=status,
+        notes=notes,
+        subtotal=sum((item.subtotal for item in items), Decimal('0.00')),
+        total_discount=sum((item.discount_amount for item in items), Decimal('0.00')),
+        total_tax=sum((item.total_tax for item in items), Decimal('0.00')),
+    )
+    invoice.total = invoice.subtotal + invoice.total_tax
+    payments = [InvoicePayment(method=p['method'], amount=p['amount'], reference=p.get('reference', '')) for p in payments]
+    for payment in payments:
+        _quantize_fields(payment, 'amount')
+    invoice.amount_paid = sum((p.amount for p in payments), Decimal('0.00'))
+    invoice.balance_due = invoice.total - invoice.amount_paid
+    if not number:
+        # Asignar antes de abrir la transacción de escritura
+        from .numbering import allocate_invoice_number
+        invoice.number = allocate_invoice_number(warehouse_id=warehouse_id, sequence_code=sequence_code)
+
+    with transaction.atomic():
+        invoice.save()
+        for item in items:
+            item.invoice = invoice
+        InvoiceLineItem.objects.bulk_create(items)
+        LineItemTax.objects.bulk_create(taxes)
+        for payment in payments:
+            payment.invoice = invoice
+        InvoicePayment.objects.bulk_create(payments)
+        if status == InvoiceStatus.POSTED:
+            post_invoice_to_stock(invoice)
+    return invoice, items
+
+
+def apply_payment_delta(invoice_id: int, delta: Decimal):
+    """Suma `delta` a lo pagado y lo resta del saldo en un UPDATE atómico."""
+    if not delta:
+        return
+    Invoice.objects.filter(pk=invoice_id).update(
+        amount_paid=F('amount_paid') + delta,
+        balance_due=F('balance_due') - delta,
+        updated_at=timezone.now(),
+    )
@@ -1,42 +1,48 @@
-from decimal import Decimal
-from django.db import transaction
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 
-from .models import Invoice, InvoiceLineItem, InvoicePayment
-from inventario.models import StockItem
-from kardex.models import KardexEntry
-
-
-def _recalc_invoice(invoice_id: int):
-    try:
-        inv = Invoice.objects.get(pk=invoice_id)
-    except Invoice.DoesNotExist:
-        return
-    inv.recalculate_totals()
-    inv.save(update_fields=['subtotal', 'total_discount', 'total_tax', 'total'])
+from .models import Invoice, InvoiceLineItem, InvoicePayment, InvoiceSequence
+from .numbering import release_blocks
+from .services import apply_payment_delta, post_invoice_to_stock, schedule_invoice_recalc
 
 
 @receiver(post_save, sender=InvoiceLineItem)
 def recalc_invoice_on_item_save(sender, instance: InvoiceLineItem, created, **kwargs):
-    _recalc_invoice(instance.invoice_id)
+    schedule_invoice_recalc(instance.invoice_id, instance.pk)
 
 
 @receiver(post_delete, sender=InvoiceLineItem)
 def recalc_invoice_on_item_delete(sender, instance: InvoiceLineItem, **kwargs):
-    _recalc_invoice(instance.invoice_id)
+    schedule_invoice_recalc(instance.invoice_id)
+
+
+@receiver(pre_save, sender=InvoicePayment)
+def remember_previous_payment(sender, instance: InvoicePayment, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            InvoicePayment.objects.filter(pk=instance.pk).values_list('invoice_id', 'amount').first()
+        )
 
 
 @receiver(post_save, sender=InvoicePayment)
 def recalc_invoice_on_payment_save(sender, instance: InvoicePayment, created, **kwargs):
-    # Placeholder: si agregamos campos de pagos en Invoice, recalcular aquí
-    pass
+    previous = getattr(instance, '_previous', None)
+    if previous is None:
+        apply_payment_delta(instance.invoice_id, instance.amount)
+        return
+    prev_invoice_id, prev_amount = previous
+    if prev_invoice_id != instance.invoice_id:
+        apply_payment_delta(prev_invoice_id, -prev_amount)
+        apply_payment_delta(instance.invoice_id, instance.amount)
+    else:
+        apply_payment_delta(instance.invoice_id, instance.amount - prev_amount)
+    instance._previous = (instance.invoice_id, instance.amount)
 
 
 @receiver(post_delete, sender=InvoicePayment)
 def recalc_invoice_on_payment_delete(sender, instance: InvoicePayment, **kwargs):
-    # Placeholder idem
-    pass
+    apply_payment_delta(instance.invoice_id, -instance.amount)
 
 
 @receiver(pre_save, sender=Invoice)
@@ -49,33 +55,11 @@ def post_invoice_to_kardex_when_status_changes(sender, instance: Invoice, **kwar
         return
     # Transición a 'Emitida'
     if prev.status != 'posted' and instance.status == 'posted':
-        with transaction.atomic():
-            for line in instance.line_items.select_related('presentation').all():
-                # Solo procesamos salidas por presentaciones
-                if not line.presentation_id:
-                    continue
-                qty = line.quantity
-                # Actualizar stock
-                stock, _ = StockItem.objects.select_for_update().get_or_create(
-                    warehouse=instance.warehouse,
-                    presentation=line.presentation,
-                    defaults={'quantity': Decimal('0.000'), 'reserved_quantity': Decimal('0.000')},
-                )
-                stock.quantity = stock.quantity - qty
-                stock.save(update_fields=['quantity'])
+        post_invoice_to_stock(instance)
 
-                # Registrar kardex (salida)
-                unit_cost = (line.presentation.cost or Decimal('0.00'))
-                KardexEntry.objects.create(
-                    warehouse=instance.warehouse,
-                    presentation=line.presentation,
-                    movement_type='out',
-                    reference=str(instance.number),
-                    reference_type='invoice',
-                    qty_out=qty,
-                    balance_qty=stock.quantity,
-                    unit_cost=unit_cost,
-                    movement_cost=(unit_cost * qty),
-                    average_cost=unit_cost,
-                )
 
+@receiver(post_save, sender=InvoiceSequence)
+@receiver(post_delete, sender=InvoiceSequence)
+def release_number_blocks_on_sequence_change(sender, instance: InvoiceSequence, **kwargs):
+    # Prefijo/dígitos pudieron cambiar: devolver bloques en memoria de este proceso
+    release_blocks()
@@ -0,0 +1,72 @@
+"""
+Motor de impuestos de facturas.
+
+Calcula los LineItemTax de las líneas de una factura en bloque a partir
+de los impuestos vigentes de cada presentación (productos.taxes):
+
+- Los impuestos `is_included` ya están dentro del precio: la base neta es el
+  subtotal de la línea dividido entre (1 + suma de tasas incluidas).
+- Un `tax_base` fijo reemplaza la base: se usa tax_base × cantidad.
+- El subtotal de la línea queda sin los impuestos incluidos, de modo que
+  subtotal + impuestos sigue siendo el total a pagar.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+
+from productos.taxes import resolve_tax_rules
+from .models import InvoiceLineItem, LineItemTax
+
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+def _round(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def build_line_taxes(items):
+    """
+    Retorna la lista de LineItemTax (sin guardar) de las líneas dadas, guardadas
+    o no, y deja calculados sus totales. Consulta solo los impuestos que no
+    estén en caché.
+    """
+    rules_by_key = resolve_tax_rules((item.presentation_id, item.product_id) for item in items)
+    result = []
+    for item in items:
+        item.calculate_totals(taxes=[])
+        rules = rules_by_key[(item.presentation_id, item.product_id)]
+        included_rate = sum((r.rate for r in rules if r.is_included and r.tax_base is None), Decimal('0'))
+        net_base = item.subtotal / (1 + included_rate / HUNDRED) if included_rate else item.subtotal
+        taxes = []
+        for rule in rules:
+            base = rule.tax_base * item.quantity if rule.tax_base is not None else net_base
+            taxes.append(LineItemTax(
+                line_item=item,
+                tax_type=rule.tax_type,
+                name=rule.name,
+                rate=rule.rate,
+                base=_round(base),
+                amount=_round(base * rule.rate / HUNDRED),
+                is_included=rule.is_included,
+            ))
+        item.calculate_totals(taxes=taxes)
+        result += taxes
+    return result
+
+
+@transaction.atomic
+def apply_invoice_taxes(invoice_id: int, line_ids):
+    """
+    Recalcula los impuestos de las líneas `line_ids` de la factura: reemplaza
+    sus LineItemTax con un único bulk_create y guarda sus totales. Las demás
+    líneas conservan sus impuestos (también los digitados a mano).
+    """
+    items = list(InvoiceLineItem.objects.filter(invoice_id=invoice_id, pk__in=line_ids).order_by('pk'))
+    if not items:
+        return
+    taxes = build_line_taxes(items)
+    LineItemTax.objects.filter(line_item__in=items).delete()
+    LineItemTax.objects.bulk_create(taxes)
+    InvoiceLineItem.objects.bulk_update(items, ['discount_amount', 'subtotal', 'total_tax', 'total'])
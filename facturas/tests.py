@@ -1,3 +1,544 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import shutil
+import threading
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Prefetch
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from inventario.models import StockItem, Warehouse
+from kardex.models import KardexEntry
+from productos.models import PresentationTax, Product, ProductPresentation
+from . import numbering
+from .pagination import KeysetPage
+from .pdf import cached_pdf_path, get_invoice_pdf, invoice_queryset, render_invoice_pages
+from .services import create_invoice, post_invoice_to_stock
+from .models import (
+    Invoice, InvoiceLineItem, InvoiceNumberBlock, InvoicePayment, InvoiceSequence, InvoiceStatus, LineItemTax,
+)
+from .reports import ar_aging
+from .views import InvoiceListView
+
+
+class InvoiceFixtures:
+    @classmethod
+    def create_fixtures(cls):
+        cls.warehouse = Warehouse.objects.create(name='Principal', code='W1')
+        cls.customer = Cliente.objects.create(
+            codigo='C1', nombre='Juan Pérez', ruc_dni='123', direccion='Calle 1', telefono='555',
+        )
+        cls.product = Product.objects.create(sku='P1', name='Gaseosa')
+        cls.presentations = [
+            ProductPresentation.objects.create(
+                product=cls.product, sku=f'P1-{i}', name=f'Presentación {i}', unit_of_measure='unit',
+                cost=Decimal('50.00'), base_price=Decimal('100.00'),
+            )
+            for i in range(3)
+        ]
+        for presentation in cls.presentations:
+            StockItem.objects.create(warehouse=cls.warehouse, presentation=presentation, quantity=Decimal('100'))
+
+
+class InvoiceTestCase(InvoiceFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+
+    def setUp(self):
+        cache.clear()
+
+    def make_invoice(self, number='F-1', **kwargs):
+        return Invoice.objects.create(number=number, customer=self.customer, warehouse=self.warehouse, **kwargs)
+
+    def add_line(self, invoice, presentation, quantity='1', unit_price=None):
+        return InvoiceLineItem.objects.create(
+            invoice=invoice, product=self.product, presentation=presentation, sku=presentation.sku,
+            name=presentation.name, quantity=Decimal(quantity), unit_of_measure='unit',
+            unit_price=presentation.base_price if unit_price is None else Decimal(unit_price),
+        )
+
+    def add_tax(self, presentation, rate='19', is_included=False):
+        return PresentationTax.objects.create(
+            presentation=presentation, tax_type='iva', name=f'IVA {rate}%', rate=Decimal(rate), is_included=is_included,
+        )
+
+
+class InvoiceTaxTests(InvoiceTestCase):
+    def test_excluded_tax_is_added_to_subtotal(self):
+        self.add_tax(self.presentations[0], '19')
+        invoice = self.make_invoice()
+        line = self.add_line(invoice, self.presentations[0], quantity='2')
+
+        line.refresh_from_db()
+        self.assertEqual((line.subtotal, line.total_tax, line.total), (Decimal('200'), Decimal('38'), Decimal('238')))
+        tax = line.line_taxes.get()
+        self.assertEqual((tax.base, tax.amount, tax.is_included), (Decimal('200'), Decimal('38'), False))
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.subtotal, invoice.total_tax, invoice.total), (Decimal('200'), Decimal('38'), Decimal('238')))
+
+    def test_included_tax_is_taken_out_of_the_price(self):
+        self.add_tax(self.presentations[0], '19', is_included=True)
+        invoice = self.make_invoice()
+        line = self.add_line(invoice, self.presentations[0], unit_price='119.00')
+
+        line.refresh_from_db()
+        self.assertEqual((line.subtotal, line.total_tax, line.total), (Decimal('100'), Decimal('19'), Decimal('119')))
+        tax = line.line_taxes.get()
+        self.assertEqual((tax.base, tax.amount, tax.is_included), (Decimal('100'), Decimal('19'), True))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total, Decimal('119'))
+
+    def test_other_lines_keep_their_taxes(self):
+        self.add_tax(self.presentations[0], '19')
+        invoice = self.make_invoice()
+        first = self.add_line(invoice, self.presentations[0])
+        # Impuesto corregido a mano en la primera línea
+        LineItemTax.objects.filter(line_item=first).update(amount=Decimal('5.00'))
+
+        self.add_line(invoice, self.presentations[0])
+        self.assertEqual(first.line_taxes.get().amount, Decimal('5.00'))
+
+    def test_posted_invoice_keeps_issued_rates(self):
+        tax = self.add_tax(self.presentations[0], '19')
+        invoice = self.make_invoice()
+        line = self.add_line(invoice, self.presentations[0])
+        Invoice.objects.filter(pk=invoice.pk).update(status=InvoiceStatus.POSTED)
+
+        tax.rate = Decimal('5')
+        tax.save()
+        cache.clear()
+        line.save()
+        self.assertEqual(line.line_taxes.get().rate, Decimal('19'))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_tax, Decimal('19'))
+
+
+class PostInvoiceToStockTests(InvoiceTestCase):
+    def invoice_with_lines(self, number, lines):
+        invoice = self.make_invoice(number)
+        for i in range(lines):
+            self.add_line(invoice, self.presentations[i % 3], quantity='2')
+        return invoice
+
+    def test_constant_number_of_queries(self):
+        counts = []
+        for number, lines in (('F-1', 3), ('F-2', 30)):
+            invoice = self.invoice_with_lines(number, lines)
+            with CaptureQueriesContext(connection) as queries:
+                post_invoice_to_stock(invoice)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_stock_and_kardex(self):
+        missing = ProductPresentation.objects.create(
+            product=self.product, sku='P1-X', name='Sin stock', unit_of_measure='unit',
+            cost=Decimal('7.00'), base_price=Decimal('10.00'),
+        )
+        invoice = self.invoice_with_lines('F-1', 4)
+        self.add_line(invoice, missing, quantity='3')
+        post_invoice_to_stock(invoice)
+
+        stock = dict(StockItem.objects.filter(warehouse=self.warehouse).values_list('presentation__sku', 'quantity'))
+        self.assertEqual(stock, {'P1-0': Decimal('96'), 'P1-1': Decimal('98'), 'P1-2': Decimal('98'), 'P1-X': Decimal('-3')})
+        entries = KardexEntry.objects.filter(reference='F-1').order_by('pk')
+        self.assertEqual(
+            [(e.presentation.sku, e.qty_out, e.balance_qty) for e in entries],
+            [('P1-0', 2, 98), ('P1-1', 2, 98), ('P1-2', 2, 98), ('P1-0', 2, 96), ('P1-X', 3, -3)],
+        )
+        self.assertEqual(entries.last().movement_cost, Decimal('21.00'))
+
+    def test_status_change_posts_once(self):
+        invoice = self.invoice_with_lines('F-1', 1)
+        invoice.status = InvoiceStatus.POSTED
+        invoice.save()
+        invoice.save()
+        self.assertEqual(KardexEntry.objects.filter(reference='F-1').count(), 1)
+
+
+class PaymentBalanceTests(InvoiceTestCase):
+    def balance(self, invoice):
+        invoice.refresh_from_db()
+        return invoice.amount_paid, invoice.balance_due
+
+    def test_payments_move_the_balance(self):
+        invoice = self.make_invoice()
+        self.add_line(invoice, self.presentations[0])
+        self.assertEqual(self.balance(invoice), (Decimal('0'), Decimal('100')))
+
+        payment = InvoicePayment.objects.create(invoice=invoice, method='cash', amount=Decimal('30'))
+        self.assertEqual(self.balance(invoice), (Decimal('30'), Decimal('70')))
+        payment.amount = Decimal('45')
+        payment.save()
+        self.assertEqual(self.balance(invoice), (Decimal('45'), Decimal('55')))
+        self.add_line(invoice, self.presentations[1])
+        self.assertEqual(self.balance(invoice), (Decimal('45'), Decimal('155')))
+        payment.delete()
+        self.assertEqual(self.balance(invoice), (Decimal('0'), Decimal('200')))
+
+    def test_payment_moved_to_another_invoice(self):
+        first, second = self.make_invoice('F-1'), self.make_invoice('F-2')
+        self.add_line(first, self.presentations[0])
+        self.add_line(second, self.presentations[0])
+        payment = InvoicePayment.objects.create(invoice=first, method='cash', amount=Decimal('100'))
+        payment.invoice = second
+        payment.save()
+        self.assertEqual(self.balance(first), (Decimal('0'), Decimal('100')))
+        self.assertEqual(self.balance(second), (Decimal('100'), Decimal('0')))
+
+    def test_aging_buckets(self):
+        now = timezone.now()
+        for number, days in (('F-1', 10), ('F-2', 45), ('F-3', 200)):
+            invoice = self.make_invoice(number)
+            self.add_line(invoice, self.presentations[0])
+            Invoice.objects.filter(pk=invoice.pk).update(status=InvoiceStatus.POSTED, date=now - timedelta(days=days))
+        # Borradores y facturas pagadas no cuentan
+        self.add_line(self.make_invoice('F-4'), self.presentations[0])
+        paid = self.make_invoice('F-5', status=InvoiceStatus.POSTED)
+        self.add_line(paid, self.presentations[0])
+        InvoicePayment.objects.create(invoice=paid, method='cash', amount=Decimal('100'))
+
+        rows, totals = ar_aging(as_of=now)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            {key: rows[0][key] for key in ('d0_30', 'd31_60', 'd61_90', 'd90_plus', 'total')},
+            {'d0_30': Decimal('100'), 'd31_60': Decimal('100'), 'd61_90': Decimal('0'),
+             'd90_plus': Decimal('100'), 'total': Decimal('300')},
+        )
+        self.assertEqual(totals['total'], Decimal('300'))
+
+
+class KeysetPaginationTests(InvoiceTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        for i in range(7):
+            invoice = Invoice.objects.create(number=f'F-{i}', customer=cls.customer, warehouse=cls.warehouse)
+            # Fechas repetidas: el id desempata
+            Invoice.objects.filter(pk=invoice.pk).update(
+                date=now - timedelta(days=i // 2),
+                status=InvoiceStatus.POSTED if i % 2 else InvoiceStatus.DRAFT,
+            )
+
+    def walk(self, queryset, per_page):
+        numbers, cursor = [], None
+        while True:
+            page = KeysetPage(queryset, 'date', per_page, cursor)
+            numbers.extend(invoice.number for invoice in page.object_list)
+            cursor = page.next_cursor
+            if cursor is None:
+                return numbers
+
+    def test_pages_cover_every_row_once(self):
+        expected = list(Invoice.objects.order_by('-date', '-pk').values_list('number', flat=True))
+        for per_page in (1, 2, 3, 7, 10):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(self.walk(Invoice.objects.all(), per_page), expected)
+
+    def test_invalid_cursor_starts_over(self):
+        for cursor in ('basura', '2026-01-01T00:00:00~x', '~5'):
+            with self.subTest(cursor=cursor):
+                page = KeysetPage(Invoice.objects.all(), 'date', 3, cursor)
+                self.assertTrue(page.is_first)
+                self.assertEqual(len(page.object_list), 3)
+
+    def test_list_view_filters_and_follows_cursor(self):
+        url = reverse('facturas:list')
+        response = self.client.get(url, {'estado': InvoiceStatus.POSTED})
+        page = response.context['page']
+        self.assertEqual(response.context['total_count'], 3)
+        self.assertEqual(len(page.object_list), 3)
+        self.assertIsNone(page.next_cursor)
+
+        with mock.patch.object(InvoiceListView, 'page_size', 4):
+            first = self.client.get(url).context['page']
+            second = self.client.get(url, {'cursor': first.next_cursor}).context['page']
+        numbers = [invoice.number for invoice in first.object_list + second.object_list]
+        self.assertEqual(len(set(numbers)), 7)
+        self.assertFalse(second.has_next)
+
+
+class InvoiceCleanTests(InvoiceTestCase):
+    def test_posting_checks_stock(self):
+        invoice = self.make_invoice()
+        self.add_line(invoice, self.presentations[0], quantity='150')
+        invoice.status = InvoiceStatus.POSTED
+        with self.assertRaises(ValidationError) as cm:
+            invoice.clean()
+        self.assertIn('P1-0', ' '.join(cm.exception.message_dict['status']))
+
+    def test_zero_quantity_is_a_validation_error(self):
+        invoice = self.make_invoice()
+        self.add_line(invoice, self.presentations[0], quantity='0')
+        invoice.status = InvoiceStatus.POSTED
+        with self.assertRaises(ValidationError):
+            invoice.clean()
+
+
+class InvoiceNumberingTests(TransactionTestCase):
+    def setUp(self):
+        numbering.release_blocks()
+        self.sequence = InvoiceSequence.objects.create(code='GEN', prefix='F-', padding=4, block_size=5)
+
+    def tearDown(self):
+        numbering.release_blocks()
+
+    def test_numbers_are_sequential_within_blocks(self):
+        numbers = [numbering.allocate_invoice_number() for _ in range(7)]
+        self.assertEqual(numbers, [f'F-{n:04d}' for n in range(1, 8)])
+        self.assertEqual(InvoiceNumberBlock.objects.filter(sequence=self.sequence).count(), 2)
+        self.sequence.refresh_from_db()
+        self.assertEqual(self.sequence.next_number, 11)
+
+    def test_threads_never_share_numbers(self):
+        results, errors = [], []
+
+        def worker():
+            try:
+                results.extend(numbering.allocate_invoice_number() for _ in range(12))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        # Los bloques son del proceso: cada hilo que agota uno reserva el
+        # siguiente con su propia conexión privada. La secuencia se resuelve
+        # antes para que los hilos solo usen la base al reservar (SQLite en
+        # memoria bloquea tablas entre conexiones)
+        numbering.resolve_sequence()
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 72)
+        self.assertEqual(len(set(results)), 72)
+        self.assertEqual(InvoiceNumberBlock.objects.count(), 15)
+
+
+class InvoiceSequenceAdminTests(TestCase):
+    def test_stale_form_cannot_move_sequence_back(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin_user)
+        sequence = InvoiceSequence.objects.create(code='GEN', prefix='F-', next_number=1)
+        InvoiceSequence.objects.filter(pk=sequence.pk).update(next_number=101)
+
+        response = self.client.post(reverse('admin:facturas_invoicesequence_change', args=[sequence.pk]), {
+            'code': 'GEN', 'name': 'General', 'prefix': 'F-', 'padding': 8,
+            'next_number': 1, 'block_size': 50, 'is_active': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        sequence.refresh_from_db()
+        self.assertEqual(sequence.next_number, 101)
+        self.assertEqual(sequence.name, 'General')
+
+
+class CreateInvoiceTests(InvoiceTestCase):
+    def lines(self, count):
+        return [
+            {'presentation': self.presentations[i % 3].pk, 'quantity': Decimal('1'), 'unit_price': Decimal('10.00')}
+            for i in range(count)
+        ]
+
+    def test_constant_number_of_queries(self):
+        self.add_tax(self.presentations[0], '19')
+        counts = []
+        for number, count in (('F-1', 3), ('F-2', 30)):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                create_invoice(self.customer.pk, self.warehouse.pk, self.lines(count), number=number,
+                               payments=[{'method': 'cash', 'amount': Decimal('5')}])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_posted_invoice_moves_stock(self):
+        invoice, items = create_invoice(
+            self.customer.pk, self.warehouse.pk, self.lines(3), number='F-1', status=InvoiceStatus.POSTED,
+        )
+        self.assertEqual(
+            sorted(StockItem.objects.filter(warehouse=self.warehouse).values_list('quantity', flat=True)),
+            [Decimal('99')] * 3,
+        )
+
+
+class InvoiceRoundingTests(InvoiceTestCase):
+    def test_recalc_keeps_create_invoice_totals(self):
+        # Cada línea: 0.25 - 50% = 0.125 -> 0.13; sin redondear por línea serían 0.375 -> 0.38
+        lines = [
+            {'presentation': self.presentations[i].pk, 'quantity': Decimal('1'), 'unit_price': Decimal('0.25'),
+             'discount_type': 'percentage', 'discount_value': Decimal('50')}
+            for i in range(3)
+        ]
+        invoice, _ = create_invoice(self.customer.pk, self.warehouse.pk, lines, number='F-1')
+        created = (invoice.subtotal, invoice.total_discount, invoice.total_tax, invoice.total)
+        self.assertEqual(created[:2], (Decimal('0.39'), Decimal('0.39')))
+
+        invoice.refresh_from_db()
+        invoice.recalculate_totals()
+        self.assertEqual((invoice.subtotal, invoice.total_discount, invoice.total_tax, invoice.total), created)
+        totals = Invoice.objects.filter(pk=invoice.pk).aggregate_totals().values('agg_subtotal', 'agg_discount').get()
+        self.assertEqual((totals['agg_subtotal'], totals['agg_discount']), created[:2])
+
+
+class InvoiceCreateApiTests(InvoiceTestCase):
+    def post(self, payload):
+        return self.client.post(reverse('facturas:api_create'), json.dumps(payload), content_type='application/json')
+
+    def payload(self, **line):
+        return {
+            'customer': self.customer.pk, 'warehouse': self.warehouse.pk, 'number': 'F-1',
+            'lines': [{'presentation': self.presentations[0].pk, 'quantity': '1', **line}],
+        }
+
+    def test_rejects_non_finite_numbers(self):
+        for line in ({'quantity': 'NaN'}, {'quantity': 'Infinity'}, {'unit_price': 'NaN'}, {'discount_value': '-inf'}):
+            with self.subTest(line=line):
+                response = self.post(self.payload(**line))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('errors', response.json())
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_response_matches_stored_values(self):
+        self.add_tax(self.presentations[0], '19')
+        response = self.post(self.payload(
+            quantity='3.3335', unit_price='4.537', discount_type='percentage', discount_value='7.5',
+        ))
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        invoice = Invoice.objects.get(pk=data['id'])
+        line = invoice.line_items.get()
+        for field in ('subtotal', 'total_discount', 'total_tax', 'total'):
+            self.assertEqual(data[field], str(getattr(invoice, field)))
+        for field in ('quantity', 'unit_price', 'discount_amount', 'subtotal', 'total_tax', 'total'):
+            self.assertEqual(data['lines'][0][field], str(getattr(line, field)))
+        self.assertEqual(invoice.total, invoice.subtotal + invoice.total_tax)
+
+
+class InvoicePdfTests(InvoiceTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def test_lines_are_rendered_in_creation_order(self):
+        invoice = self.make_invoice()
+        for presentation in (self.presentations[2], self.presentations[0]):
+            self.add_line(invoice, presentation)
+        # Aunque el prefetch las traiga en otro orden
+        invoice = invoice_queryset().prefetch_related(None).prefetch_related(
+            Prefetch('line_items', queryset=InvoiceLineItem.objects.order_by('-pk').prefetch_related('line_taxes')),
+        ).get(pk=invoice.pk)
+        content = zlib.decompress(render_invoice_pages(invoice)[0])
+        self.assertLess(content.index(b'(P1-2)'), content.index(b'(P1-0)'))
+
+    def test_pdf_is_cached_until_the_invoice_changes(self):
+        invoice = self.make_invoice()
+        self.add_line(invoice, self.presentations[0])
+        url = reverse('facturas:pdf', args=[invoice.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF-1.4'))
+        invoice.refresh_from_db()
+        path = cached_pdf_path(invoice)
+        stamp = int(invoice.updated_at.timestamp() * 1_000_000)
+        self.assertEqual(path.name, f'{invoice.pk}-{stamp}.pdf')
+        self.assertTrue(path.exists())
+
+        with mock.patch('facturas.pdf.render_invoice_pdf') as render:
+            self.assertEqual(get_invoice_pdf(invoice), path)
+        render.assert_not_called()
+
+        invoice.notes = 'Entregar en bodega'
+        invoice.save()
+        new_path = get_invoice_pdf(invoice)
+        self.assertNotEqual(new_path, path)
+        self.assertTrue(new_path.exists())
+        self.assertFalse(path.exists())
+
+
+class ImportInvoicesTests(InvoiceFixtures, TransactionTestCase):
+    # La numeración reserva bloques en otra conexión: sin transacción de prueba
+    def setUp(self):
+        numbering.release_blocks()
+        cache.clear()
+        self.create_fixtures()
+        InvoiceSequence.objects.create(code='GEN', prefix='F-', padding=4, block_size=5)
+        # Factura previa con número propio que coincide con la secuencia
+        Invoice.objects.create(number='F-0002', customer=self.customer, warehouse=self.warehouse)
+
+    def tearDown(self):
+        numbering.release_blocks()
+
+    def run_import(self, records, *args):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as fh:
+            fh.writelines(json.dumps(record) + '\n' for record in records)
+        err = StringIO()
+        call_command('import_invoices', path, *args, stdout=StringIO(), stderr=err)
+        return err.getvalue()
+
+    def record(self, **kwargs):
+        return {
+            'warehouse': 'W1', 'customer': 'C1', 'status': 'posted',
+            'lines': [{'sku': 'P1-0', 'quantity': '2'}],
+            'payments': [{'method': 'cash', 'amount': '200'}],
+            **kwargs,
+        }
+
+    def test_sequence_numbers_skip_existing_invoices(self):
+        self.run_import([self.record() for _ in range(3)], '--chunk-size', '2')
+        numbers = sorted(Invoice.objects.values_list('number', flat=True))
+        self.assertEqual(numbers, ['F-0001', 'F-0002', 'F-0003', 'F-0004'])
+
+    def test_post_happens_with_each_chunk(self):
+        self.run_import([self.record() for _ in range(3)], '--chunk-size', '1', '--post')
+        stock = StockItem.objects.get(warehouse=self.warehouse, presentation=self.presentations[0])
+        self.assertEqual(stock.quantity, Decimal('94'))
+        self.assertEqual(KardexEntry.objects.count(), 3)
+
+    def test_invalid_choices_are_reported(self):
+        errors = self.run_import([
+            self.record(payments=[{'method': 'bitcoin', 'amount': '1'}]),
+            self.record(lines=[{'sku': 'P1-0', 'quantity': '1', 'discount_type': 'gratis', 'discount_value': '1'}]),
+            self.record(),
+        ])
+        self.assertIn('método de pago inválido', errors)
+        self.assertIn('tipo de descuento inválido', errors)
+        self.assertEqual(Invoice.objects.count(), 2)
+
+    def test_malformed_records_are_reported_without_aborting(self):
+        errors = self.run_import([
+            ['no', 'es', 'un', 'objeto'],
+            self.record(lines=['P1-0']),
+            self.record(payments=[['cash', '1']]),
+            self.record(date='2026-13-45T10:00:00'),
+            self.record(date='ayer'),
+            self.record(lines=[{'sku': 'P1-0', 'quantity': 'NaN'}]),
+            self.record(payments=[{'method': 'cash', 'amount': 'Infinity'}]),
+            self.record(customer=['C1']),
+            self.record(),
+        ])
+        self.assertEqual(len(errors.splitlines()), 8)
+        self.assertIn('línea 1: se esperaba un objeto', errors)
+        self.assertIn('fecha inválida', errors)
+        self.assertIn('valor no finito', errors)
+        self.assertEqual(Invoice.objects.count(), 2)
@@ -13,6 +13,9 @@ from .views import (
     InvoicePaymentUpdateView,
     InvoicePaymentDeleteView,
     InvoicePrintView,
+    InvoicePdfView,
+    ARAgingView,
+    invoice_create_api,
 )
 
 app_name = 'facturas'
@@ -23,6 +26,9 @@ urlpatterns = [
     path('<int:pk>/editar/', InvoiceUpdateView.as_view(), name='update'),
     path('<int:pk>/eliminar/', InvoiceDeleteView.as_view(), name='delete'),
     path('<int:pk>/imprimir/', InvoicePrintView.as_view(), name='print'),
+    path('<int:pk>/pdf/', InvoicePdfView.as_view(), name='pdf'),
+    path('cartera/', ARAgingView.as_view(), name='ar_aging'),
+    path('api/nueva/', invoice_create_api, name='api_create'),
     # Items
     path('<int:invoice_id>/items/', InvoiceLineItemListView.as_view(), name='items_list'),
     path('<int:invoice_id>/items/nuevo/', InvoiceLineItemCreateView.as_view(), name='items_create'),
@@ -1,15 +1,70 @@
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, JsonResponse
 from django.urls import reverse_lazy
-from django.views.generic import ListView, DeleteView, DetailView
+from django.utils.dateparse import parse_date
+from django.utils.timezone import make_aware
+from django.views.decorators.http import require_POST
+from django.views.generic import ListView, DeleteView, DetailView, TemplateView
 from django.views.generic.edit import CreateView, UpdateView
 from django.shortcuts import render, redirect
-from django.db import transaction
-from .models import Invoice, InvoiceLineItem, InvoicePayment
+from django.db import IntegrityError, transaction
+from inventario.models import Warehouse
+from .models import Invoice, InvoiceLineItem, InvoicePayment, InvoiceStatus, PaymentMethod
+from .pagination import KeysetPage, estimate_count
+from .pdf import get_invoice_pdf
+from .reports import ar_aging
 from .forms import InvoiceForm, InvoiceLineItemFormSet
+from .services import autofill_line_items, create_invoice, deferred_invoice_recalc
 
 
 class InvoiceListView(ListView):
+    """
+    Listado con paginación por cursor sobre (date, id) y conteo estimado.
+    Solo se leen las columnas que muestra la plantilla.
+    """
     model = Invoice
-    paginate_by = 20
+    page_size = 20
+
+    def get_queryset(self):
+        qs = (
+            Invoice.objects.select_related('customer', 'warehouse')
+            .only(
+                'number', 'date', 'status', 'total',
+                'customer__codigo', 'customer__nombre',
+                'warehouse__code', 'warehouse__name',
+            )
+        )
+        params = self.request.GET
+        date_from = parse_date(params.get('desde', ''))
+        date_to = parse_date(params.get('hasta', ''))
+        # Rangos sobre la columna (no date__date) para aprovechar los índices
+        if date_from:
+            qs = qs.filter(date__gte=make_aware(datetime.combine(date_from, time.min)))
+        if date_to:
+            qs = qs.filter(date__lt=make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+        if params.get('estado') in InvoiceStatus.values:
+            qs = qs.filter(status=params['estado'])
+        if params.get('bodega', '').isdigit():
+            qs = qs.filter(warehouse_id=params['bodega'])
+        return qs
+
+    def get_context_data(self, **kwargs):
+        page = KeysetPage(self.object_list, 'date', self.page_size, self.request.GET.get('cursor'))
+        total, exact = estimate_count(self.object_list)
+        ctx = super().get_context_data(object_list=page.object_list, **kwargs)
+        ctx.update({
+            'page': page,
+            'total_count': total,
+            'total_is_exact': exact,
+            'status_choices': InvoiceStatus.choices,
+            'warehouses': Warehouse.objects.filter(is_active=True).values_list('pk', 'code'),
+            'filters': self.request.GET,
+        })
+        return ctx
 
 
 class InvoiceCreateView(CreateView):
@@ -24,24 +79,15 @@ class InvoiceCreateView(CreateView):
         return render(request, self.template_name, { 'form': form, 'formset': formset })
 
     @transaction.atomic
+    @deferred_invoice_recalc()
     def post(self, request, *args, **kwargs):
         form = self.form_class(request.POST)
         formset = InvoiceLineItemFormSet(request.POST)
         if form.is_valid() and formset.is_valid():
             invoice = form.save()
             formset.instance = invoice
-            items = formset.save(commit=False)
+            items = autofill_line_items(formset.save(commit=False))
             for it in items:
-                # Autocompletar desde presentación si falta
-                if it.presentation_id:
-                    if not it.sku:
-                        it.sku = it.presentation.sku or it.product.sku
-                    if not it.name:
-                        it.name = it.product.name
-                    if not it.unit_of_measure:
-                        it.unit_of_measure = it.presentation.unit_of_measure
-                    if not it.unit_price or it.unit_price == 0:
-                        it.unit_price = it.presentation.base_price
                 it.invoice = invoice
                 it.save()
             formset.save_m2m()
@@ -62,6 +108,7 @@ class InvoiceUpdateView(UpdateView):
         return render(request, self.template_name, { 'form': form, 'formset': formset, 'object': invoice })
 
     @transaction.atomic
+    @deferred_invoice_recalc()
     def post(self, request, *args, **kwargs):
         invoice = self.get_object()
         form = self.form_class(request.POST, instance=invoice)
@@ -72,16 +119,7 @@ class InvoiceUpdateView(UpdateView):
             # Marcar eliminados
             for obj in formset.deleted_objects:
                 obj.delete()
-            for it in items:
-                if it.presentation_id:
-                    if not it.sku:
-                        it.sku = it.presentation.sku or it.product.sku
-                    if not it.name:
-                        it.name = it.product.name
-                    if not it.unit_of_measure:
-                        it.unit_of_measure = it.presentation.unit_of_measure
-                    if not it.unit_price or it.unit_price == 0:
-                        it.unit_price = it.presentation.base_price
+            for it in autofill_line_items(items):
                 it.invoice = invoice
                 it.save()
             formset.save_m2m()
@@ -202,3 +240,117 @@ class InvoicePrintView(DetailView):
             .select_related('customer', 'warehouse')
             .prefetch_related('line_items__presentation', 'line_items__product', 'payments')
         )
+
+
+class InvoicePdfView(DetailView):
+    """PDF de la factura, servido desde la caché en disco si no ha cambiado."""
+    model = Invoice
+
+    def get_queryset(self):
+        return Invoice.objects.only('pk', 'number', 'updated_at')
+
+    def get(self, request, *args, **kwargs):
+        invoice = self.get_object()
+        path = get_invoice_pdf(invoice)
+        return FileResponse(
+            open(path, 'rb'),
+            content_type='application/pdf',
+            filename=f'factura-{invoice.number}.pdf',
+        )
+
+
+class ARAgingView(TemplateView):
+    """Antigüedad de cartera (0-30/31-60/61-90/90+) por cliente."""
+    template_name = 'facturas/ar_aging.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        rows, totals = ar_aging()
+        ctx.update({'rows': rows, 'totals': totals})
+        return ctx
+
+
+def _decimal(value, field):
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        number = None
+    # NaN e Infinity no son montos ni cantidades
+    if number is None or not number.is_finite():
+        raise ValidationError({field: [f'Valor numérico inválido: {value!r}']})
+    return number
+
+
+@require_POST
+def invoice_create_api(request):
+    """
+    Crea una factura completa desde un carrito JSON del POS en una sola petición.
+
+    {"customer": id, "warehouse": id, "number": "", "sequence": "W1-CAJA1", "status": "draft",
+     "lines": [{"presentation": id, "quantity": "2", "unit_price": "1.50"}, ...],
+     "payments": [{"method": "cash", "amount": "3.00"}]}
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError
+        lines = []
+        for line in payload.get('lines') or []:
+            lines.append({
+                'presentation': line.get('presentation'),
+                'product': line.get('product'),
+                'quantity': _decimal(line.get('quantity'), 'quantity'),
+                'unit_price': _decimal(line['unit_price'], 'unit_price') if line.get('unit_price') not in (None, '') else None,
+                'discount_type': line.get('discount_type'),
+                'discount_value': _decimal(line.get('discount_value') or '0.00', 'discount_value'),
+                'name': line.get('name', ''),
+                'description': line.get('description', ''),
+            })
+        payments = []
+        for payment in payload.get('payments') or []:
+            if payment.get('method') not in PaymentMethod.values:
+                raise ValidationError({'payments': [f"Método de pago inválido: {payment.get('method')!r}"]})
+            payments.append({
+                'method': payment['method'],
+                'amount': _decimal(payment.get('amount'), 'amount'),
+                'reference': payment.get('reference', ''),
+            })
+        invoice, items = create_invoice(
+            customer_id=payload.get('customer'),
+            warehouse_id=payload.get('warehouse'),
+            lines=lines,
+            payments=payments,
+            number=payload.get('number') or '',
+            sequence_code=payload.get('sequence'),
+            currency=payload.get('currency') or 'COP',
+            status=payload.get('status') or 'draft',
+            notes=payload.get('notes', ''),
+        )
+    except ValidationError as e:
+        return JsonResponse({'errors': e.message_dict}, status=400)
+    except IntegrityError:
+        return JsonResponse({'errors': {'number': ['Ya existe una factura con este número']}}, status=409)
+    except (ValueError, AttributeError, TypeError):
+        return JsonResponse({'errors': {'__all__': ['Solicitud inválida']}}, status=400)
+
+    return JsonResponse({
+        'id': invoice.pk,
+        'number': invoice.number,
+        'status': invoice.status,
+        'subtotal': str(invoice.subtotal),
+        'total_discount': str(invoice.total_discount),
+        'total_tax': str(invoice.total_tax),
+        'total': str(invoice.total),
+        'lines': [
+            {
+                'sku': item.sku,
+                'quantity': str(item.quantity),
+                'unit_price': str(item.unit_price),
+                'discount_amount': str(item.discount_amount),
+                'subtotal': str(item.subtotal),
+                'total_tax': str(item.total_tax),
+                'total': str(item.total),
+            }
+            for item in items
+        ],
+    }, status=201)
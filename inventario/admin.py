@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Warehouse, StockItem, InventoryAdjustment
+from .models import Warehouse, StockItem, ProductStock, InventoryAdjustment
 
 
 @admin.register(Warehouse)
@@ -16,6 +16,21 @@ class StockItemAdmin(admin.ModelAdmin):
     list_filter = ("warehouse", "is_active")
 
 
+@admin.register(ProductStock)
+class ProductStockAdmin(admin.ModelAdmin):
+    # Resumen materializado: se mantiene desde StockItem, no se edita a mano
+    list_display = ("warehouse", "product", "quantity", "reserved_quantity", "available_quantity", "items_to_reorder", "updated_at")
+    list_filter = ("warehouse",)
+    search_fields = ("product__sku", "product__name", "warehouse__code")
+    list_select_related = ("warehouse", "product")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(InventoryAdjustment)
 class InventoryAdjustmentAdmin(admin.ModelAdmin):
     list_display = ("created_at", "warehouse", "presentation", "adjustment_type", "quantity", "reason")
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:09
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, Count, F, Q, Sum, When
+
+
+# Copia de inventario.services.stock_rollup_values a la fecha de la migración
+def stock_rollup_values(stock_items):
+    factor = F('presentation__conversion_factor')
+    active = Q(is_active=True, presentation__is_active=True)
+    return (
+        stock_items.order_by()
+        .alias(threshold=Case(When(reorder_point__gt=0, then=F('reorder_point')), default=F('min_quantity')))
+        .values('warehouse_id', product_id=F('presentation__product_id'))
+        .annotate(
+            total_quantity=Sum(F('quantity') * factor, filter=active, default=Decimal('0')),
+            total_reserved=Sum(F('reserved_quantity') * factor, filter=active, default=Decimal('0')),
+            to_reorder=Count('pk', filter=active & Q(quantity__lte=F('reserved_quantity') + F('threshold'))),
+        )
+    )
+
+
+def backfill_product_stock(apps, schema_editor):
+    StockItem = apps.get_model('inventario', 'StockItem')
+    ProductStock = apps.get_model('inventario', 'ProductStock')
+    rows = [
+        ProductStock(
+            product_id=row['product_id'],
+            warehouse_id=row['warehouse_id'],
+            quantity=row['total_quantity'],
+            reserved_quantity=row['total_reserved'],
+            items_to_reorder=row['to_reorder'],
+        )
+        for row in stock_rollup_values(StockItem.objects.all()).iterator()
+    ]
+    ProductStock.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0001_initial'),
+        ('productos', '0003_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=6, default=Decimal('0'), max_digits=20, verbose_name='Cantidad (unidad base)')),
+                ('reserved_quantity', models.DecimalField(decimal_places=6, default=Decimal('0'), max_digits=20, verbose_name='Reservado (unidad base)')),
+                ('items_to_reorder', models.PositiveIntegerField(default=0, verbose_name='Presentaciones por reponer')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summaries', to='productos.product', verbose_name='Producto')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_stock', to='inventario.warehouse', verbose_name='Bodega')),
+            ],
+            options={
+                'verbose_name': 'Stock por Producto',
+                'verbose_name_plural': 'Stock por Producto',
+                'indexes': [models.Index(fields=['warehouse', 'items_to_reorder'], name='inventario__warehou_b74258_idx')],
+                'unique_together': {('product', 'warehouse')},
+            },
+        ),
+        migrations.RunPython(backfill_product_stock, migrations.RunPython.noop),
+    ]
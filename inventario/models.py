@@ -55,6 +55,36 @@ class StockItem(models.Model):
         return self.quantity - self.reserved_quantity
 
 
+class ProductStock(models.Model):
+    """
+    Resumen materializado de stock por producto y bodega, en unidades base
+    (cantidad de cada presentación × conversion_factor). Lo mantiene
+    inventario.services.refresh_product_stock cada vez que cambia un StockItem.
+    """
+    product = models.ForeignKey('productos.Product', on_delete=models.CASCADE, related_name='stock_summaries', verbose_name='Producto')
+    warehouse = models.ForeignKey('inventario.Warehouse', on_delete=models.CASCADE, related_name='product_stock', verbose_name='Bodega')
+
+    quantity = models.DecimalField('Cantidad (unidad base)', max_digits=20, decimal_places=6, default=Decimal('0'))
+    reserved_quantity = models.DecimalField('Reservado (unidad base)', max_digits=20, decimal_places=6, default=Decimal('0'))
+    items_to_reorder = models.PositiveIntegerField('Presentaciones por reponer', default=0)
+    updated_at = models.DateTimeField('Actualizado', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Stock por Producto'
+        verbose_name_plural = 'Stock por Producto'
+        unique_together = [['product', 'warehouse']]
+        indexes = [
+            models.Index(fields=['warehouse', 'items_to_reorder']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.warehouse_id} - {self.product_id}: {self.quantity}"
+
+    @property
+    def available_quantity(self):
+        return self.quantity - self.reserved_quantity
+
+
 class InventoryAdjustment(models.Model):
     """Ajustes de inventario manuales por bodega/presentación"""
     ADJUSTMENT_TYPE = [
@@ -0,0 +1,102 @@
+"""
+Reporte de reposición por bodega.
+
+Una sola consulta por bodega sobre StockItem: filtra los ítems activos cuyo
+disponible (quantity - reserved_quantity) no supera el punto de reorden (o el
+mínimo si no hay punto), trae categoría, producto y la última línea de
+compra recibida de la presentación (proveedor, fecha y costo) y ordena por
+categoría y proveedor. Una sola subconsulta correlacionada (LIMIT 1 sobre
+el índice de la presentación) ubica esa línea y un LEFT JOIN por su pk trae
+todas sus columnas, en lugar de una subconsulta por columna.
+Se recorre con iterator() para exportar catálogos grandes sin cargarlos en
+memoria.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, FilteredRelation, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import StockItem
+
+
+RECEIVED_STATUSES = ('received',)
+
+REPORT_COLUMNS = (
+    ('category_name', 'Categoría'),
+    ('supplier_code', 'Código proveedor'),
+    ('supplier_name', 'Proveedor última compra'),
+    ('last_purchase_date', 'Fecha última compra'),
+    ('last_purchase_cost', 'Costo última compra'),
+    ('presentation__product__sku', 'SKU producto'),
+    ('presentation__product__name', 'Producto'),
+    ('presentation__sku', 'SKU presentación'),
+    ('presentation__name', 'Presentación'),
+    ('quantity', 'Cantidad'),
+    ('reserved_quantity', 'Reservado'),
+    ('available', 'Disponible'),
+    ('reorder_point', 'Punto de reorden'),
+    ('min_quantity', 'Mínimo'),
+    ('max_quantity', 'Máximo'),
+    ('suggested_quantity', 'Cantidad sugerida'),
+)
+
+
+def _last_purchase_item():
+    # Importación perezosa para evitar ciclos
+    from compras.models import PurchaseOrderItem
+
+    return Subquery(
+        PurchaseOrderItem.objects.filter(
+            presentation_id=OuterRef('presentation_id'),
+            purchase_order__status__in=RECEIVED_STATUSES,
+        )
+        .order_by('-purchase_order__order_date', '-pk')
+        .values('pk')[:1]
+    )
+
+
+def reorder_report(warehouse_id):
+    """
+    Queryset de valores (una fila por StockItem a reponer) con las columnas
+    de REPORT_COLUMNS. La cantidad sugerida lleva el disponible hasta el
+    máximo configurado, o hasta el umbral si no hay máximo.
+    """
+    quantity_field = DecimalField(max_digits=15, decimal_places=3)
+    threshold = Case(
+        When(reorder_point__gt=0, then=F('reorder_point')),
+        default=F('min_quantity'),
+        output_field=quantity_field,
+    )
+    available = F('quantity') - F('reserved_quantity')
+    return (
+        StockItem.objects
+        .filter(warehouse_id=warehouse_id, is_active=True, presentation__is_active=True)
+        .alias(threshold=threshold)
+        .filter(quantity__lte=F('reserved_quantity') + F('threshold'))
+        .annotate(
+            available=available,
+            suggested_quantity=Greatest(
+                Coalesce('max_quantity', 'threshold', output_field=quantity_field) - available,
+                Value(Decimal('0')),
+                output_field=quantity_field,
+            ),
+            purchase=FilteredRelation(
+                'presentation__purchase_items',
+                condition=Q(presentation__purchase_items__pk=_last_purchase_item()),
+            ),
+        )
+        .annotate(
+            category_name=F('presentation__product__category__name'),
+            supplier_code=F('purchase__purchase_order__supplier__code'),
+            supplier_name=F('purchase__purchase_order__supplier__name'),
+            last_purchase_date=F('purchase__purchase_order__order_date'),
+            last_purchase_cost=F('purchase__unit_cost'),
+        )
+        .order_by(
+            F('category_name').asc(nulls_last=True),
+            F('supplier_name').asc(nulls_last=True),
+            'presentation__product__name',
+            'presentation__sku',
+        )
+        .values_list(*(name for name, _ in REPORT_COLUMNS))
+    )
@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.utils import timezone
+
+from .models import ProductStock, StockItem
+
+
+@dataclass(frozen=True)
+class StockShortfall:
+    """Faltante de stock de una presentación en una bodega"""
+    presentation_id: int
+    sku: str
+    required: Decimal
+    available: Decimal
+    missing_stock_item: bool = False
+
+    @property
+    def shortage(self):
+        return self.required - self.available
+
+    def message(self, warehouse_code: str) -> str:
+        if self.missing_stock_item:
+            return f"{self.sku}: no existe stock en bodega {warehouse_code}"
+        return (
+            f"{self.sku}: stock insuficiente en {warehouse_code}. "
+            f"Disponible {self.available}, requerido {self.required}"
+        )
+
+    def as_dict(self):
+        return {
+            'presentation_id': self.presentation_id,
+            'sku': self.sku,
+            'required': str(self.required),
+            'available': str(self.available),
+            'shortage': str(self.shortage),
+            'missing_stock_item': self.missing_stock_item,
+        }
+
+
+def check_stock_availability(warehouse_id: int, requested, skus=None):
+    """
+    Verifica si una bodega puede atender un conjunto de cantidades.
+
+    `requested` es un iterable de pares (presentation_id, cantidad); las
+    cantidades de una misma presentación se suman. Todos los StockItem
+    necesarios se leen en una sola consulta `presentation_id__in`. `skus`
+    permite pasar los SKU ya conocidos para no volver a consultarlos.
+    Retorna la lista de faltantes (vacía si todo se puede despachar). Lanza
+    ValueError si alguna cantidad no es un número finito mayor que cero.
+    """
+    required = {}
+    for presentation_id, quantity in requested:
+        quantity = Decimal(quantity)
+        if not quantity.is_finite() or quantity <= 0:
+            raise ValueError(f'Cantidad inválida para la presentación {presentation_id}: {quantity}')
+        required[presentation_id] = required.get(presentation_id, Decimal('0.000')) + quantity
+    if not required:
+        return []
+
+    rows = StockItem.objects.filter(
+        warehouse_id=warehouse_id,
+        presentation_id__in=list(required),
+    ).values_list('presentation_id', 'quantity', 'reserved_quantity', 'presentation__sku')
+    stock = {
+        presentation_id: (quantity - reserved, sku)
+        for presentation_id, quantity, reserved, sku in rows
+    }
+
+    skus = dict(skus or {})
+    unknown = [pk for pk in required if pk not in stock and pk not in skus]
+    if unknown:
+        # Importación perezosa para evitar ciclos
+        from productos.models import ProductPresentation
+        skus.update(ProductPresentation.objects.filter(pk__in=unknown).values_list('pk', 'sku'))
+
+    shortfalls = []
+    for presentation_id, quantity in required.items():
+        if presentation_id not in stock:
+            shortfalls.append(StockShortfall(
+                presentation_id=presentation_id,
+                sku=skus.get(presentation_id, str(presentation_id)),
+                required=quantity,
+                available=Decimal('0.000'),
+                missing_stock_item=True,
+            ))
+            continue
+        available, sku = stock[presentation_id]
+        if quantity > available:
+            shortfalls.append(StockShortfall(
+                presentation_id=presentation_id,
+                sku=sku,
+                required=quantity,
+                available=available,
+            ))
+    return shortfalls
+
+
+def stock_rollup_values(stock_items):
+    """
+    Agrega un queryset de StockItem por (producto, bodega) en unidades base.
+
+    Retorna dicts con product_id, warehouse_id, total_quantity, total_reserved
+    y to_reorder. Solo cuentan los StockItem activos de presentaciones
+    activas; to_reorder son los que además tienen un disponible que no
+    supera el punto de reorden, o el mínimo si no hay punto.
+    """
+    factor = F('presentation__conversion_factor')
+    active = Q(is_active=True, presentation__is_active=True)
+    return (
+        stock_items.order_by()
+        .alias(threshold=Case(When(reorder_point__gt=0, then=F('reorder_point')), default=F('min_quantity')))
+        .values('warehouse_id', product_id=F('presentation__product_id'))
+        .annotate(
+            total_quantity=Sum(F('quantity') * factor, filter=active, default=Decimal('0')),
+            total_reserved=Sum(F('reserved_quantity') * factor, filter=active, default=Decimal('0')),
+            to_reorder=Count('pk', filter=active & Q(quantity__lte=F('reserved_quantity') + F('threshold'))),
+        )
+    )
+
+
+def refresh_product_stock(product_ids):
+    """
+    Recalcula las filas de ProductStock de los productos indicados.
+
+    Solo toca los productos afectados y siempre con el mismo número de
+    consultas: crea las filas que falten, las bloquea en orden estable (así
+    dos transacciones sobre el mismo producto se serializan y la segunda
+    agrega ya viendo los cambios de la primera), agrega sus StockItem en una
+    consulta agrupada y escribe todo con un bulk_update.
+    """
+    product_ids = sorted({pk for pk in product_ids if pk is not None})
+    if not product_ids:
+        return []
+    stock_items = StockItem.objects.filter(presentation__product_id__in=product_ids)
+
+    with transaction.atomic():
+        keys = stock_items.order_by().values_list('presentation__product_id', 'warehouse_id').distinct()
+        ProductStock.objects.bulk_create(
+            [ProductStock(product_id=product_id, warehouse_id=warehouse_id) for product_id, warehouse_id in keys],
+            ignore_conflicts=True,
+        )
+        rows = list(
+            ProductStock.objects.select_for_update()
+            .filter(product_id__in=product_ids)
+            .order_by('pk')
+        )
+        totals = {
+            (row['product_id'], row['warehouse_id']): row
+            for row in stock_rollup_values(stock_items)
+        }
+        now = timezone.now()
+        for summary in rows:
+            row = totals.get((summary.product_id, summary.warehouse_id))
+            summary.quantity = row['total_quantity'] if row else Decimal('0')
+            summary.reserved_quantity = row['total_reserved'] if row else Decimal('0')
+            summary.items_to_reorder = row['to_reorder'] if row else 0
+            summary.updated_at = now
+        ProductStock.objects.bulk_update(
+            rows, ['quantity', 'reserved_quantity', 'items_to_reorder', 'updated_at'],
+        )
+        return rows
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from productos.models import ProductPresentation
+
+from .models import StockItem
+from .services import refresh_product_stock
+
+
+@receiver(pre_save, sender=StockItem)
+def remember_previous_stock_product(sender, instance: StockItem, **kwargs):
+    # Si el StockItem pasa a otra presentación, el producto anterior también cambia
+    instance._previous_presentation_id = None
+    if instance.pk:
+        instance._previous_presentation_id = (
+            StockItem.objects.filter(pk=instance.pk).values_list('presentation_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=StockItem)
+@receiver(post_delete, sender=StockItem)
+def refresh_stock_rollup(sender, instance: StockItem, **kwargs):
+    presentation_ids = {instance.presentation_id, getattr(instance, '_previous_presentation_id', None)}
+    refresh_product_stock(
+        ProductPresentation.objects.filter(pk__in=presentation_ids - {None}).values_list('product_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ProductPresentation)
+def refresh_stock_rollup_on_presentation(sender, instance: ProductPresentation, **kwargs):
+    # El resumen depende del factor de conversión y de si la presentación está activa
+    update_fields = kwargs.get('update_fields')
+    if kwargs.get('created') or (update_fields is not None and not {'conversion_factor', 'is_active'} & set(update_fields)):
+        return
+    refresh_product_stock([instance.product_id])
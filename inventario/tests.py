@@ -1,3 +1,197 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from compras.models import PurchaseOrder, PurchaseOrderItem, Supplier
+from productos.models import Product, ProductCategory, ProductPresentation
+from .models import ProductStock, StockItem, Warehouse
+from .reports import REPORT_COLUMNS, reorder_report
+from .services import check_stock_availability, refresh_product_stock
+
+
+class InventoryTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Principal', code='W1')
+        cls.other_warehouse = Warehouse.objects.create(name='Sucursal', code='W2')
+        cls.product = Product.objects.create(sku='P1', name='Gaseosa')
+        cls.unit = cls.presentation(cls.product, 'P1-UN', 'Unidad', '1')
+        cls.box = cls.presentation(cls.product, 'P1-CJ', 'Caja x12', '12')
+
+    @staticmethod
+    def presentation(product, sku, name, factor):
+        return ProductPresentation.objects.create(
+            product=product, sku=sku, name=name, unit_of_measure='unit', conversion_factor=Decimal(factor),
+            cost=Decimal('1.00'), base_price=Decimal('2.00'),
+        )
+
+    def stock(self, presentation, quantity, warehouse=None, **kwargs):
+        return StockItem.objects.create(
+            warehouse=warehouse or self.warehouse, presentation=presentation, quantity=Decimal(quantity), **kwargs,
+        )
+
+    def summary(self, product=None, warehouse=None):
+        row = ProductStock.objects.get(product=product or self.product, warehouse=warehouse or self.warehouse)
+        return row.quantity, row.reserved_quantity, row.items_to_reorder
+
+
+class StockRollupTests(InventoryTestCase):
+    def test_rollup_in_base_units(self):
+        self.stock(self.unit, '10', reorder_point=Decimal('15'))
+        self.stock(self.box, '2', reserved_quantity=Decimal('1'))
+        self.stock(self.unit, '5', warehouse=self.other_warehouse)
+
+        self.assertEqual(self.summary(), (Decimal('34'), Decimal('12'), 1))
+        self.assertEqual(self.summary(warehouse=self.other_warehouse), (Decimal('5'), Decimal('0'), 0))
+        product = Product.objects.with_stock().get(pk=self.product.pk)
+        self.assertEqual(product.stock_available, Decimal('27'))
+        self.assertTrue(product.stock_needs_restock)
+        product = Product.objects.with_stock(self.other_warehouse).get(pk=self.product.pk)
+        self.assertEqual(product.stock_available, Decimal('5'))
+        self.assertFalse(product.stock_needs_restock)
+
+    def test_presentation_changes_refresh_the_rollup(self):
+        self.stock(self.box, '2', min_quantity=Decimal('5'))
+        self.box.conversion_factor = Decimal('6')
+        self.box.save(update_fields=['conversion_factor'])
+        self.assertEqual(self.summary(), (Decimal('12'), Decimal('0'), 1))
+        self.box.is_active = False
+        self.box.save()
+        self.stock(self.unit, '0', min_quantity=Decimal('1'))
+        # Solo cuenta el ítem activo de la presentación activa
+        self.assertEqual(self.summary(), (Decimal('0'), Decimal('0'), 1))
+
+    def test_inactive_stock_is_not_counted(self):
+        self.stock(self.unit, '10', reserved_quantity=Decimal('2'))
+        self.stock(self.unit, '4', warehouse=self.other_warehouse, is_active=False)
+        self.stock(self.box, '1', reserved_quantity=Decimal('1'))
+        self.box.is_active = False
+        self.box.save()
+
+        self.assertEqual(self.summary(), (Decimal('10'), Decimal('2'), 0))
+        self.assertEqual(self.summary(warehouse=self.other_warehouse), (Decimal('0'), Decimal('0'), 0))
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.available_stock, Decimal('8'))
+        self.assertFalse(product.needs_restock)
+
+    def test_moving_or_deleting_stock_items(self):
+        other = Product.objects.create(sku='P2', name='Agua')
+        other_unit = self.presentation(other, 'P2-UN', 'Unidad', '1')
+        item = self.stock(self.unit, '7')
+        item.presentation = other_unit
+        item.save()
+        self.assertEqual(self.summary()[0], Decimal('0'))
+        self.assertEqual(self.summary(other)[0], Decimal('7'))
+        item.delete()
+        self.assertEqual(self.summary(other)[0], Decimal('0'))
+
+    def test_constant_number_of_queries(self):
+        counts = []
+        for count in (1, 10):
+            products = []
+            for i in range(count):
+                product = Product.objects.create(sku=f'Q{count}-{i}', name=f'Producto {count}-{i}')
+                self.stock(self.presentation(product, f'Q{count}-{i}-UN', 'Unidad', '1'), '1')
+                products.append(product.pk)
+            with CaptureQueriesContext(connection) as queries:
+                refresh_product_stock(products)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class StockAvailabilityTests(InventoryTestCase):
+    def check(self, *items):
+        return self.client.post(
+            reverse('inventario:api_disponibilidad'),
+            json.dumps({'warehouse': self.warehouse.pk, 'items': list(items)}), content_type='application/json',
+        )
+
+    def test_shortfalls(self):
+        self.stock(self.unit, '5', reserved_quantity=Decimal('1'))
+        response = self.check({'presentation': self.unit.pk, 'quantity': '3'}, {'presentation': self.unit.pk, 'quantity': 2})
+        self.assertEqual(response.json()['shortfalls'][0]['shortage'], '1.000')
+        response = self.check({'presentation': self.box.pk, 'quantity': '1'})
+        self.assertTrue(response.json()['shortfalls'][0]['missing_stock_item'])
+
+    def test_rejects_invalid_quantities(self):
+        self.stock(self.unit, '5')
+        for quantity in ('NaN', 'Infinity', '0', '-2', 'x'):
+            with self.subTest(quantity=quantity):
+                self.assertEqual(self.check({'presentation': self.unit.pk, 'quantity': quantity}).status_code, 400)
+        for quantity in (Decimal('NaN'), Decimal('0'), Decimal('-1')):
+            with self.subTest(quantity=quantity), self.assertRaises(ValueError):
+                check_stock_availability(self.warehouse.pk, [(self.unit.pk, quantity)])
+
+
+class ReorderReportTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.product.category = ProductCategory.objects.create(name='Bebidas', code='BEB')
+        cls.product.save()
+        old, new = (
+            Supplier.objects.create(code=code, name=name, tax_id=code)
+            for code, name in (('S1', 'Distribuidora Antigua'), ('S2', 'Distribuidora Nueva'))
+        )
+        for number, supplier, status, day, cost in (
+            ('OC-1', old, 'received', date(2026, 1, 10), Decimal('1.00')),
+            ('OC-2', new, 'received', date(2026, 3, 10), Decimal('1.20')),
+            # Pendiente: no cuenta como última compra
+            ('OC-3', old, 'draft', date(2026, 5, 10), Decimal('1.50')),
+        ):
+            order = PurchaseOrder.objects.create(
+                number=number, supplier=supplier, warehouse=cls.warehouse, status=status, order_date=day,
+            )
+            PurchaseOrderItem.objects.create(
+                purchase_order=order, presentation=cls.unit, quantity=Decimal('10'),
+                unit_cost=cost, line_total=cost * 10,
+            )
+
+    def rows(self):
+        names = [name for name, _ in REPORT_COLUMNS]
+        return [dict(zip(names, row)) for row in reorder_report(self.warehouse.pk)]
+
+    def test_only_items_at_or_below_threshold(self):
+        self.stock(self.unit, '5', reserved_quantity=Decimal('2'), reorder_point=Decimal('4'), max_quantity=Decimal('20'))
+        self.stock(self.box, '3', min_quantity=Decimal('2'))
+        self.stock(self.unit, '0', warehouse=self.other_warehouse, min_quantity=Decimal('5'))
+
+        rows = self.rows()
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row['presentation__sku'], 'P1-UN')
+        self.assertEqual(row['category_name'], 'Bebidas')
+        self.assertEqual(
+            (row['supplier_code'], row['last_purchase_date'], row['last_purchase_cost']),
+            ('S2', date(2026, 3, 10), Decimal('1.20')),
+        )
+        self.assertEqual((row['available'], row['suggested_quantity']), (Decimal('3'), Decimal('17')))
+
+    def test_suggestion_without_maximum_fills_to_threshold(self):
+        self.stock(self.box, '1', min_quantity=Decimal('4'))
+        row = self.rows()[0]
+        self.assertIsNone(row['supplier_code'])
+        self.assertEqual(row['suggested_quantity'], Decimal('3'))
+
+    def test_inactive_items_are_skipped(self):
+        self.stock(self.unit, '0', min_quantity=Decimal('1'), is_active=False)
+        self.assertEqual(self.rows(), [])
+
+    def test_csv_is_streamed(self):
+        self.stock(self.unit, '0', min_quantity=Decimal('1'))
+        response = self.client.get(reverse('inventario:reporte_reposicion', args=[self.warehouse.pk]))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="reposicion-W1.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'Categoría')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Distribuidora Nueva', lines[1])
 
-# Create your tests here.
+    def test_unknown_warehouse(self):
+        response = self.client.get(reverse('inventario:reporte_reposicion', args=[999999]))
+        self.assertEqual(response.status_code, 404)
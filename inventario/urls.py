@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import reorder_report_csv, stock_availability_check
+
+app_name = 'inventario'
+
+urlpatterns = [
+    path('api/disponibilidad/', stock_availability_check, name='api_disponibilidad'),
+    path('reportes/reposicion/<int:warehouse_id>/', reorder_report_csv, name='reporte_reposicion'),
+]
@@ -1,3 +1,69 @@
-from django.shortcuts import render
+import csv
+import json
+from decimal import Decimal, InvalidOperation
 
-# Create your views here.
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import Warehouse
+from .reports import REPORT_COLUMNS, reorder_report
+from .services import check_stock_availability
+
+
+def _quantity(value):
+    # Solo cantidades finitas y positivas: NaN no se puede comparar con el stock
+    quantity = Decimal(str(value))
+    if not quantity.is_finite() or quantity <= 0:
+        raise ValueError(value)
+    return quantity
+
+
+@require_POST
+def stock_availability_check(request):
+    """
+    Verifica si un carrito del POS puede despacharse desde una bodega.
+
+    Espera un JSON {"warehouse": <id>, "items": [{"presentation": <id>, "quantity": "2"}, ...]}.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        warehouse_id = int(payload['warehouse'])
+        requested = [
+            (int(item['presentation']), _quantity(item['quantity']))
+            for item in payload.get('items', [])
+        ]
+    except (ValueError, TypeError, KeyError, InvalidOperation):
+        return JsonResponse({'error': 'Solicitud inválida'}, status=400)
+    shortfalls = check_stock_availability(warehouse_id, requested)
+    return JsonResponse({
+        'ok': not shortfalls,
+        'shortfalls': [s.as_dict() for s in shortfalls],
+    })
+
+
+class _Echo:
+    """Buffer mínimo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+@require_GET
+def reorder_report_csv(request, warehouse_id: int):
+    """
+    Reporte de reposición de una bodega en CSV, generado en streaming: las
+    filas salen del cursor por bloques (iterator) y se escriben a medida que
+    se envían.
+    """
+    warehouse = get_object_or_404(Warehouse, pk=warehouse_id)
+    writer = csv.writer(_Echo())
+
+    def rows():
+        yield writer.writerow([label for _, label in REPORT_COLUMNS])
+        for row in reorder_report(warehouse.pk).iterator(chunk_size=2000):
+            yield writer.writerow(['' if value is None else value for value in row])
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="reposicion-{warehouse.code}.csv"'
+    return response
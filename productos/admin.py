@@ -8,14 +8,23 @@ from .models import (
     VolumePricing,
     PresentationVolumePricing,
     ProductImage,
+    ProductTag,
 )
 
 
 @admin.register(ProductCategory)
 class ProductCategoryAdmin(admin.ModelAdmin):
-    list_display = ("name", "code", "parent", "is_active")
+    list_display = ("name", "code", "parent", "depth", "is_active")
     search_fields = ("name", "code")
-    list_filter = ("is_active",)
+    list_filter = ("is_active", "depth")
+    # Orden de la ruta materializada: cada categoría seguida de su subárbol
+    ordering = ("path",)
+
+
+@admin.register(ProductTag)
+class ProductTagAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug")
+    search_fields = ("slug",)
 
 
 class ProductImageInline(admin.TabularInline):
@@ -30,12 +39,25 @@ class ProductPresentationInline(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("sku", "name", "category", "is_active", "status", "has_presentations")
-    list_filter = ("is_active", "status", "category")
-    search_fields = ("sku", "name", "tags", "brand")
+    list_display = ("sku", "name", "category", "is_active", "status", "has_presentations", "stock", "restock")
+    list_filter = ("is_active", "status", "category", "normalized_tags")
+    # Etiquetas por la tabla normalizada (join indexado) en lugar de LIKE sobre tags
+    search_fields = ("sku", "name", "brand", "=normalized_tags__slug")
     inlines = [ProductPresentationInline, ProductImageInline]
     exclude = ("created_by", "updated_by")
 
+    def get_queryset(self, request):
+        # Stock y alerta de reposición desde el resumen por bodega, en la misma consulta
+        return super().get_queryset(request).with_stock()
+
+    @admin.display(description="Stock disponible", ordering="stock_available")
+    def stock(self, obj):
+        return obj.stock_available
+
+    @admin.display(description="Reponer", boolean=True, ordering="stock_needs_restock")
+    def restock(self, obj):
+        return obj.stock_needs_restock
+
     def save_model(self, request, obj, form, change):
         if not obj.created_by:
             obj.created_by = request.user
@@ -0,0 +1,343 @@
+"""
+Alta/actualización masiva de productos y presentaciones sin pasar por save().
+
+ProductPresentation.save limpia los demás is_default del producto y puede
+guardar el Product en cada llamada; las señales de ambos modelos además
+invalidan cachés y recalculan etiquetas y vectores de búsqueda una fila a la
+vez. Las funciones bulk_upsert_* hacen lo mismo por lotes y por conjuntos:
+por cada lote resuelven las referencias (SKU de producto, código de
+categoría) con una consulta, insertan o actualizan con
+bulk_create(update_conflicts=True) sobre `sku`, corrigen is_default y
+has_presentations con un UPDATE cada uno, y aplican los efectos de las
+señales (cachés, índice de códigos, etiquetas, vectores de búsqueda,
+resumen de stock) para el lote completo. Si una presentación pasa a otro
+producto, el producto anterior se recalcula junto con el nuevo.
+"""
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from inventario.services import refresh_product_stock
+
+from . import scan
+from .models import Product, ProductCategory, ProductPresentation
+from .pricing import invalidate_presentation_prices, invalidate_product_prices
+from .search import refresh_search_vectors, sync_products_tags
+from .snapshots import discard_presentation, discard_product
+
+
+# Campos que nunca se toman de la entrada
+PROTECTED_FIELDS = {'id', 'created_at', 'updated_at', 'created_by', 'updated_by', 'search_vector'}
+
+
+def required_on_create(model, exclude=()):
+    """Campos obligatorios sin valor por defecto: una fila nueva debe traerlos."""
+    return [
+        f.attname for f in model._meta.concrete_fields
+        if not f.null and not f.has_default() and not f.primary_key and (not f.blank or f.get_default() is None)
+        and not getattr(f, 'auto_now', False) and not getattr(f, 'auto_now_add', False)
+        and f.name not in exclude
+    ]
+
+
+@dataclass(frozen=True)
+class Reference:
+    """Columna de entrada que apunta a otro modelo por su clave natural."""
+    column: str      # p. ej. 'product_sku'
+    attname: str     # p. ej. 'product_id'
+    model: type
+    lookup: str      # p. ej. 'sku'
+    required: bool = True
+
+
+@dataclass(frozen=True)
+class UpsertSpec:
+    model: type
+    references: tuple
+    protected: frozenset
+    required: tuple
+
+
+PRESENTATIONS = UpsertSpec(
+    model=ProductPresentation,
+    references=(Reference('product_sku', 'product_id', Product, 'sku'),),
+    protected=frozenset(PROTECTED_FIELDS | {'sku', 'product'}),
+    required=tuple(required_on_create(ProductPresentation, ('sku', 'product'))),
+)
+PRODUCTS = UpsertSpec(
+    model=Product,
+    references=(Reference('category_code', 'category_id', ProductCategory, 'code', required=False),),
+    protected=frozenset(PROTECTED_FIELDS | {'sku', 'category', 'has_presentations'}),
+    required=tuple(required_on_create(Product, ('sku',))),
+)
+
+PRESENTATION_STOCK_FIELDS = {'conversion_factor', 'is_active'}
+PRESENTATION_SEARCH_FIELDS = {'name', 'description'}
+PRODUCT_SEARCH_FIELDS = {'name', 'brand', 'description', 'short_description', 'tags'}
+
+
+class RowError(Exception):
+    pass
+
+
+@dataclass
+class BulkUpsertResult:
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)  # [(número de fila, sku, mensaje)]
+
+    def merge(self, other):
+        self.created += other.created
+        self.updated += other.updated
+        self.errors += other.errors
+
+
+def _field_names(spec, columns):
+    skip = {'sku'} | {r.column for r in spec.references} | {r.attname for r in spec.references}
+    names = []
+    for column in columns:
+        if column in skip:
+            continue
+        if column in spec.protected:
+            raise ValueError(f'El campo {column!r} no se puede importar')
+        try:
+            model_field = spec.model._meta.get_field(column)
+        except FieldDoesNotExist:
+            raise ValueError(f'Campo desconocido {column!r}')
+        if not model_field.concrete or model_field.many_to_many or model_field.is_relation:
+            raise ValueError(f'El campo {column!r} no se puede importar')
+        names.append(model_field.attname)
+    return names
+
+
+def coerce_value(model_field, value):
+    """Convierte un valor de CSV/JSON al tipo del campo ('' es NULL si el campo lo admite)."""
+    if value == '' and model_field.null:
+        return None
+    return model_field.to_python(value)
+
+
+def batches(rows, batch_size):
+    """Agrupa un iterable en listas de hasta `batch_size` elementos, consumiéndolo a medida."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def object_rows(batch, result):
+    """
+    Filas del lote cuyo contenido es un dict; las demás (p. ej. una línea
+    JSONL con una lista) se agregan como error a `result`.
+    """
+    rows = []
+    for number, data in batch:
+        if isinstance(data, dict):
+            rows.append((number, data))
+        else:
+            result.errors.append((number, '', f'se esperaba un objeto, no {type(data).__name__}'))
+    return rows
+
+
+def _upsert(spec, rows, fields, batch_size, user, after_batch):
+    result = BulkUpsertResult()
+    for batch in batches(rows, batch_size):
+        batch = object_rows(batch, result)
+        if not batch:
+            continue
+        if fields is None:
+            fields = list(batch[0][1])
+        for reference in spec.references:
+            if reference.required and reference.column not in fields and reference.attname not in fields:
+                raise ValueError(f'Falta la columna {reference.column!r}')
+        field_names = _field_names(spec, fields)
+        references = [r for r in spec.references if r.column in fields or r.attname in fields]
+        result.merge(_upsert_batch(spec, batch, field_names, references, user, after_batch))
+    return result
+
+
+def _resolve_references(references, batch):
+    resolved = {}
+    for reference in references:
+        keys = {data.get(reference.column) for _, data in batch} - {None, ''}
+        resolved[reference.column] = dict(
+            reference.model.objects.filter(**{f'{reference.lookup}__in': keys}).values_list(reference.lookup, 'pk')
+        ) if keys else {}
+    return resolved
+
+
+def _build(spec, data, model_fields, references, resolved):
+    sku = (data.get('sku') or '').strip()
+    if not sku:
+        raise RowError('falta el SKU')
+    instance = spec.model(sku=sku)
+    for reference in references:
+        key = data.get(reference.column)
+        value = resolved[reference.column].get(key) if key not in (None, '') else data.get(reference.attname)
+        if value in (None, ''):
+            if key not in (None, ''):
+                raise RowError(f'{reference.column} desconocido {key!r}')
+            if reference.required:
+                raise RowError(f'falta {reference.column}')
+            value = None
+        setattr(instance, reference.attname, int(value) if value is not None else None)
+    for model_field in model_fields:
+        if model_field.attname in data:
+            setattr(instance, model_field.attname, coerce_value(model_field, data[model_field.attname]))
+    return instance
+
+
+def _upsert_batch(spec, batch, field_names, references, user, after_batch):
+    result = BulkUpsertResult()
+    model = spec.model
+    model_fields = [model._meta.get_field(name) for name in field_names]
+    resolved = _resolve_references(references, batch)
+
+    # Una sola fila por SKU (la última): ON CONFLICT no admite repetir la clave en un INSERT
+    objects, numbers = {}, {}
+    for number, data in batch:
+        try:
+            instance = _build(spec, data, model_fields, references, resolved)
+        except (RowError, ValidationError, ValueError, TypeError) as exc:
+            message = '; '.join(exc.messages) if isinstance(exc, ValidationError) else str(exc)
+            result.errors.append((number, (data.get('sku') or '').strip(), message))
+            continue
+        if user is not None:
+            instance.created_by = instance.updated_by = user
+        objects[instance.sku] = instance
+        numbers[instance.sku] = number
+    if not objects:
+        return result
+
+    written = [r.attname for r in references] + field_names
+    update_fields = [model._meta.get_field(name).name for name in [*written, 'updated_at']]
+    if user is not None:
+        update_fields.append('updated_by')
+
+    with transaction.atomic():
+        # Referencias previas de las filas existentes (p. ej. el producto del que
+        # sale una presentación que cambia de product_sku)
+        attnames = [r.attname for r in references]
+        previous = {
+            row[0]: dict(zip(['pk', *attnames], row[1:]))
+            for row in model.objects.filter(sku__in=objects).values_list('sku', 'pk', *attnames)
+        }
+        existing = {sku: row['pk'] for sku, row in previous.items()}
+        # Con todos los campos obligatorios el lote completo va en un INSERT ...
+        # ON CONFLICT (sku) DO UPDATE. En una carga parcial (p. ej. solo precios)
+        # las existentes se actualizan con bulk_update y las nuevas deben traer
+        # los obligatorios.
+        partial = not set(spec.required) <= set(written)
+        upsert, updated = [], []
+        for sku, instance in list(objects.items()):
+            if sku in existing and partial:
+                instance.pk = existing[sku]
+                updated.append(instance)
+                continue
+            missing = [name for name in spec.required if getattr(instance, name) in (None, '')]
+            if missing:
+                result.errors.append((numbers[sku], sku, f"faltan campos para crearla: {', '.join(missing)}"))
+                del objects[sku]
+                continue
+            upsert.append(instance)
+        if upsert:
+            model.objects.bulk_create(upsert, update_conflicts=True, unique_fields=['sku'], update_fields=update_fields)
+        if updated:
+            now = timezone.now()
+            for instance in updated:
+                instance.updated_at = now
+            model.objects.bulk_update(updated, update_fields)
+        ids = dict(model.objects.filter(sku__in=objects).values_list('sku', 'pk'))
+        for sku, instance in objects.items():
+            instance.pk = ids[sku]
+        if objects:
+            after_batch(list(objects.values()), set(written), {row['pk']: row for row in previous.values()})
+
+    result.created = len(objects) - len(existing.keys() & objects.keys())
+    result.updated = len(objects) - result.created
+    return result
+
+
+def bulk_upsert_presentations(rows, fields=None, batch_size=1000, user=None):
+    """
+    Crea o actualiza presentaciones identificadas por `sku`.
+
+    `rows` es un iterable de (número de fila, dict); cada dict trae `sku`, el
+    producto (`product_sku` o `product_id`) y valores de campos del modelo
+    (texto de CSV o tipos nativos). `fields` son los campos a escribir (por
+    defecto, las claves de la primera fila); en las presentaciones existentes
+    solo se actualizan esos campos. Cada lote va en su propia transacción.
+    """
+    return _upsert(PRESENTATIONS, rows, fields, batch_size, user, _presentations_written)
+
+
+def bulk_upsert_products(rows, fields=None, batch_size=1000, user=None):
+    """
+    Igual que bulk_upsert_presentations para productos base; la categoría va
+    por su código en `category_code` (vacío = sin categoría).
+    """
+    return _upsert(PRODUCTS, rows, fields, batch_size, user, _products_written)
+
+
+def _presentations_written(presentations, written, previous):
+    product_ids = {p.product_id for p in presentations}
+    # Presentaciones que cambiaron de producto: el anterior también cambia
+    moved = {p.pk: previous[p.pk]['product_id'] for p in presentations
+             if p.pk in previous and previous[p.pk]['product_id'] != p.product_id}
+    moved_from = set(moved.values()) - product_ids
+    defaults = {}
+    if 'is_default' in written:
+        # Una presentación por defecto por producto: la última del lote marcada
+        defaults = {p.product_id: p.pk for p in presentations if p.is_default}
+    elif moved:
+        # La que llega marcada desde otro producto desplaza a la del nuevo
+        defaults = dict(ProductPresentation.objects.filter(pk__in=moved, is_default=True).values_list('product_id', 'pk'))
+    if defaults:
+        (
+            ProductPresentation.objects
+            .filter(product_id__in=defaults, is_default=True)
+            .exclude(pk__in=defaults.values())
+            .update(is_default=False)
+        )
+    Product.objects.filter(pk__in=product_ids, has_presentations=False).update(has_presentations=True)
+    if moved_from:
+        (
+            Product.objects
+            .filter(pk__in=moved_from, has_presentations=True)
+            .exclude(Exists(ProductPresentation.objects.filter(product_id=OuterRef('pk'))))
+            .update(has_presentations=False)
+        )
+    if moved:
+        changed_products = set(moved.values()) | {p.product_id for p in presentations if p.pk in moved}
+        transaction.on_commit(lambda: (invalidate_product_prices(*changed_products), discard_product(*changed_products)))
+    # Si algo cambió de producto, los dos productos se recalculan completos
+    presentations_changed([p.pk for p in presentations], product_ids | moved_from, None if moved else written)
+
+
+def presentations_changed(ids, product_ids, field_names=None):
+    """Lo que harían las señales de post_save de presentaciones, una vez por lote."""
+    changed = set(field_names) if field_names is not None else None
+    transaction.on_commit(lambda: (invalidate_presentation_prices(*ids), discard_presentation(*ids)))
+    # Las instancias del lote pueden no traer todos los códigos: se quitan del
+    # índice y la próxima lectura los toma de la base
+    for presentation_id in ids:
+        scan.remove_presentation(presentation_id)
+    if changed is None or changed & PRESENTATION_SEARCH_FIELDS:
+        refresh_search_vectors(Product.objects.filter(pk__in=product_ids))
+    if changed is None or changed & PRESENTATION_STOCK_FIELDS:
+        refresh_product_stock(product_ids)
+
+
+def _products_written(products, written, previous):
+    ids = [p.pk for p in products]
+    transaction.on_commit(lambda: (invalidate_product_prices(*ids), discard_product(*ids)))
+    if 'tags' in written:
+        sync_products_tags({p.pk: p.tags for p in products})
+    if written & PRODUCT_SEARCH_FIELDS:
+        refresh_search_vectors(Product.objects.filter(pk__in=ids))
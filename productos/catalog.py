@@ -0,0 +1,213 @@
+"""
+Intercambio de catálogo en CSV y JSONL, en streaming.
+
+Entidades: products, presentations, presentation_taxes y
+presentation_tiers. Las relaciones viajan por clave natural (product_sku,
+presentation_sku, category_code), así un archivo exportado de una base se
+importa en otra.
+
+- Exportar: una consulta values_list recorrida con iterator(chunk_size), y
+  cada fila se escribe a medida que llega: la memoria no crece con el
+  catálogo.
+- Importar: las filas se leen del archivo a medida que se consumen y se
+  escriben por lotes. Productos y presentaciones se insertan o actualizan
+  por SKU (productos.bulk). Los impuestos y tramos de una presentación se
+  reemplazan por los del archivo: la primera vez que aparece la
+  presentación se borran los anteriores y luego se agregan los de cada lote
+  con bulk_create, tras validar cada fila con full_clean.
+"""
+import csv
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .bulk import (
+    BulkUpsertResult, batches, bulk_upsert_presentations, bulk_upsert_products, coerce_value, object_rows,
+)
+from .models import PresentationTax, PresentationVolumePricing, Product, ProductPresentation
+from .pricing import invalidate_presentation_prices
+from .snapshots import discard_presentation
+from .taxes import invalidate_presentation_taxes
+
+
+FORMATS = ('csv', 'jsonl')
+
+# Nunca se exportan: auditoría, derivados o mantenidos por el sistema
+EXCLUDED_FIELDS = {'id', 'created_at', 'updated_at', 'created_by', 'updated_by', 'search_vector', 'has_presentations'}
+
+
+@dataclass(frozen=True)
+class Entity:
+    model: type
+    # Claves foráneas exportadas por clave natural: campo -> (columna, ruta)
+    references: dict
+    order_by: tuple
+
+    def columns(self):
+        """[(columna, ruta para values_list)] de todos los campos exportables."""
+        columns = []
+        for model_field in self.model._meta.concrete_fields:
+            if model_field.name in EXCLUDED_FIELDS:
+                continue
+            if model_field.is_relation:
+                if model_field.name in self.references:
+                    columns.append(self.references[model_field.name])
+                continue
+            columns.append((model_field.attname, model_field.attname))
+        return columns
+
+
+ENTITIES = {
+    'products': Entity(Product, {'category': ('category_code', 'category__code')}, ('sku',)),
+    'presentations': Entity(ProductPresentation, {'product': ('product_sku', 'product__sku')}, ('sku',)),
+    'presentation_taxes': Entity(
+        PresentationTax, {'presentation': ('presentation_sku', 'presentation__sku')}, ('presentation__sku', 'pk'),
+    ),
+    'presentation_tiers': Entity(
+        PresentationVolumePricing, {'presentation': ('presentation_sku', 'presentation__sku')},
+        ('presentation__sku', 'min_quantity'),
+    ),
+}
+
+
+def get_entity(name):
+    try:
+        return ENTITIES[name]
+    except KeyError:
+        raise ValueError(f"Entidad desconocida {name!r}; opciones: {', '.join(ENTITIES)}")
+
+
+# ----------------------------------------------------------------------
+# Exportación
+# ----------------------------------------------------------------------
+def export_rows(name, queryset=None, chunk_size=2000):
+    """Genera (columnas, filas) de una entidad; las filas salen del cursor por bloques."""
+    entity = get_entity(name)
+    columns = entity.columns()
+    if queryset is None:
+        queryset = entity.model.objects.all()
+    rows = queryset.order_by(*entity.order_by).values_list(*(path for _, path in columns))
+    return [column for column, _ in columns], rows.iterator(chunk_size=chunk_size)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} no es serializable')
+
+
+def write_rows(fh, columns, rows, fmt):
+    """Escribe las filas en `fh` (texto) y retorna cuántas se escribieron."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_text(value) for value in row])
+            count += 1
+    else:
+        for row in rows:
+            fh.write(json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False))
+            fh.write('\n')
+            count += 1
+    return count
+
+
+# ----------------------------------------------------------------------
+# Importación
+# ----------------------------------------------------------------------
+def read_rows(fh, fmt):
+    """Genera (número de fila, dict) desde un CSV con encabezados o un JSONL."""
+    if fmt == 'csv':
+        # Fila 1 = encabezados
+        yield from enumerate(csv.DictReader(fh), start=2)
+        return
+    for number, line in enumerate(fh, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            raise ValueError(f'línea {number}: JSON inválido: {exc}')
+
+
+def import_rows(name, rows, batch_size=1000, user=None):
+    """Importa filas (número, dict) de una entidad y retorna un BulkUpsertResult."""
+    if name == 'products':
+        return bulk_upsert_products(rows, batch_size=batch_size, user=user)
+    if name == 'presentations':
+        return bulk_upsert_presentations(rows, batch_size=batch_size, user=user)
+    return replace_presentation_children(get_entity(name), rows, batch_size)
+
+
+def replace_presentation_children(entity, rows, batch_size=1000):
+    """
+    Reemplaza impuestos o tramos de las presentaciones que aparecen en el
+    archivo. Cada lote: una consulta para resolver SKU, un DELETE para las
+    presentaciones vistas por primera vez y un bulk_create. Las filas se
+    validan con full_clean; si aun así el lote falla en la base, se revierte
+    completo (también su DELETE) y todas sus filas se reportan con error.
+    """
+    model = entity.model
+    model_fields = [
+        f for f in model._meta.concrete_fields
+        if not f.is_relation and not f.primary_key and f.name not in EXCLUDED_FIELDS
+    ]
+    replaced = set()
+    result = BulkUpsertResult()
+    for batch in batches(rows, batch_size):
+        batch = object_rows(batch, result)
+        skus = {data.get('presentation_sku') for _, data in batch if isinstance(data.get('presentation_sku'), str)}
+        presentations = dict(ProductPresentation.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+        rows_ok, objects = [], []
+        for number, data in batch:
+            sku = data.get('presentation_sku') or ''
+            try:
+                if not isinstance(sku, str) or sku not in presentations:
+                    raise ValueError(f'presentación desconocida {sku!r}')
+                instance = model(presentation_id=presentations[sku])
+                for model_field in model_fields:
+                    if model_field.attname in data:
+                        setattr(instance, model_field.attname, coerce_value(model_field, data[model_field.attname]))
+                instance.full_clean(exclude=['presentation'])
+            except (ValidationError, ValueError, TypeError) as exc:
+                message = '; '.join(exc.messages) if isinstance(exc, ValidationError) else str(exc)
+                result.errors.append((number, sku, message))
+                continue
+            rows_ok.append((number, sku))
+            objects.append(instance)
+        if not objects:
+            continue
+
+        ids = {instance.presentation_id for instance in objects}
+        try:
+            with transaction.atomic():
+                first_seen = ids - replaced
+                if first_seen:
+                    model.objects.filter(presentation_id__in=first_seen).delete()
+                model.objects.bulk_create(objects)
+                transaction.on_commit(lambda ids=list(ids): (
+                    invalidate_presentation_prices(*ids),
+                    invalidate_presentation_taxes(*ids),
+                    discard_presentation(*ids),
+                ))
+        except DatabaseError as exc:
+            result.errors.extend((number, sku, f'lote no guardado: {exc}') for number, sku in rows_ok)
+            continue
+        replaced |= ids
+        result.created += len(objects)
+    return result
@@ -0,0 +1,55 @@
+"""
+Árbol de categorías servido desde la caché de Django.
+
+Se arma con una sola consulta ordenada por la ruta materializada (cada padre
+llega antes que sus hijos) y queda en caché CATALOG_CACHE_TIMEOUT segundos
+bajo una clave versionada. productos.signals lo invalida subiendo la versión
+cuando se guarda o se borra una categoría: un árbol armado antes del cambio
+queda bajo la versión vieja y nunca se vuelve a servir.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ProductCategory
+
+
+CACHE_KEY = 'productos:category_tree'
+VERSION_KEY = 'productos:category_tree:version'
+
+TREE_FIELDS = ('id', 'parent_id', 'name', 'code', 'is_active', 'depth')
+
+
+def build_category_tree():
+    """Lista de categorías raíz; cada nodo trae sus `children` ordenados por nombre."""
+    nodes, roots = {}, []
+    for row in ProductCategory.objects.order_by('path').values(*TREE_FIELDS):
+        parent = nodes.get(row.pop('parent_id'))
+        node = nodes[row['id']] = {**row, 'children': []}
+        (parent['children'] if parent is not None else roots).append(node)
+    for node in nodes.values():
+        node['children'].sort(key=lambda child: child['name'])
+    roots.sort(key=lambda root: root['name'])
+    return roots
+
+
+def _tree_key():
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    return f'{CACHE_KEY}:{version}'
+
+
+def get_category_tree():
+    key = _tree_key()
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(key, tree, settings.CATALOG_CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate_category_tree():
+    cache.add(VERSION_KEY, 1, None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # La versión venció o se desalojó entre add e incr
+        cache.set(VERSION_KEY, 2, None)
@@ -0,0 +1,154 @@
+"""
+Miniaturas y variantes responsivas de ProductImage con Pillow.
+
+render_variants es una función pura (bytes -> bytes) para poder ejecutarse
+tanto en un hilo como en otro proceso. Tras subir una imagen,
+productos.signals llama a schedule_image_processing, que encola el trabajo
+en un pool de hilos al confirmar la transacción: la petición no espera el
+redimensionado. La orden process_product_images reprocesa las existentes en
+paralelo con un pool de procesos.
+
+Para 'products/2025/10/robot.jpg' se escriben:
+- products/thumbnails/2025/10/robot.jpg (campo thumbnail)
+- products/variants/2025/10/robot-320.webp, robot-320.jpg, ... (campo variants)
+"""
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .models import ProductImage
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (200, 200)
+VARIANT_WIDTHS = (320, 640, 1280)
+FORMATS = (
+    # (formato Pillow, extensión, opciones de guardado)
+    ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _to_rgb(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, format_name, options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format_name, **options)
+    return buffer.getvalue()
+
+
+def render_variants(data):
+    """
+    Retorna {'thumbnail': bytes JPEG, 'variants': {ancho: {extensión: bytes}}}.
+    No amplía: solo se generan los anchos menores que el original (o el
+    ancho original si es más chica que todos).
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = _to_rgb(ImageOps.exif_transpose(source))
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    result = {'thumbnail': _encode(thumbnail, 'JPEG', FORMATS[1][2]), 'variants': {}}
+
+    widths = [w for w in VARIANT_WIDTHS if w < image.width] or [image.width]
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        result['variants'][width] = {
+            extension: _encode(resized, format_name, options)
+            for format_name, extension, options in FORMATS
+        }
+    return result
+
+
+def _derived_name(image_name, folder, suffix=''):
+    # products/2025/10/robot.jpg -> products/<folder>/2025/10/robot<suffix>
+    head, filename = posixpath.split(image_name)
+    root, _, rest = head.partition('/')
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(root, folder, rest, stem + suffix)
+
+
+def _replace(storage, name, data):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(data))
+
+
+def store_variants(image: ProductImage, rendered):
+    """Escribe los archivos generados y los registra sin volver a disparar señales."""
+    storage = image.image.storage
+    name = image.image.name
+    thumbnail = _replace(storage, _derived_name(name, 'thumbnails', '.jpg'), rendered['thumbnail'])
+    variants = {
+        str(width): {
+            extension: _replace(storage, _derived_name(name, 'variants', f'-{width}.{extension}'), data)
+            for extension, data in formats.items()
+        }
+        for width, formats in rendered['variants'].items()
+    }
+    # Solo si la imagen no cambió mientras se procesaba
+    ProductImage.objects.filter(pk=image.pk, image=name).update(thumbnail=thumbnail, variants=variants)
+    image.thumbnail.name, image.variants = thumbnail, variants
+    return image
+
+
+def read_image(image: ProductImage):
+    with image.image.open('rb') as handle:
+        return handle.read()
+
+
+def process_image(image_id):
+    """Genera miniatura y variantes de una imagen; retorna la instancia o None."""
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return None
+    return store_variants(image, render_variants(read_image(image)))
+
+
+def _process_in_worker(image_id):
+    # Cada hilo del pool usa su propia conexión: se cierra al terminar
+    try:
+        process_image(image_id)
+    except Exception:
+        logger.exception('No se pudo procesar la imagen de producto %s', image_id)
+    finally:
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PRODUCT_IMAGE_WORKERS, thread_name_prefix='product-images',
+            )
+        return _executor
+
+
+def schedule_image_processing(image_id):
+    """
+    Encola el procesamiento al confirmar la transacción. Con
+    PRODUCT_IMAGE_WORKERS = 0 se procesa en línea (útil en pruebas).
+    """
+    if settings.PRODUCT_IMAGE_WORKERS > 0:
+        transaction.on_commit(lambda: _get_executor().submit(_process_in_worker, image_id))
+    else:
+        transaction.on_commit(lambda: process_image(image_id))
@@ -0,0 +1,139 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from productos.models import ProductPresentation
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara las búsquedas del formulario de factura (clientes y presentaciones) '
+        'servidas por el handler WSGI (un hilo por petición) y por el ASGIHandler de Django '
+        '(vistas async en un solo event loop).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Peticiones por endpoint y modo')
+        parser.add_argument('--concurrency', type=int, default=50, help='Peticiones simultáneas')
+        parser.add_argument('--query', default='a', help='Texto de búsqueda de clientes')
+        parser.add_argument('--presentation', type=int, help='Presentación a consultar (por defecto la primera)')
+        parser.add_argument('--db-latency', type=float, default=0, help='Retardo artificial por consulta, en ms (simula una base lenta)')
+
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+        if total < 1 or concurrency < 1:
+            raise CommandError('--requests y --concurrency deben ser mayores que cero')
+        presentation_id = options['presentation'] or ProductPresentation.objects.values_list('pk', flat=True).first()
+        if presentation_id is None:
+            raise CommandError('No hay presentaciones para consultar')
+
+        if options['db_latency']:
+            self.add_latency(options['db_latency'] / 1000)
+
+        endpoints = [
+            ('clientes_search', reverse('clientes:api_buscar'), {'q': options['query']}),
+            ('presentation_detail', reverse('productos:presentation_detail', args=[presentation_id]), {}),
+        ]
+        self.stdout.write(f'{total} peticiones por caso, concurrencia {concurrency}')
+        # Los clientes de prueba usan el host 'testserver', como en la suite de tests
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            self.run_all(endpoints, total, concurrency)
+
+    def run_all(self, endpoints, total, concurrency):
+        for name, path, params in endpoints:
+            for mode, runner in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                started = time.perf_counter()
+                timings = runner(path, params, total, concurrency)
+                elapsed = time.perf_counter() - started
+                timings.sort()
+                self.stdout.write(
+                    f'{name:<20} {mode}: {total / elapsed:8.0f} req/s  '
+                    f'p50 {statistics.median(timings) * 1000:7.2f} ms  '
+                    f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:7.2f} ms'
+                )
+
+    def add_latency(self, seconds):
+        def slow(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(connection, **kwargs):
+            if slow not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow)
+
+        # Cada hilo abre su propia conexión: se instala también en las nuevas
+        connection_created.connect(install, weak=False)
+        for connection in connections.all():
+            install(connection)
+
+    def check_response(self, status, content):
+        if status != 200:
+            raise CommandError(f'Respuesta {status}: {content[:200]!r}')
+
+    def run_wsgi(self, path, params, total, concurrency):
+        def request(_):
+            client = Client()
+            started = time.perf_counter()
+            response = client.get(path, params)
+            elapsed = time.perf_counter() - started
+            self.check_response(response.status_code, response.content)
+            return elapsed
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(request, range(total)))
+        connections.close_all()
+        return timings
+
+    def run_asgi(self, path, params, total, concurrency):
+        # ASGIHandler y no AsyncClient: el handler abre un ThreadSensitiveContext
+        # por petición, como bajo un servidor ASGI real. AsyncClient no lo hace y
+        # todas las llamadas sync_to_async terminan en un único hilo.
+        handler = ASGIHandler()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+            'query_string': urlencode(params).encode(), 'headers': [(b'host', b'testserver')],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        }
+
+        async def request(semaphore):
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            status, body = None, []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Sin desconexión: el handler cancela esta espera al terminar
+                await asyncio.Future()
+
+            async def send(message):
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                elif message['type'] == 'http.response.body':
+                    body.append(message.get('body', b''))
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(dict(scope), receive, send)
+                elapsed = time.perf_counter() - started
+            self.check_response(status, b''.join(body))
+            return elapsed
+
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(request(semaphore) for _ in range(total)))
+
+        timings = list(asyncio.run(main()))
+        connections.close_all()
+        return timings
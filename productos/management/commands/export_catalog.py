@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.catalog import ENTITIES, FORMATS, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta productos, presentaciones, impuestos o tramos de presentaciones a CSV o JSONL. '
+        'Las filas se leen con iterator(chunk_size) y se escriben a medida que llegan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('entity', choices=list(ENTITIES))
+        parser.add_argument('--format', choices=FORMATS, help='Por defecto según la extensión (csv sin --output)')
+        parser.add_argument('--output', '-o', help='Archivo de salida (por defecto, la salida estándar)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Filas por lectura del cursor')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero')
+        output = options['output']
+        fmt = options['format'] or ('jsonl' if output and output.endswith(('.jsonl', '.json')) else 'csv')
+        started = time.monotonic()
+        columns, rows = export_rows(options['entity'], chunk_size=options['chunk_size'])
+        if output:
+            try:
+                fh = open(output, 'w', encoding='utf-8', newline='')
+            except OSError as exc:
+                raise CommandError(str(exc))
+            with fh:
+                count = write_rows(fh, columns, rows, fmt)
+            self.stderr.write(self.style.SUCCESS(
+                f'{count} filas exportadas a {output} en {time.monotonic() - started:.1f}s'
+            ))
+        else:
+            write_rows(sys.stdout, columns, rows, fmt)
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from productos.bulk import bulk_upsert_presentations
+from productos.catalog import FORMATS, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea o actualiza presentaciones por SKU desde un CSV (con encabezados) o un JSONL. '
+        'Cada fila trae sku, product_sku y los campos a escribir; se procesa por lotes '
+        'con bulk_create(update_conflicts=True), sin save() por fila.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo .csv o .jsonl')
+        parser.add_argument('--format', choices=FORMATS, help='Por defecto según la extensión')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Filas por lote/transacción')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser mayor que cero')
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.json')) else 'csv')
+        started = time.monotonic()
+        try:
+            fh = open(options['path'], encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(str(exc))
+        with fh:
+            try:
+                result = bulk_upsert_presentations(read_rows(fh, fmt), batch_size=options['batch_size'])
+            except (ValueError, IntegrityError) as exc:
+                raise CommandError(str(exc))
+
+        for number, sku, message in result.errors:
+            self.stderr.write(f'fila {number} ({sku or "sin SKU"}): {message}')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.created} creadas, {result.updated} actualizadas, {len(result.errors)} con error '
+            f'en {elapsed:.1f}s'
+        ))
+
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.margins import brand_margins, category_margins, simulate_repricing
+
+
+class Command(BaseCommand):
+    help = 'Resumen de márgenes del catálogo por categoría o marca, con simulación opcional de cambios de precio/costo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--by', choices=['category', 'brand'], default='category', help='Agrupación del resumen')
+        parser.add_argument('--price-change', type=float, default=0, help='Cambio de precios a simular, en %%')
+        parser.add_argument('--cost-change', type=float, default=0, help='Cambio de costos a simular, en %%')
+        parser.add_argument('--target-margin', type=float, help='Contar presentaciones que quedarían bajo este margen')
+
+    def handle(self, *args, **options):
+        if options['by'] == 'category':
+            rows, label = category_margins(), 'category__name'
+        else:
+            rows, label = brand_margins(), 'brand'
+
+        for row in rows:
+            self.stdout.write(
+                f"{(row[label] or '(sin asignar)')[:40]:<40} {row['products']:>7} productos  "
+                f"promedio {row['avg_margin'] or 0:8.2f}%  "
+                f"mín {row['min_margin'] or 0:8.2f}%  máx {row['max_margin'] or 0:8.2f}%  "
+                f"sin costo {row['without_cost']}"
+            )
+
+        if options['price_change'] or options['cost_change'] or options['target_margin'] is not None:
+            try:
+                result = simulate_repricing(options['price_change'], options['cost_change'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            summary = result.summary(options['target_margin'])
+            self.stdout.write(
+                f"Simulación sobre {summary['presentations']} presentaciones: margen promedio "
+                f"{summary['current_avg_margin']:.2f}% -> {summary['new_avg_margin']:.2f}%"
+            )
+            if 'below_target' in summary:
+                self.stdout.write(f"Bajo el margen objetivo: {summary['below_target']}")
@@ -0,0 +1,56 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.images import read_image, render_variants, store_variants
+from productos.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera miniaturas y variantes WebP/JPEG de las imágenes de productos existentes. '
+        'El redimensionado corre en paralelo en un pool de procesos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocesar también las que ya tienen variantes')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos en paralelo')
+        parser.add_argument('--product', help='Solo las imágenes de este SKU de producto')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers debe ser mayor que cero')
+        images = ProductImage.objects.exclude(image='').order_by('pk')
+        if not options['all']:
+            images = images.filter(variants={})
+        if options['product']:
+            images = images.filter(product__sku=options['product'])
+
+        done = failed = 0
+        # Ventana acotada de trabajos en vuelo: no se cargan todas las imágenes en memoria
+        window = workers * 2
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for image in images.iterator(chunk_size=200):
+                try:
+                    pending.append((image, pool.submit(render_variants, read_image(image))))
+                except OSError as exc:
+                    failed += 1
+                    self.stderr.write(f'{image.image.name}: {exc}')
+                if len(pending) >= window:
+                    done, failed = self.collect(pending.popleft(), done, failed)
+            for job in pending:
+                done, failed = self.collect(job, done, failed)
+        self.stdout.write(f'{done} imágenes procesadas, {failed} con error')
+
+    def collect(self, job, done, failed):
+        image, future = job
+        try:
+            store_variants(image, future.result())
+        except Exception as exc:
+            self.stderr.write(f'{image.image.name}: {exc}')
+            return done, failed + 1
+        return done + 1, failed
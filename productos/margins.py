@@ -0,0 +1,172 @@
+"""
+Análisis de márgenes del catálogo calculado en la base de datos.
+
+Los márgenes siguen la fórmula de calculate_profit_margin de los modelos
+((precio - costo) / costo × 100, cero si no hay costo), pero como
+anotaciones: el margen de cada presentación es una expresión, el de cada
+producto con presentaciones es el promedio de sus presentaciones activas con
+costo (subconsulta correlacionada) y los resúmenes por categoría o marca
+agrupan esa anotación en una sola consulta.
+
+simulate_repricing recalcula márgenes con precios/costos hipotéticos; usa
+NumPy si está instalado y, si no, un recorrido en Python con Decimal.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import (
+    Avg, Case, Count, DecimalField, Exists, ExpressionWrapper, F, Max, Min, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from .models import Product, ProductPresentation
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional
+    np = None
+
+
+MARGIN_FIELD = DecimalField(max_digits=20, decimal_places=4)
+
+
+def margin_expression(cost='cost', price='base_price'):
+    """(precio - costo) / costo × 100, o 0 si el costo no es positivo."""
+    return Case(
+        When(**{f'{cost}__gt': 0}, then=ExpressionWrapper(
+            (F(price) - F(cost)) * Value(Decimal('100')) / F(cost), output_field=MARGIN_FIELD,
+        )),
+        default=Value(Decimal('0')),
+        output_field=MARGIN_FIELD,
+    )
+
+
+def presentation_margins(queryset=None):
+    """Presentaciones anotadas con `margin`."""
+    if queryset is None:
+        queryset = ProductPresentation.objects.all()
+    return queryset.annotate(margin=margin_expression())
+
+
+def _costed_presentations():
+    return ProductPresentation.objects.filter(product_id=OuterRef('pk'), is_active=True, cost__gt=0)
+
+
+def product_margin_expression():
+    """Margen del producto: promedio de sus presentaciones activas con costo, o el margen propio."""
+    average = Subquery(
+        _costed_presentations().order_by().values('product_id')
+        .annotate(avg=Avg(margin_expression())).values('avg'),
+        output_field=MARGIN_FIELD,
+    )
+    return Case(
+        When(has_presentations=True, then=Coalesce(average, Value(Decimal('0')), output_field=MARGIN_FIELD)),
+        default=margin_expression(),
+        output_field=MARGIN_FIELD,
+    )
+
+
+def product_margins(queryset=None):
+    """
+    Productos anotados con `margin` (mismo valor que calculate_profit_margin,
+    sin consultas por producto): se lee la anotación directamente.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.annotate(margin=product_margin_expression())
+
+
+def margin_rollup(group_by, queryset=None):
+    """
+    Resumen de márgenes por producto agrupado por los campos `group_by`
+    (p. ej. ('category_id', 'category__name') o ('brand',)) en una consulta.
+    Cada fila trae products, avg_margin, min_margin, max_margin y
+    without_cost (productos cuyo margen no se puede calcular: sin costo
+    propio o, si tienen presentaciones, sin ninguna activa con costo).
+    """
+    if queryset is None:
+        queryset = Product.objects.filter(is_active=True)
+    return (
+        queryset.order_by()
+        .alias(margin=product_margin_expression(), costed=Exists(_costed_presentations()))
+        .values(*group_by)
+        .annotate(
+            products=Count('pk'),
+            avg_margin=Avg('margin'),
+            min_margin=Min('margin'),
+            max_margin=Max('margin'),
+            without_cost=Count('pk', filter=(
+                Q(has_presentations=False, cost__lte=0) | Q(has_presentations=True, costed=False)
+            )),
+        )
+        .order_by(*group_by)
+    )
+
+
+def category_margins(queryset=None):
+    return margin_rollup(('category_id', 'category__name'), queryset)
+
+
+def brand_margins(queryset=None):
+    return margin_rollup(('brand',), queryset)
+
+
+@dataclass
+class RepricingResult:
+    """Márgenes actuales y simulados por presentación (listas o arrays de NumPy)."""
+    ids: object
+    prices: object
+    current_margins: object
+    new_margins: object
+
+    def summary(self, target_margin=None):
+        count = len(self.ids)
+        mean = np.mean if np is not None else (lambda values: sum(values) / len(values))
+        result = {
+            'presentations': count,
+            'current_avg_margin': mean(self.current_margins) if count else 0,
+            'new_avg_margin': mean(self.new_margins) if count else 0,
+        }
+        if target_margin is not None:
+            if np is not None:
+                result['below_target'] = int(np.count_nonzero(np.asarray(self.new_margins) < float(target_margin)))
+            else:
+                result['below_target'] = sum(1 for margin in self.new_margins if margin < target_margin)
+        return result
+
+
+def simulate_repricing(price_change=0, cost_change=0, queryset=None):
+    """
+    Simula un cambio porcentual de precios y/o costos sobre las presentaciones
+    activas con costo. Lee (id, costo, precio) en una consulta y calcula los
+    márgenes de forma vectorizada con NumPy si está disponible.
+    """
+    if cost_change <= -100:
+        raise ValueError('El cambio de costo debe ser mayor que -100%')
+    if queryset is None:
+        queryset = ProductPresentation.objects.filter(is_active=True)
+    rows = list(queryset.filter(cost__gt=0).order_by('pk').values_list('pk', 'cost', 'base_price'))
+
+    if np is not None:
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        costs = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        prices = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        new_prices = prices * (1 + float(price_change) / 100)
+        new_costs = costs * (1 + float(cost_change) / 100)
+        return RepricingResult(
+            ids=ids,
+            prices=new_prices,
+            current_margins=(prices - costs) / costs * 100,
+            new_margins=(new_prices - new_costs) / new_costs * 100,
+        )
+
+    price_factor = 1 + Decimal(str(price_change)) / 100
+    cost_factor = 1 + Decimal(str(cost_change)) / 100
+    ids, prices, current, new = [], [], [], []
+    for pk, cost, price in rows:
+        new_price, new_cost = price * price_factor, cost * cost_factor
+        ids.append(pk)
+        prices.append(new_price)
+        current.append((price - cost) / cost * 100)
+        new.append((new_price - new_cost) / new_cost * 100)
+    return RepricingResult(ids=ids, prices=prices, current_margins=current, new_margins=new)
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:06
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
+
+
+# Copias de productos.search a la fecha de la migración
+
+def parse_tags(tags):
+    result = {}
+    for name in (tags or '').split(','):
+        name = ' '.join(name.split())
+        slug = slugify(name)[:100]
+        if slug and slug not in result:
+            result[slug] = name[:100]
+    return result
+
+
+def search_vector_expression(presentation_model, tag_through):
+    def joined(queryset, field):
+        return Coalesce(
+            Subquery(
+                queryset.order_by().values('product_id')
+                .annotate(s=StringAgg(field, delimiter=' ')).values('s')
+            ),
+            Value(''),
+            output_field=TextField(),
+        )
+
+    presentations = presentation_model.objects.filter(product_id=OuterRef('pk'))
+    tags = tag_through.objects.filter(product_id=OuterRef('pk'))
+    return (
+        SearchVector('name', weight='A', config='spanish')
+        + SearchVector('brand', joined(presentations, 'name'), joined(tags, 'producttag__name'),
+                       weight='B', config='spanish')
+        + SearchVector('short_description', 'description', joined(presentations, 'description'),
+                       weight='C', config='spanish')
+    )
+
+
+def backfill_search(apps, schema_editor):
+    Product = apps.get_model('productos', 'Product')
+    ProductTag = apps.get_model('productos', 'ProductTag')
+    ProductPresentation = apps.get_model('productos', 'ProductPresentation')
+    through = Product.normalized_tags.through
+
+    product_tags = {pk: parse_tags(tags) for pk, tags in Product.objects.exclude(tags='').values_list('pk', 'tags')}
+    names = {}
+    for tags in product_tags.values():
+        for slug, name in tags.items():
+            names.setdefault(slug, name)
+    ProductTag.objects.bulk_create([ProductTag(slug=s, name=n) for s, n in names.items()], ignore_conflicts=True)
+    tag_ids = dict(ProductTag.objects.values_list('slug', 'pk'))
+    through.objects.bulk_create(
+        [through(product_id=pk, producttag_id=tag_ids[slug]) for pk, tags in product_tags.items() for slug in tags],
+        batch_size=2000,
+        ignore_conflicts=True,
+    )
+    if schema_editor.connection.vendor == 'postgresql':
+        Product.objects.update(search_vector=search_vector_expression(ProductPresentation, through))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_remove_lineitemtax_line_item_delete_invoicelineitem_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('slug', models.SlugField(max_length=100, unique=True, verbose_name='Slug')),
+            ],
+            options={
+                'verbose_name': 'Etiqueta',
+                'verbose_name_plural': 'Etiquetas',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Vector de Búsqueda'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='normalized_tags',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='products', to='productos.producttag', verbose_name='Etiquetas Normalizadas'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='productos_search_vector_idx'),
+        ),
+        migrations.RunPython(backfill_search, migrations.RunPython.noop),
+    ]
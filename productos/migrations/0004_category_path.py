@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:12
+
+from django.db import migrations, models
+
+
+# Copia de productos.models.category_path_segment a la fecha de la migración
+def category_path_segment(pk):
+    return f'{pk:08d}/'
+
+
+def backfill_category_paths(apps, schema_editor):
+    ProductCategory = apps.get_model('productos', 'ProductCategory')
+    categories = list(ProductCategory.objects.only('pk', 'parent_id'))
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+    # Recorrido desde las raíces; lo que no se alcanza (ciclos) queda como raíz
+    pending = [(category, '', 0) for category in children.get(None, [])]
+    seen = set()
+    while pending:
+        category, parent_path, depth = pending.pop()
+        seen.add(category.pk)
+        category.path, category.depth = parent_path + category_path_segment(category.pk), depth
+        pending.extend((child, category.path, depth + 1) for child in children.get(category.pk, []))
+    for category in categories:
+        if category.pk not in seen:
+            category.path, category.depth = category_path_segment(category.pk), 0
+    ProductCategory.objects.bulk_update(categories, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Nivel'),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Ruta'),
+        ),
+        migrations.AddIndex(
+            model_name='productcategory',
+            index=models.Index(fields=['path'], name='productos_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,14 @@
 """
 models.py - Estructura de Productos para Sistema de Facturación Django
 """
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, Exists, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from decimal import Decimal
 
 User = get_user_model()
@@ -57,8 +62,19 @@ class DiscountType(models.TextChoices):
 # MODELOS PRINCIPALES
 # ============================================
 
+def category_path_segment(pk):
+    """Segmento de la ruta materializada: id con ceros a la izquierda y '/'."""
+    return f'{pk:08d}/'
+
+
 class ProductCategory(models.Model):
-    """Categorías de productos con soporte para anidación"""
+    """
+    Categorías de productos con soporte para anidación.
+
+    `path` es la ruta materializada (ids de los ancestros y el propio, p. ej.
+    '00000001/00000007/'), mantenida en save(); todo el subárbol de una
+    categoría se filtra con path__startswith en una consulta.
+    """
     name = models.CharField('Nombre', max_length=100)
     code = models.CharField('Código', max_length=20, unique=True, blank=True, null=True)
     description = models.TextField('Descripción', blank=True)
@@ -70,6 +86,8 @@ class ProductCategory(models.Model):
         blank=True,
         verbose_name='Categoría Padre'
     )
+    path = models.CharField('Ruta', max_length=255, editable=False, default='')
+    depth = models.PositiveSmallIntegerField('Nivel', editable=False, default=0)
     is_active = models.BooleanField('Activo', default=True)
     created_at = models.DateTimeField('Creado', auto_now_add=True)
     updated_at = models.DateTimeField('Actualizado', auto_now=True)
@@ -78,10 +96,130 @@ class ProductCategory(models.Model):
         verbose_name = 'Categoría de Producto'
         verbose_name_plural = 'Categorías de Productos'
         ordering = ['name']
+        indexes = [
+            # Subárboles con LIKE 'ruta%'
+            models.Index(fields=['path'], name='productos_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def _stored_path(self):
+        if self.pk is None:
+            return None
+        return ProductCategory.objects.filter(pk=self.pk).values_list('path', 'depth').first()
+
+    def _parent_path(self):
+        if self.parent_id is None:
+            return '', -1
+        return ProductCategory.objects.filter(pk=self.parent_id).values_list('path', 'depth').get()
+
+    def _check_parent(self, stored, parent_path):
+        if stored and stored[0] and parent_path.startswith(stored[0]):
+            raise ValidationError({'parent': 'Una categoría no puede colgar de sí misma ni de sus subcategorías'})
+
+    def clean(self):
+        super().clean()
+        if self.parent_id is not None and self.pk is not None:
+            self._check_parent(self._stored_path(), self._parent_path()[0])
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' not in update_fields:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            stored = self._stored_path()
+            parent_path, parent_depth = self._parent_path()
+            self._check_parent(stored, parent_path)
+            super().save(*args, **kwargs)
+
+            path = parent_path + category_path_segment(self.pk)
+            depth = parent_depth + 1
+            if stored and stored[0] and stored[0] != path:
+                # Movimiento: se reescribe todo el subárbol en un solo UPDATE
+                old_path, old_depth = stored
+                ProductCategory.objects.filter(path__startswith=old_path).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1), output_field=models.CharField()),
+                    depth=F('depth') + (depth - old_depth),
+                )
+            elif not stored or stored[0] != path:
+                ProductCategory.objects.filter(pk=self.pk).update(path=path, depth=depth)
+            self.path, self.depth = path, depth
+
+    def get_descendants(self, include_self=True):
+        """Subárbol completo en una consulta."""
+        qs = ProductCategory.objects.filter(path__startswith=self.path)
+        return qs if include_self else qs.exclude(pk=self.pk)
+
+    def get_ancestors(self):
+        """Ancestros desde la raíz, leídos de la ruta."""
+        ids = [int(segment) for segment in self.path.split('/')[:-2]]
+        return ProductCategory.objects.filter(pk__in=ids).order_by('depth')
+
+
+class ProductTag(models.Model):
+    """Etiqueta normalizada; se sincroniza desde Product.tags"""
+    name = models.CharField('Nombre', max_length=100)
+    slug = models.SlugField('Slug', max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = 'Etiqueta'
+        verbose_name_plural = 'Etiquetas'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def in_category(self, category):
+        """Productos de la categoría y de todas sus subcategorías (una consulta)."""
+        if isinstance(category, ProductCategory):
+            return self.filter(category__path__startswith=category.path)
+        path = ProductCategory.objects.filter(pk=category).values('path')[:1]
+        return self.filter(category__path__startswith=Subquery(path))
+
+    def with_stock(self, warehouse=None):
+        """
+        Anota stock_available (unidades base) y stock_needs_restock en la misma
+        consulta, leyendo el resumen inventario.ProductStock. Con `warehouse`
+        se limita a una bodega. Los productos sin presentaciones usan su stock
+        propio.
+        """
+        # Importación perezosa para evitar ciclos
+        from inventario.models import ProductStock
+
+        summaries = ProductStock.objects.filter(product_id=OuterRef('pk'))
+        if warehouse is not None:
+            summaries = summaries.filter(warehouse=warehouse)
+        stock_field = models.DecimalField(max_digits=20, decimal_places=6)
+        rollup = Coalesce(
+            Subquery(
+                summaries.order_by().values('product_id')
+                .annotate(total=Sum(F('quantity') - F('reserved_quantity'))).values('total')
+            ),
+            Value(Decimal('0')),
+            output_field=stock_field,
+        )
+        return self.annotate(
+            stock_available=Case(
+                When(has_presentations=True, then=rollup),
+                default=F('current_stock') - F('reserved_stock'),
+                output_field=stock_field,
+            ),
+            stock_needs_restock=Case(
+                When(has_presentations=True, then=Exists(summaries.filter(items_to_reorder__gt=0))),
+                When(reorder_point__gt=0, then=ExpressionWrapper(
+                    Q(current_stock__lte=F('reserved_stock') + F('reorder_point')), output_field=models.BooleanField(),
+                )),
+                default=ExpressionWrapper(
+                    Q(current_stock__lte=F('reserved_stock') + F('min_stock')), output_field=models.BooleanField(),
+                ),
+                output_field=models.BooleanField(),
+            ),
+        )
+
 
 class Product(models.Model):
     """
@@ -245,6 +383,15 @@ class Product(models.Model):
     
     # Metadata
     tags = models.CharField('Etiquetas', max_length=500, blank=True, help_text='Separadas por comas')
+    normalized_tags = models.ManyToManyField(
+        ProductTag,
+        blank=True,
+        editable=False,
+        related_name='products',
+        verbose_name='Etiquetas Normalizadas'
+    )
+    # Documento de búsqueda (español); lo mantiene productos.search
+    search_vector = SearchVectorField('Vector de Búsqueda', null=True, editable=False)
     notes = models.TextField('Notas', blank=True)
     
     # Auditoría
@@ -266,6 +413,8 @@ class Product(models.Model):
         verbose_name='Actualizado Por'
     )
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
@@ -274,6 +423,7 @@ class Product(models.Model):
             models.Index(fields=['sku']),
             models.Index(fields=['is_active', 'status']),
             models.Index(fields=['category', 'is_active']),
+            GinIndex(fields=['search_vector'], name='productos_search_vector_idx'),
         ]
 
     def __str__(self):
@@ -283,29 +433,36 @@ class Product(models.Model):
     def available_stock(self):
         """
         Calcula el stock disponible total.
-        Si tiene presentaciones, suma el stock de todas ellas.
-        Si no, usa el stock propio.
+        Si tiene presentaciones, suma el resumen por bodega (unidades base).
+        Si no, usa el stock propio. Usa la anotación de with_stock() si existe.
         """
+        if hasattr(self, 'stock_available'):
+            return self.stock_available
         if self.has_presentations:
-            total = Decimal('0.000')
-            for presentation in self.presentations.filter(is_active=True):
-                total += presentation.available_stock
-            return total
+            total = self.stock_summaries.aggregate(
+                total=Sum(F('quantity') - F('reserved_quantity')),
+            )['total']
+            return total or Decimal('0.000')
         return self.current_stock - self.reserved_stock
 
     @property
     def needs_restock(self):
         """Verifica si necesita reposición"""
+        if hasattr(self, 'stock_needs_restock'):
+            return self.stock_needs_restock
         if self.has_presentations:
-            # Si alguna presentación activa necesita reposición
-            return any(p.needs_restock for p in self.presentations.filter(is_active=True))
-        
+            # Si alguna presentación de alguna bodega está bajo su punto de reorden
+            return self.stock_summaries.filter(items_to_reorder__gt=0).exists()
+
         if self.reorder_point:
             return self.available_stock <= self.reorder_point
         return self.available_stock <= self.min_stock
 
     def get_tags_list(self):
         """Retorna las etiquetas como lista"""
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'normalized_tags' in prefetched:
+            return [tag.name for tag in prefetched['normalized_tags']]
         if self.tags:
             return [tag.strip() for tag in self.tags.split(',')]
         return []
@@ -772,6 +929,8 @@ class ProductImage(models.Model):
     )
     image = models.ImageField('Imagen', upload_to='products/%Y/%m/')
     thumbnail = models.ImageField('Miniatura', upload_to='products/thumbnails/%Y/%m/', blank=True, null=True)
+    # {ancho: {extensión: archivo}}, generado por productos.images
+    variants = models.JSONField('Variantes', default=dict, blank=True, editable=False)
     alt_text = models.CharField('Texto Alternativo', max_length=255, blank=True)
     is_primary = models.BooleanField('Imagen Principal', default=False)
     order = models.PositiveIntegerField('Orden', default=0)
@@ -785,6 +944,22 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"{self.product.sku} - Imagen {self.order}"
 
+    def variant_urls(self):
+        """{ancho: {extensión: url}} de las variantes generadas."""
+        storage = self.image.storage
+        return {
+            width: {extension: storage.url(name) for extension, name in formats.items()}
+            for width, formats in self.variants.items()
+        }
+
+    def srcset(self, extension='webp'):
+        """Valor para el atributo srcset de <img>/<source>."""
+        urls = self.variant_urls()
+        return ', '.join(
+            f"{urls[width][extension]} {width}w"
+            for width in sorted(urls, key=int) if extension in urls[width]
+        )
+
     def save(self, *args, **kwargs):
         # Si es imagen principal, quitar flag de otras imágenes
         if self.is_primary:
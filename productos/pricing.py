@@ -0,0 +1,136 @@
+"""
+Resolución de precios por volumen.
+
+Los tramos activos de cada presentación (PresentationVolumePricing) y de cada
+producto (VolumePricing) se cargan ordenados por cantidad mínima en una
+PriceList, y el tramo de una cantidad se busca con bisect. El precio de una
+línea sale del tramo de la presentación, si no del tramo del producto y en
+último caso del precio base. Las listas se guardan en la caché de Django
+durante CATALOG_CACHE_TIMEOUT segundos y se invalidan desde productos.signals.
+"""
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PresentationVolumePricing, Product, ProductPresentation, VolumePricing
+
+
+SOURCE_PRESENTATION_TIER = 'presentation_tier'
+SOURCE_PRODUCT_TIER = 'product_tier'
+SOURCE_BASE_PRICE = 'base_price'
+
+
+class PriceList:
+    """Precio base y tramos (min, max, precio) ordenados por cantidad mínima."""
+    __slots__ = ('product_id', 'base_price', 'mins', 'tiers')
+
+    def __init__(self, product_id, base_price, tiers=()):
+        self.product_id = product_id
+        self.base_price = base_price
+        tiers = sorted(tiers, key=lambda t: t[0])
+        self.mins = [t[0] for t in tiers]
+        self.tiers = [(t[1], t[2]) for t in tiers]
+
+    def tier_price(self, quantity):
+        """Precio del tramo con la mayor cantidad mínima <= quantity, o None."""
+        index = bisect_right(self.mins, quantity) - 1
+        if index < 0:
+            return None
+        max_quantity, price = self.tiers[index]
+        if max_quantity is not None and quantity > max_quantity:
+            return None
+        return price
+
+
+def _presentation_key(presentation_id):
+    return f'productos:prices:presentation:{presentation_id}'
+
+
+def _product_key(product_id):
+    return f'productos:prices:product:{product_id}'
+
+
+def _load(ids, key, load_missing):
+    cached = cache.get_many([key(pk) for pk in ids])
+    result = {pk: cached[key(pk)] for pk in ids if key(pk) in cached}
+    missing = [pk for pk in ids if pk not in result]
+    if missing:
+        loaded = load_missing(missing)
+        # Los ids inexistentes también se guardan (None) para no consultarlos en cada tecla
+        cache.set_many({key(pk): loaded.get(pk) for pk in missing}, settings.CATALOG_CACHE_TIMEOUT)
+        result.update(loaded)
+    return {pk: price_list for pk, price_list in result.items() if price_list is not None}
+
+
+def _load_presentations(ids):
+    tiers = {pk: [] for pk in ids}
+    for presentation_id, *tier in PresentationVolumePricing.objects.filter(
+        presentation_id__in=ids, is_active=True,
+    ).values_list('presentation_id', 'min_quantity', 'max_quantity', 'price'):
+        tiers[presentation_id].append(tier)
+    return {
+        pk: PriceList(product_id, base_price, tiers[pk])
+        for pk, product_id, base_price in ProductPresentation.objects.filter(pk__in=ids).values_list(
+            'pk', 'product_id', 'base_price',
+        )
+    }
+
+
+def _load_products(ids):
+    tiers = {pk: [] for pk in ids}
+    for product_id, *tier in VolumePricing.objects.filter(
+        product_id__in=ids, is_active=True,
+    ).values_list('product_id', 'min_quantity', 'max_quantity', 'price'):
+        tiers[product_id].append(tier)
+    return {
+        pk: PriceList(pk, base_price, tiers[pk])
+        for pk, base_price in Product.objects.filter(pk__in=ids).values_list('pk', 'base_price')
+    }
+
+
+def resolve_unit_prices(lines):
+    """
+    Precia un carrito completo. Recibe tuplas (presentation_id, product_id,
+    quantity) —product_id se ignora si hay presentación— y retorna una lista
+    paralela de (precio, origen), o None si la presentación/producto no existe.
+    Con la caché caliente no hace consultas.
+    """
+    lines = list(lines)
+    presentations = _load(
+        {presentation_id for presentation_id, _, _ in lines if presentation_id}, _presentation_key, _load_presentations,
+    )
+    product_ids = {
+        presentations[presentation_id].product_id if presentation_id in presentations else product_id
+        for presentation_id, product_id, _ in lines
+    }
+    products = _load(product_ids - {None}, _product_key, _load_products)
+
+    result = []
+    for presentation_id, product_id, quantity in lines:
+        presentation = presentations.get(presentation_id) if presentation_id else None
+        if presentation_id and presentation is None:
+            result.append(None)
+            continue
+        product = products.get(presentation.product_id if presentation else product_id)
+        if presentation is None and product is None:
+            result.append(None)
+            continue
+        price = presentation.tier_price(quantity) if presentation else None
+        if price is not None:
+            result.append((price, SOURCE_PRESENTATION_TIER))
+            continue
+        price = product.tier_price(quantity) if product else None
+        if price is not None:
+            result.append((price, SOURCE_PRODUCT_TIER))
+            continue
+        result.append(((presentation or product).base_price, SOURCE_BASE_PRICE))
+    return result
+
+
+def invalidate_presentation_prices(*presentation_ids):
+    cache.delete_many([_presentation_key(pk) for pk in presentation_ids])
+
+
+def invalidate_product_prices(*product_ids):
+    cache.delete_many([_product_key(pk) for pk in product_ids])
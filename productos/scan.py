@@ -0,0 +1,175 @@
+"""
+Índice en memoria código -> presentación para la lectura de códigos en caja.
+
+El índice (dict) cubre código de barras, SKU y código interno de las
+presentaciones activas y se mantiene por señales (update_presentation /
+remove_presentation). Un código que no está en el índice se busca en la base
+y se agrega, así los cambios hechos por otros procesos también se encuentran.
+
+La construcción inicial y la reconstrucción periódica (MAX_AGE, para
+descartar códigos que cambiaron en otro proceso) corren en un hilo aparte,
+uno a la vez: mientras tanto lookup sigue respondiendo con el índice anterior
+(o, antes de la primera construcción, con la consulta de un solo código). El
+índice nuevo se arma fuera del candado y se intercambia al final, aplicando
+los cambios que llegaron por señales durante la reconstrucción.
+"""
+import logging
+import threading
+import time
+
+from django.db import connections
+from django.db.models import Q
+
+from .models import ProductPresentation
+
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE = 600  # segundos
+
+# Prioridad ante colisiones: el código de barras gana sobre el SKU y este sobre el interno
+CODE_FIELDS = ('internal_code', 'sku', 'barcode')
+
+_lock = threading.Lock()
+_codes = {}            # código -> (prioridad, presentation_id)
+_by_presentation = {}  # presentation_id -> (código, ...)
+_built_at = None
+_rebuilding = False
+_changes = None        # [(presentation_id, códigos | None)] recibidos durante una reconstrucción
+
+
+def _normalize(code):
+    return (code or '').strip()
+
+
+def _index(presentation_id, codes, index=None, by_presentation=None):
+    index = _codes if index is None else index
+    by_presentation = _by_presentation if by_presentation is None else by_presentation
+    indexed = []
+    for rank, code in enumerate(map(_normalize, codes)):
+        if not code:
+            continue
+        current = index.get(code)
+        if current is None or rank >= current[0]:
+            index[code] = (rank, presentation_id)
+        indexed.append(code)
+    by_presentation[presentation_id] = tuple(indexed)
+
+
+def _unindex(presentation_id, index=None, by_presentation=None):
+    index = _codes if index is None else index
+    by_presentation = _by_presentation if by_presentation is None else by_presentation
+    for code in by_presentation.pop(presentation_id, ()):
+        current = index.get(code)
+        if current is not None and current[1] == presentation_id:
+            del index[code]
+
+
+def rebuild():
+    """Reconstruye el índice completo en el hilo actual."""
+    global _codes, _by_presentation, _built_at, _changes
+    with _lock:
+        _changes = []
+    codes, by_presentation = {}, {}
+    try:
+        rows = ProductPresentation.objects.filter(is_active=True).values_list('pk', *CODE_FIELDS)
+        for pk, *row in rows.iterator():
+            _index(pk, row, codes, by_presentation)
+    except Exception:
+        with _lock:
+            _changes = None
+        raise
+    with _lock:
+        for presentation_id, row in _changes:
+            _unindex(presentation_id, codes, by_presentation)
+            if row is not None:
+                _index(presentation_id, row, codes, by_presentation)
+        _changes = None
+        _codes, _by_presentation = codes, by_presentation
+        _built_at = time.monotonic()
+
+
+def _rebuild_in_background():
+    global _rebuilding
+    try:
+        rebuild()
+    except Exception:
+        logger.exception('No se pudo reconstruir el índice de códigos')
+    finally:
+        with _lock:
+            _rebuilding = False
+        connections.close_all()
+
+
+def _schedule_rebuild():
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild_in_background, name='scan-index', daemon=True).start()
+
+
+def _indexed(code):
+    if _built_at is None or time.monotonic() - _built_at > MAX_AGE:
+        _schedule_rebuild()
+    entry = _codes.get(code)
+    return entry[1] if entry is not None else None
+
+
+def _code_query(code):
+    return ProductPresentation.objects.filter(
+        Q(barcode=code) | Q(sku=code) | Q(internal_code=code), is_active=True,
+    ).values_list('pk', *CODE_FIELDS)
+
+
+def lookup(code):
+    """Retorna el id de la presentación activa con ese código, o None."""
+    code = _normalize(code)
+    if not code:
+        return None
+    presentation_id = _indexed(code)
+    if presentation_id is not None:
+        return presentation_id
+    row = _code_query(code).first()
+    if row is None:
+        return None
+    _record(row[0], row[1:])
+    return row[0]
+
+
+async def alookup(code):
+    """Versión async: un acierto no sale del event loop; un fallo usa el ORM async."""
+    code = _normalize(code)
+    if not code:
+        return None
+    presentation_id = _indexed(code)
+    if presentation_id is not None:
+        return presentation_id
+    row = await _code_query(code).afirst()
+    if row is None:
+        return None
+    _record(row[0], row[1:])
+    return row[0]
+
+
+def _record(presentation_id, codes):
+    with _lock:
+        _unindex(presentation_id)
+        if codes is not None:
+            _index(presentation_id, codes)
+        if _changes is not None:
+            _changes.append((presentation_id, codes))
+
+
+def update_presentation(presentation):
+    """Reindexa una presentación guardada (o la quita si quedó inactiva)."""
+    if _built_at is None and _changes is None:
+        return
+    _record(presentation.pk, [getattr(presentation, f) for f in CODE_FIELDS] if presentation.is_active else None)
+
+
+def remove_presentation(presentation_id):
+    if _built_at is None and _changes is None:
+        return
+    _record(presentation_id, None)
@@ -0,0 +1,132 @@
+"""
+Búsqueda de texto completo en el catálogo.
+
+Cada producto tiene un search_vector (configuración 'spanish') con pesos:
+A nombre, B marca, nombres de sus presentaciones y etiquetas, C descripciones
+del producto y de sus presentaciones.
+Se recalcula en SQL con un solo UPDATE por lote (refresh_search_vectors),
+disparado desde productos.signals. Las etiquetas de Product.tags se
+normalizan en ProductTag para filtrar con un join indexado.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
+
+from .models import Product, ProductPresentation, ProductTag
+
+
+SEARCH_CONFIG = 'spanish'
+
+
+def parse_tags(tags):
+    """'Bebidas, gaseosa ,bebidas' -> {'bebidas': 'Bebidas', 'gaseosa': 'gaseosa'}"""
+    result = {}
+    for name in (tags or '').split(','):
+        name = ' '.join(name.split())
+        slug = slugify(name)[:100]
+        if slug and slug not in result:
+            result[slug] = name[:100]
+    return result
+
+
+def sync_product_tags(product):
+    """Refleja Product.tags en la tabla de etiquetas normalizadas."""
+    tags = parse_tags(product.tags)
+    if tags:
+        ProductTag.objects.bulk_create(
+            [ProductTag(slug=slug, name=name) for slug, name in tags.items()], ignore_conflicts=True,
+        )
+    product.normalized_tags.set(ProductTag.objects.filter(slug__in=tags))
+
+
+def sync_products_tags(tags_by_product):
+    """
+    Versión por lotes de sync_product_tags: {product_id: tags}. Crea las
+    etiquetas nuevas y reemplaza los vínculos de esos productos con un
+    DELETE y un INSERT.
+    """
+    parsed = {product_id: parse_tags(tags) for product_id, tags in tags_by_product.items()}
+    names = {}
+    for tags in parsed.values():
+        for slug, name in tags.items():
+            names.setdefault(slug, name)
+    if names:
+        ProductTag.objects.bulk_create(
+            [ProductTag(slug=slug, name=name) for slug, name in names.items()], ignore_conflicts=True,
+        )
+    tag_ids = dict(ProductTag.objects.filter(slug__in=names).values_list('slug', 'pk')) if names else {}
+    through = Product.normalized_tags.through
+    through.objects.filter(product_id__in=parsed).delete()
+    through.objects.bulk_create([
+        through(product_id=product_id, producttag_id=tag_ids[slug])
+        for product_id, tags in parsed.items() for slug in tags
+    ])
+
+
+def search_vector_expression():
+    """Expresión SearchVector para UPDATE ... SET search_vector."""
+    def joined(queryset, field):
+        return Coalesce(
+            Subquery(
+                queryset.order_by().values('product_id')
+                .annotate(s=StringAgg(field, delimiter=' ')).values('s')
+            ),
+            Value(''),
+            output_field=TextField(),
+        )
+
+    presentations = ProductPresentation.objects.filter(product_id=OuterRef('pk'))
+    tags = Product.normalized_tags.through.objects.filter(product_id=OuterRef('pk'))
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('brand', joined(presentations, 'name'), joined(tags, 'producttag__name'),
+                       weight='B', config=SEARCH_CONFIG)
+        + SearchVector('short_description', 'description', joined(presentations, 'description'),
+                       weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(queryset):
+    """Recalcula el vector de los productos del queryset en un solo UPDATE."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return 0
+    return queryset.order_by().update(search_vector=search_vector_expression())
+
+
+def search_products(q='', tags=(), page=1, per_page=20, warehouse=None, category=None):
+    """
+    Búsqueda paginada: retorna (productos, hay_más). Con texto se ordena por
+    SearchRank; cada etiqueta agrega un join indexado por slug. Fuera de
+    PostgreSQL el texto se busca con icontains. `category` incluye sus
+    subcategorías. Cada producto trae anotados stock_available y
+    stock_needs_restock (de `warehouse` o de todas).
+    """
+    qs = Product.objects.filter(is_active=True)
+    if category is not None:
+        qs = qs.in_category(category)
+    for tag in tags:
+        qs = qs.filter(normalized_tags__slug=slugify(tag))
+    q = (q or '').strip()
+    if q and connections[qs.db].vendor == 'postgresql':
+        query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+        qs = qs.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', 'pk')
+    elif q:
+        qs = qs.filter(
+            Q(name__icontains=q) | Q(brand__icontains=q) | Q(sku__iexact=q) | Q(presentations__name__icontains=q)
+            | Q(description__icontains=q) | Q(presentations__description__icontains=q)
+        ).distinct().order_by('name', 'pk')
+    else:
+        qs = qs.order_by('name', 'pk')
+
+    offset = (max(page, 1) - 1) * per_page
+    rows = list(
+        qs.with_stock(warehouse).select_related('category')
+        .only('pk', 'sku', 'name', 'brand', 'base_price', 'unit_of_measure', 'category__name')
+        .prefetch_related('normalized_tags')[offset:offset + per_page + 1]
+    )
+    return rows[:per_page], len(rows) > per_page
@@ -0,0 +1,146 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .categories import invalidate_category_tree
+from .images import schedule_image_processing
+from .models import (
+    PresentationTax, PresentationVolumePricing, Product, ProductCategory, ProductImage, ProductPresentation,
+    ProductTax, VolumePricing,
+)
+from .pricing import invalidate_presentation_prices, invalidate_product_prices
+from .scan import remove_presentation, update_presentation
+from .search import refresh_search_vectors, sync_product_tags
+from .snapshots import discard_presentation, discard_product
+from .taxes import invalidate_presentation_taxes, invalidate_product_taxes
+
+
+@receiver(pre_save, sender=PresentationTax)
+def invalidate_previous_presentation_taxes(sender, instance: PresentationTax, **kwargs):
+    # Si el impuesto se movió a otra presentación, la anterior también cambia
+    if instance.pk:
+        previous = PresentationTax.objects.filter(pk=instance.pk).values_list('presentation_id', flat=True).first()
+        if previous and previous != instance.presentation_id:
+            invalidate_presentation_taxes(previous)
+            discard_presentation(previous)
+
+
+@receiver(post_save, sender=PresentationTax)
+@receiver(post_delete, sender=PresentationTax)
+def invalidate_presentation_tax_cache(sender, instance: PresentationTax, **kwargs):
+    invalidate_presentation_taxes(instance.presentation_id)
+
+
+@receiver(pre_save, sender=ProductTax)
+def invalidate_previous_product_taxes(sender, instance: ProductTax, **kwargs):
+    if instance.pk:
+        previous = ProductTax.objects.filter(pk=instance.pk).values_list('product_id', flat=True).first()
+        if previous and previous != instance.product_id:
+            invalidate_product_taxes(previous)
+            discard_product(previous)
+
+
+@receiver(post_save, sender=ProductTax)
+@receiver(post_delete, sender=ProductTax)
+def invalidate_product_tax_cache(sender, instance: ProductTax, **kwargs):
+    invalidate_product_taxes(instance.product_id)
+
+
+@receiver(post_save, sender=ProductPresentation)
+@receiver(post_delete, sender=ProductPresentation)
+def invalidate_presentation_price_cache(sender, instance: ProductPresentation, **kwargs):
+    invalidate_presentation_prices(instance.pk)
+
+
+@receiver(post_save, sender=PresentationVolumePricing)
+@receiver(post_delete, sender=PresentationVolumePricing)
+def invalidate_presentation_tier_cache(sender, instance: PresentationVolumePricing, **kwargs):
+    invalidate_presentation_prices(instance.presentation_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_price_cache(sender, instance: Product, **kwargs):
+    invalidate_product_prices(instance.pk)
+
+
+@receiver(post_save, sender=VolumePricing)
+@receiver(post_delete, sender=VolumePricing)
+def invalidate_product_tier_cache(sender, instance: VolumePricing, **kwargs):
+    invalidate_product_prices(instance.product_id)
+
+
+# Instantáneas en memoria del proceso (productos.snapshots)
+@receiver(post_save, sender=ProductPresentation)
+@receiver(post_delete, sender=ProductPresentation)
+def discard_presentation_snapshot(sender, instance: ProductPresentation, **kwargs):
+    discard_presentation(instance.pk)
+
+
+@receiver(post_save, sender=PresentationTax)
+@receiver(post_delete, sender=PresentationTax)
+@receiver(post_save, sender=PresentationVolumePricing)
+@receiver(post_delete, sender=PresentationVolumePricing)
+def discard_presentation_snapshot_on_related(sender, instance, **kwargs):
+    discard_presentation(instance.presentation_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def discard_product_snapshots(sender, instance: Product, **kwargs):
+    discard_product(instance.pk)
+
+
+@receiver(post_save, sender=ProductTax)
+@receiver(post_delete, sender=ProductTax)
+@receiver(post_save, sender=VolumePricing)
+@receiver(post_delete, sender=VolumePricing)
+def discard_product_snapshots_on_related(sender, instance, **kwargs):
+    discard_product(instance.product_id)
+
+
+@receiver(post_save, sender=ProductPresentation)
+def reindex_presentation_codes(sender, instance: ProductPresentation, **kwargs):
+    update_presentation(instance)
+
+
+@receiver(post_delete, sender=ProductPresentation)
+def unindex_presentation_codes(sender, instance: ProductPresentation, **kwargs):
+    remove_presentation(instance.pk)
+
+
+# Búsqueda de catálogo (productos.search)
+@receiver(post_save, sender=Product)
+def refresh_product_search(sender, instance: Product, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not {'tags', 'name', 'brand', 'description', 'short_description'} & set(update_fields):
+        return
+    if update_fields is None or 'tags' in update_fields:
+        sync_product_tags(instance)
+    refresh_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=ProductPresentation)
+@receiver(post_delete, sender=ProductPresentation)
+def refresh_product_search_on_presentation(sender, instance: ProductPresentation, **kwargs):
+    refresh_search_vectors(Product.objects.filter(pk=instance.product_id))
+
+
+# Árbol de categorías en caché (productos.categories)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def invalidate_category_tree_cache(sender, instance: ProductCategory, **kwargs):
+    invalidate_category_tree()
+
+
+# Miniaturas y variantes (productos.images)
+@receiver(pre_save, sender=ProductImage)
+def remember_previous_image(sender, instance: ProductImage, **kwargs):
+    instance._previous_image = None
+    if instance.pk:
+        instance._previous_image = ProductImage.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=ProductImage)
+def process_uploaded_image(sender, instance: ProductImage, created, **kwargs):
+    if instance.image and (created or instance.image.name != getattr(instance, '_previous_image', None)):
+        schedule_image_processing(instance.pk)
@@ -0,0 +1,180 @@
+"""
+Caché en memoria del proceso con instantáneas de presentaciones.
+
+Las consultas del POS (productos.views.product_presentation_detail) piden una
+y otra vez los mismos pocos cientos de SKU. Cada instantánea es un registro
+pequeño con __slots__ (SKU, nombres, precios, unidad, impuestos resueltos y
+tramos por volumen) guardado en un LRU acotado. Las señales de productos
+descartan las entradas afectadas; MAX_AGE limita cuánto puede tardar otro
+proceso (sin la señal) en ver un cambio.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+
+from .models import PresentationVolumePricing, ProductPresentation, VolumePricing
+from .taxes import resolve_tax_rules
+
+
+MAX_ENTRIES = 2048
+MAX_AGE = 300  # segundos
+
+
+class PresentationSnapshot:
+    __slots__ = (
+        'id', 'product_id', 'sku', 'name', 'product_name', 'unit_of_measure',
+        'base_price', 'wholesale_price', 'retail_price', 'taxes', 'volume_tiers', 'loaded_at',
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'sku': self.sku or '',
+            'name': self.name,
+            'product_name': self.product_name,
+            'unit_price': str(self.base_price or 0),
+            'wholesale_price': str(self.wholesale_price) if self.wholesale_price is not None else None,
+            'retail_price': str(self.retail_price) if self.retail_price is not None else None,
+            'unit_of_measure': self.unit_of_measure,
+            'taxes': [
+                {
+                    'tax_type': t.tax_type, 'name': t.name, 'rate': str(t.rate), 'is_included': t.is_included,
+                    'tax_base': str(t.tax_base) if t.tax_base is not None else None,
+                }
+                for t in self.taxes
+            ],
+            'volume_pricing': [
+                {'min_quantity': str(lo), 'max_quantity': str(hi) if hi is not None else None, 'price': str(price)}
+                for lo, hi, price in self.volume_tiers
+            ],
+        }
+
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # presentation_id -> PresentationSnapshot
+_by_product = {}           # product_id -> {presentation_id, ...}
+_stats = {'hits': 0, 'misses': 0}
+
+
+SNAPSHOT_FIELDS = (
+    'id', 'product_id', 'sku', 'name', 'product__name', 'unit_of_measure',
+    'base_price', 'wholesale_price', 'retail_price',
+)
+TIER_FIELDS = ('min_quantity', 'max_quantity', 'price')
+
+
+def _tier_querysets(presentation_id, product_id):
+    return (
+        PresentationVolumePricing.objects.filter(presentation_id=presentation_id, is_active=True)
+        .order_by('min_quantity').values_list(*TIER_FIELDS),
+        VolumePricing.objects.filter(product_id=product_id, is_active=True)
+        .order_by('min_quantity').values_list(*TIER_FIELDS),
+    )
+
+
+def _build(row, tiers, taxes):
+    row['product_name'] = row.pop('product__name')
+    return PresentationSnapshot(**row, taxes=tuple(taxes), volume_tiers=tuple(tiers), loaded_at=time.monotonic())
+
+
+def _load(presentation_id):
+    row = ProductPresentation.objects.filter(pk=presentation_id).values(*SNAPSHOT_FIELDS).first()
+    if row is None:
+        return None
+    presentation_tiers, product_tiers = _tier_querysets(presentation_id, row['product_id'])
+    tiers = list(presentation_tiers) or list(product_tiers)
+    key = (presentation_id, row['product_id'])
+    return _build(row, tiers, resolve_tax_rules([key])[key])
+
+
+async def _aload(presentation_id):
+    row = await ProductPresentation.objects.filter(pk=presentation_id).values(*SNAPSHOT_FIELDS).afirst()
+    if row is None:
+        return None
+    presentation_tiers, product_tiers = _tier_querysets(presentation_id, row['product_id'])
+    tiers = [t async for t in presentation_tiers] or [t async for t in product_tiers]
+    key = (presentation_id, row['product_id'])
+    taxes = await sync_to_async(resolve_tax_rules)([key])
+    return _build(row, tiers, taxes[key])
+
+
+def _cached(presentation_id):
+    with _lock:
+        snapshot = _entries.get(presentation_id)
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < MAX_AGE:
+            _entries.move_to_end(presentation_id)
+            _stats['hits'] += 1
+            return snapshot
+        _stats['misses'] += 1
+    return None
+
+
+def _store(snapshot):
+    with _lock:
+        _entries[snapshot.id] = snapshot
+        _entries.move_to_end(snapshot.id)
+        _by_product.setdefault(snapshot.product_id, set()).add(snapshot.id)
+        while len(_entries) > MAX_ENTRIES:
+            _, evicted = _entries.popitem(last=False)
+            _forget_product_link(evicted)
+    return snapshot
+
+
+def get_presentation_snapshot(presentation_id):
+    """Retorna la instantánea de la presentación (o None si no existe)."""
+    snapshot = _cached(presentation_id)
+    if snapshot is None:
+        snapshot = _load(presentation_id)
+        if snapshot is not None:
+            _store(snapshot)
+    return snapshot
+
+
+async def aget_presentation_snapshot(presentation_id):
+    """Versión async: un acierto no sale del event loop; un fallo usa el ORM async."""
+    snapshot = _cached(presentation_id)
+    if snapshot is None:
+        snapshot = await _aload(presentation_id)
+        if snapshot is not None:
+            _store(snapshot)
+    return snapshot
+
+
+def _forget_product_link(snapshot):
+    ids = _by_product.get(snapshot.product_id)
+    if ids is not None:
+        ids.discard(snapshot.id)
+        if not ids:
+            del _by_product[snapshot.product_id]
+
+
+def discard_presentation(*presentation_ids):
+    with _lock:
+        for presentation_id in presentation_ids:
+            snapshot = _entries.pop(presentation_id, None)
+            if snapshot is not None:
+                _forget_product_link(snapshot)
+
+
+def discard_product(*product_ids):
+    with _lock:
+        for product_id in product_ids:
+            for presentation_id in _by_product.pop(product_id, ()):
+                _entries.pop(presentation_id, None)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _by_product.clear()
+
+
+def cache_info():
+    with _lock:
+        return {**_stats, 'size': len(_entries), 'max_entries': MAX_ENTRIES}
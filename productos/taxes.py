@@ -0,0 +1,79 @@
+"""
+Resolución de impuestos vigentes por presentación y producto.
+
+Los impuestos de una presentación reemplazan por completo a los del producto
+base; si la presentación no tiene impuestos activos se heredan los del
+producto. Los conjuntos resueltos se guardan en la caché de Django por
+presentación y por producto durante CATALOG_CACHE_TIMEOUT segundos, y se
+invalidan desde productos.signals.
+"""
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PresentationTax, ProductTax
+
+
+class TaxRule(NamedTuple):
+    tax_type: str
+    name: str
+    rate: Decimal
+    is_included: bool
+    tax_base: Optional[Decimal]
+
+
+def _presentation_key(presentation_id):
+    return f'productos:taxes:presentation:{presentation_id}'
+
+
+def _product_key(product_id):
+    return f'productos:taxes:product:{product_id}'
+
+
+def _load(model, owner_field, ids, key):
+    """Lee de la caché los conjuntos de `ids` y consulta solo los faltantes."""
+    cached = cache.get_many([key(pk) for pk in ids])
+    result = {pk: cached[key(pk)] for pk in ids if key(pk) in cached}
+    missing = [pk for pk in ids if pk not in result]
+    if missing:
+        loaded = {pk: [] for pk in missing}
+        rows = model.objects.filter(**{f'{owner_field}__in': missing, 'is_active': True}).order_by(
+            owner_field, 'tax_type', 'pk'
+        ).values_list(owner_field, 'tax_type', 'name', 'rate', 'is_included', 'tax_base')
+        for owner_id, *rule in rows:
+            loaded[owner_id].append(TaxRule(*rule))
+        cache.set_many({key(pk): rules for pk, rules in loaded.items()}, settings.CATALOG_CACHE_TIMEOUT)
+        result.update(loaded)
+    return result
+
+
+def resolve_tax_rules(pairs):
+    """
+    Recibe pares (presentation_id | None, product_id) y retorna un dict
+    {par: [TaxRule, ...]} con el conjunto de impuestos vigente de cada uno.
+    A lo sumo dos consultas, solo por lo que no esté en caché.
+    """
+    pairs = set(pairs)
+    by_presentation = _load(
+        PresentationTax, 'presentation_id',
+        {presentation_id for presentation_id, _ in pairs if presentation_id}, _presentation_key,
+    )
+    needs_product = {
+        product_id for presentation_id, product_id in pairs
+        if product_id and not by_presentation.get(presentation_id)
+    }
+    by_product = _load(ProductTax, 'product_id', needs_product, _product_key)
+    return {
+        (presentation_id, product_id): by_presentation.get(presentation_id) or by_product.get(product_id, [])
+        for presentation_id, product_id in pairs
+    }
+
+
+def invalidate_presentation_taxes(*presentation_ids):
+    cache.delete_many([_presentation_key(pk) for pk in presentation_ids])
+
+
+def invalidate_product_taxes(*product_ids):
+    cache.delete_many([_product_key(pk) for pk in product_ids])
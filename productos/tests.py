@@ -1,3 +1,390 @@
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Value
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventario.models import ProductStock, StockItem, Warehouse
+
+from . import scan
+from .bulk import bulk_upsert_presentations
+from .catalog import ENTITIES
+from .categories import get_category_tree
+from .margins import category_margins, product_margins
+from .search import search_products
+from .models import PresentationTax, PresentationVolumePricing, Product, ProductCategory, ProductPresentation
+
+
+class CatalogTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(sku='P1', name='Gaseosa')
+        cls.presentation = ProductPresentation.objects.create(
+            product=cls.product, sku='P1-UN', name='Unidad', unit_of_measure='unit',
+            cost=Decimal('1.00'), base_price=Decimal('2.50'),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+
+class PriceQuoteTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        PresentationVolumePricing.objects.create(
+            presentation=cls.presentation, min_quantity=Decimal('12'), price=Decimal('2.00'),
+        )
+
+    def quote(self, lines):
+        return self.client.post(
+            reverse('productos:price_quote'), json.dumps({'lines': lines}), content_type='application/json',
+        )
+
+    def test_string_ids_from_invoice_form(self):
+        # quotePrices() envía el valor del <select>, que es texto
+        response = self.quote([
+            {'presentation': str(self.presentation.pk), 'quantity': '12'},
+            {'presentation': str(self.presentation.pk), 'quantity': '1'},
+            {'product': str(self.product.pk), 'quantity': '1'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['lines'], [
+            {'unit_price': '2.00', 'source': 'presentation_tier'},
+            {'unit_price': '2.50', 'source': 'base_price'},
+            {'unit_price': '0.00', 'source': 'base_price'},
+        ])
+
+    def test_unknown_presentation(self):
+        response = self.quote([{'presentation': '999999', 'quantity': '1'}])
+        self.assertEqual(response.json()['lines'], [{'unit_price': None, 'source': None}])
+
+    def test_invalid_input(self):
+        for line in (
+            {'presentation': 'abc', 'quantity': '1'},
+            {'presentation': 1.5, 'quantity': '1'},
+            {'presentation': str(self.presentation.pk), 'quantity': 'NaN'},
+            {'presentation': str(self.presentation.pk), 'quantity': 'x'},
+            {'presentation': str(self.presentation.pk), 'quantity': '-1'},
+        ):
+            with self.subTest(line=line):
+                self.assertEqual(self.quote([line]).status_code, 400)
+
+
+class SearchTests(CatalogTestCase):
+    def test_matches_presentation_description(self):
+        ProductPresentation.objects.create(
+            product=self.product, sku='P1-PK', name='Paquete', unit_of_measure='unit',
+            cost=Decimal('6.00'), base_price=Decimal('12.00'), description='Six pack retornable',
+        )
+        products, has_more = search_products('retornable')
+        self.assertEqual(products, [self.product])
+        self.assertFalse(has_more)
+
+
+class BulkUpsertTests(CatalogTestCase):
+    def rows(self, *rows):
+        return list(enumerate(rows, start=2))
+
+    def presentation_row(self, sku, **values):
+        return {
+            'sku': sku, 'product_sku': 'P1', 'name': sku, 'unit_of_measure': 'unit',
+            'cost': '1.00', 'base_price': '2.00', **values,
+        }
+
+    def test_creates_and_updates_by_sku(self):
+        result = bulk_upsert_presentations(self.rows(
+            self.presentation_row('P1-UN', base_price='3.00', is_default='0'),
+            self.presentation_row('P1-PK', is_default='1'),
+        ))
+        self.assertEqual((result.created, result.updated, result.errors), (1, 1, []))
+        self.presentation.refresh_from_db()
+        self.assertEqual(self.presentation.base_price, Decimal('3.00'))
+        self.assertTrue(ProductPresentation.objects.get(sku='P1-PK').is_default)
+
+    def test_single_default_per_product(self):
+        self.presentation.is_default = True
+        self.presentation.save()
+        bulk_upsert_presentations(self.rows(self.presentation_row('P1-PK', is_default='1')))
+        self.presentation.refresh_from_db()
+        self.assertFalse(self.presentation.is_default)
+
+    def test_partial_update_keeps_other_fields(self):
+        result = bulk_upsert_presentations(self.rows(
+            {'sku': 'P1-UN', 'product_sku': 'P1', 'base_price': '4.00'},
+            {'sku': 'P1-NEW', 'product_sku': 'P1', 'base_price': '4.00'},
+        ))
+        self.assertEqual((result.created, result.updated), (0, 1))
+        self.assertEqual([error[1] for error in result.errors], ['P1-NEW'])
+        self.presentation.refresh_from_db()
+        self.assertEqual((self.presentation.base_price, self.presentation.cost), (Decimal('4.00'), Decimal('1.00')))
+
+    def test_bad_rows_are_reported(self):
+        result = bulk_upsert_presentations(self.rows(
+            self.presentation_row('P1-A', product_sku='NOPE'),
+            self.presentation_row('P1-B', cost='caro'),
+            self.presentation_row(''),
+            self.presentation_row('P1-C'),
+        ))
+        self.assertEqual(result.created, 1)
+        self.assertEqual([(number, sku) for number, sku, _ in result.errors], [(2, 'P1-A'), (3, 'P1-B'), (4, '')])
+
+    def test_new_product_gets_has_presentations(self):
+        other = Product.objects.create(sku='P2', name='Agua')
+        bulk_upsert_presentations(self.rows(self.presentation_row('P2-UN', product_sku='P2')))
+        other.refresh_from_db()
+        self.assertTrue(other.has_presentations)
+
+    def test_moving_a_presentation_refreshes_both_products(self):
+        self.presentation.is_default = True
+        self.presentation.save()
+        other = Product.objects.create(sku='P2', name='Agua')
+        ProductPresentation.objects.create(
+            product=other, sku='P2-UN', name='Botella', unit_of_measure='unit', is_default=True,
+            cost=Decimal('1.00'), base_price=Decimal('2.00'),
+        )
+        warehouse = Warehouse.objects.create(name='Principal', code='W1')
+        StockItem.objects.create(warehouse=warehouse, presentation=self.presentation, quantity=Decimal('5'))
+
+        with mock.patch('productos.bulk.discard_product') as discard, self.captureOnCommitCallbacks(execute=True):
+            result = bulk_upsert_presentations(self.rows({'sku': 'P1-UN', 'product_sku': 'P2', 'base_price': '3.00'}))
+        self.assertEqual((result.updated, result.errors), (1, []))
+        self.assertEqual(set(discard.call_args.args), {self.product.pk, other.pk})
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.has_presentations)
+        self.assertEqual(list(other.presentations.filter(is_default=True).values_list('sku', flat=True)), ['P1-UN'])
+        stock = dict(ProductStock.objects.values_list('product__sku', 'quantity'))
+        self.assertEqual(stock, {'P1': Decimal('0'), 'P2': Decimal('5')})
+
+    def test_constant_number_of_queries(self):
+        counts = []
+        # 20 filas caben en un INSERT aun con el límite de parámetros de SQLite
+        for prefix, count in (('A', 3), ('B', 20)):
+            rows = self.rows(*(self.presentation_row(f'{prefix}-{i}') for i in range(count)))
+            with CaptureQueriesContext(connection) as queries:
+                bulk_upsert_presentations(rows)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CatalogRoundTripTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.product.category = ProductCategory.objects.create(name='Bebidas', code='BEB')
+        cls.product.description = 'Línea 1, "con comillas"\nLínea 2'
+        cls.product.save()
+        PresentationTax.objects.create(presentation=cls.presentation, tax_type='iva', name='IVA 19%', rate=Decimal('19'))
+        PresentationVolumePricing.objects.create(
+            presentation=cls.presentation, min_quantity=Decimal('12'), price=Decimal('2.00'),
+        )
+
+    def export(self, entity, fmt):
+        fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command('export_catalog', entity, '--output', path, stderr=StringIO())
+        return path
+
+    def snapshot(self):
+        return {
+            'product': Product.objects.values('sku', 'name', 'description', 'category__code').get(),
+            'presentation': ProductPresentation.objects.values('sku', 'name', 'cost', 'base_price').get(),
+            'taxes': list(PresentationTax.objects.values_list('presentation__sku', 'name', 'rate')),
+            'tiers': list(PresentationVolumePricing.objects.values_list('presentation__sku', 'min_quantity', 'price')),
+        }
+
+    def test_export_then_import_restores_the_catalog(self):
+        expected = self.snapshot()
+        for fmt in ('csv', 'jsonl'):
+            with self.subTest(fmt=fmt):
+                files = {entity: self.export(entity, fmt) for entity in ENTITIES}
+                Product.objects.update(name='Otro', description='')
+                ProductPresentation.objects.update(base_price=Decimal('9.99'))
+                PresentationTax.objects.update(rate=Decimal('5'))
+                PresentationVolumePricing.objects.all().delete()
+
+                for entity, path in files.items():
+                    call_command('import_catalog', entity, path, stdout=StringIO(), stderr=StringIO())
+                self.assertEqual(self.snapshot(), expected)
+
+    def test_children_are_replaced_not_appended(self):
+        path = self.export('presentation_tiers', 'csv')
+        for _ in range(2):
+            call_command('import_catalog', 'presentation_tiers', path, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(PresentationVolumePricing.objects.count(), 1)
+
+    def test_unknown_references_are_reported(self):
+        path = self.export('presentations', 'jsonl')
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps({'sku': 'X-1', 'product_sku': 'NOPE', 'name': 'X'}) + '\n')
+        err = StringIO()
+        call_command('import_catalog', 'presentations', path, stdout=StringIO(), stderr=err)
+        self.assertIn('X-1', err.getvalue())
+        self.assertFalse(ProductPresentation.objects.filter(sku='X-1').exists())
+
+    def test_invalid_child_rows_are_reported_per_row(self):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        tax = {'presentation_sku': 'P1-UN', 'tax_type': 'iva', 'name': 'IVA 5%', 'rate': '5'}
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            for row in (['P1-UN', 'iva'], {**tax, 'rate': '150'}, {**tax, 'tax_type': 'otro'}, {**tax, 'rate': ''}, tax):
+                fh.write(json.dumps(row) + '\n')
+        err = StringIO()
+        call_command('import_catalog', 'presentation_taxes', path, stdout=StringIO(), stderr=err)
+        self.assertEqual([line.split()[1] for line in err.getvalue().splitlines()], ['1', '2', '3', '4'])
+        self.assertEqual(list(PresentationTax.objects.values_list('name', 'rate')), [('IVA 5%', Decimal('5'))])
+
+    def test_non_object_lines_are_reported(self):
+        path = self.export('presentations', 'jsonl')
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write('"P1-X"\n')
+        err = StringIO()
+        call_command('import_catalog', 'presentations', path, stdout=StringIO(), stderr=err)
+        self.assertIn('se esperaba un objeto', err.getvalue())
+
+
+class MarginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.food = ProductCategory.objects.create(name='Ofertas', code='OF1')
+        cls.cleaning = ProductCategory.objects.create(name='Ofertas', code='OF2')
+        costed = Product.objects.create(sku='P1', name='Arroz', category=cls.food, cost=Decimal('10'))
+        ProductPresentation.objects.create(
+            product=costed, sku='P1-UN', name='Unidad', unit_of_measure='unit',
+            cost=Decimal('1.00'), base_price=Decimal('1.50'),
+        )
+        uncosted = Product.objects.create(sku='P2', name='Frijol', category=cls.food, cost=Decimal('10'))
+        ProductPresentation.objects.create(
+            product=uncosted, sku='P2-UN', name='Unidad', unit_of_measure='unit',
+            cost=Decimal('0'), base_price=Decimal('3.00'),
+        )
+        Product.objects.create(
+            sku='P3', name='Jabón', category=cls.cleaning, cost=Decimal('4'), base_price=Decimal('5'),
+        )
+
+    def test_categories_with_same_name_stay_apart(self):
+        rows = {row['category_id']: row for row in category_margins()}
+        self.assertEqual(rows[self.food.pk]['products'], 2)
+        self.assertEqual(rows[self.cleaning.pk]['products'], 1)
+        self.assertEqual(rows[self.cleaning.pk]['max_margin'], Decimal('25'))
+
+    def test_presentations_without_cost_count_as_without_cost(self):
+        rows = {row['category_id']: row for row in category_margins()}
+        self.assertEqual(rows[self.food.pk]['without_cost'], 1)
+        self.assertEqual(rows[self.cleaning.pk]['without_cost'], 0)
+
+    def test_annotation_matches_the_model_method(self):
+        for product in product_margins():
+            with self.subTest(sku=product.sku):
+                self.assertAlmostEqual(product.margin, product.calculate_profit_margin(), places=6)
+
+    def test_unrelated_margin_annotation_is_ignored(self):
+        product = Product.objects.annotate(margin=Value(Decimal('99'))).get(sku='P3')
+        self.assertEqual(product.calculate_profit_margin(), Decimal('25'))
+
+    def test_report_lists_each_category(self):
+        out = StringIO()
+        call_command('margin_report', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all(line.startswith('Ofertas') for line in lines))
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.food = ProductCategory.objects.create(name='Alimentos', code='ALI')
+        self.drinks = ProductCategory.objects.create(name='Bebidas', code='BEB', parent=self.food)
+
+    def test_tree_is_cached(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+        self.assertEqual([node['code'] for node in tree], ['ALI'])
+        self.assertEqual([node['code'] for node in tree[0]['children']], ['BEB'])
+
+    def test_edit_replaces_cached_tree(self):
+        get_category_tree()
+        self.drinks.parent = None
+        self.drinks.save()
+        self.assertEqual([node['code'] for node in get_category_tree()], ['ALI', 'BEB'])
+
+    def test_moves_rewrite_descendant_paths(self):
+        soda = ProductCategory.objects.create(name='Gaseosas', code='GAS', parent=self.drinks)
+        other = ProductCategory.objects.create(name='Otros', code='OTR')
+        self.drinks.parent = other
+        self.drinks.save()
+        soda.refresh_from_db()
+        self.assertTrue(soda.path.startswith(other.path))
+        self.assertEqual(soda.depth, 2)
+        self.assertEqual(list(other.get_descendants(include_self=False).order_by('path')), [self.drinks, soda])
+
+
+class ScanIndexTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.presentation.barcode = '7701234567890'
+        self.presentation.save()
+        scan.rebuild()
+
+    def test_lookup_from_memory(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(scan.lookup(' 7701234567890 '), self.presentation.pk)
+            self.assertEqual(scan.lookup('P1-UN'), self.presentation.pk)
+
+    def test_signals_keep_index_current(self):
+        self.presentation.barcode = '7709999999999'
+        self.presentation.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(scan.lookup('7709999999999'), self.presentation.pk)
+        self.assertIsNone(scan.lookup('7701234567890'))
+
+    def test_stale_index_rebuilds_in_background(self):
+        scan._built_at = time.monotonic() - scan.MAX_AGE - 1
+        with mock.patch.object(scan.threading, 'Thread') as thread:
+            # Se sigue respondiendo con el índice anterior, sin esperar a la base
+            with self.assertNumQueries(0):
+                self.assertEqual(scan.lookup('7701234567890'), self.presentation.pk)
+                self.assertEqual(scan.lookup('P1-UN'), self.presentation.pk)
+        # Una sola reconstrucción a la vez
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        scan._rebuilding = False
+
+    def test_scan_endpoint(self):
+        warehouse = Warehouse.objects.create(name='Principal', code='W1')
+        StockItem.objects.create(warehouse=warehouse, presentation=self.presentation, quantity=Decimal('8'))
+        response = self.client.get(
+            reverse('productos:presentation_scan'), {'code': '7701234567890', 'warehouse': warehouse.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['presentation'], data['unit_price']), (self.presentation.pk, '2.50'))
+        self.assertEqual(data['available_stock'], '8.000')
+        response = self.client.get(reverse('productos:presentation_scan'), {'code': 'NO-EXISTE'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_presentation_detail_endpoint(self):
+        response = self.client.get(reverse('productos:presentation_detail', args=[self.presentation.pk]))
+        self.assertEqual(response.json()['sku'], 'P1-UN')
+        response = self.client.get(reverse('productos:presentation_detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
 
-# Create your tests here.
+    def test_scan_rejects_invalid_quantity(self):
+        for quantity in ('NaN', 'Infinity', '-inf', 'x', '0', '-3'):
+            with self.subTest(quantity=quantity):
+                response = self.client.get(
+                    reverse('productos:presentation_scan'), {'code': 'P1-UN', 'quantity': quantity},
+                )
+                self.assertEqual(response.status_code, 400)
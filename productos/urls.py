@@ -1,10 +1,14 @@
 from django.urls import path
-from .views import product_presentation_detail
+from .views import category_tree, presentation_scan, price_quote, product_presentation_detail, product_search
 
 app_name = 'productos'
 
 urlpatterns = [
     path('api/presentaciones/<int:pk>/', product_presentation_detail, name='presentation_detail'),
+    path('api/escanear/', presentation_scan, name='presentation_scan'),
+    path('api/buscar/', product_search, name='product_search'),
+    path('api/precios/', price_quote, name='price_quote'),
+    path('api/categorias/', category_tree, name='category_tree'),
 ]
 
 
@@ -1,20 +1,149 @@
+import json
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse, Http404
-from .models import ProductPresentation
+from django.views.decorators.http import require_POST
+from inventario.models import StockItem
+from .categories import get_category_tree
+from .pricing import resolve_unit_prices
+from .scan import alookup
+from .search import search_products
+from .snapshots import aget_presentation_snapshot
+
+
+async def product_presentation_detail(request, pk: int):
+    # Se sirve desde la caché en memoria; solo un fallo consulta la base (ORM async)
+    snapshot = await aget_presentation_snapshot(pk)
+    if snapshot is None:
+        raise Http404
+    return JsonResponse(snapshot.as_dict())
+
 
+async def presentation_scan(request):
+    """
+    Resuelve un código leído en caja (barras, SKU o código interno) a la línea
+    de factura lista para agregar.
 
-def product_presentation_detail(request, pk: int):
+    GET ?code=7701234567890&warehouse=<id>&quantity=1
+    """
     try:
-        p = ProductPresentation.objects.select_related('product').get(pk=pk)
-    except ProductPresentation.DoesNotExist:
+        quantity = _quantity(request.GET.get('quantity') or '1')
+        if not quantity:
+            raise ValueError(quantity)
+        warehouse_id = int(request.GET['warehouse']) if request.GET.get('warehouse') else None
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'error': 'Solicitud inválida'}, status=400)
+    presentation_id = await alookup(request.GET.get('code'))
+    snapshot = await aget_presentation_snapshot(presentation_id) if presentation_id else None
+    if snapshot is None:
         raise Http404
+
+    # Los tramos suelen salir de la caché de Django; un fallo consulta la base
+    resolved = (await sync_to_async(resolve_unit_prices)([(snapshot.id, snapshot.product_id, quantity)]))[0]
     data = {
-        'id': p.id,
-        'sku': p.sku or '',
-        'name': p.name,
-        'product_name': p.product.name,
-        'unit_price': str(p.base_price or 0),
-        'unit_of_measure': p.unit_of_measure,
+        'presentation': snapshot.id,
+        'product': snapshot.product_id,
+        'sku': snapshot.sku or '',
+        'name': snapshot.product_name,
+        'presentation_name': snapshot.name,
+        'unit_of_measure': snapshot.unit_of_measure,
+        'quantity': str(quantity),
+        'unit_price': str(resolved[0] if resolved else snapshot.base_price),
+        'price_source': resolved[1] if resolved else None,
+        'taxes': snapshot.as_dict()['taxes'],
     }
+    if warehouse_id is not None:
+        # El stock cambia con cada venta: siempre se lee de la base (una fila por índice único)
+        stock = await StockItem.objects.filter(
+            warehouse_id=warehouse_id, presentation_id=snapshot.id,
+        ).values_list('quantity', 'reserved_quantity').afirst()
+        data['warehouse'] = warehouse_id
+        data['available_stock'] = str(stock[0] - stock[1]) if stock else '0.000'
     return JsonResponse(data)
 
+
+def product_search(request):
+    """
+    Búsqueda de catálogo paginada y ordenada por relevancia.
+
+    GET ?q=gaseosa cola&tag=bebidas&tag=promo&page=1&warehouse=<id>&category=<id>
+    """
+    try:
+        page = int(request.GET.get('page') or 1)
+        warehouse_id = int(request.GET['warehouse']) if request.GET.get('warehouse') else None
+        category_id = int(request.GET['category']) if request.GET.get('category') else None
+    except ValueError:
+        return JsonResponse({'error': 'Solicitud inválida'}, status=400)
+    products, has_next = search_products(
+        q=request.GET.get('q', ''), tags=request.GET.getlist('tag'), page=page,
+        warehouse=warehouse_id, category=category_id,
+    )
+    results = [
+        {
+            'id': p.pk,
+            'sku': p.sku,
+            'name': p.name,
+            'brand': p.brand,
+            'category': p.category.name if p.category else None,
+            'base_price': str(p.base_price),
+            'unit_of_measure': p.unit_of_measure,
+            'tags': p.get_tags_list(),
+            'available_stock': str(p.available_stock),
+            'needs_restock': p.needs_restock,
+            'rank': round(p.rank, 4) if hasattr(p, 'rank') else None,
+        }
+        for p in products
+    ]
+    return JsonResponse({'results': results, 'page': page, 'has_next': has_next})
+
+
+def category_tree(request):
+    """Árbol completo de categorías (desde caché)."""
+    return JsonResponse({'categories': get_category_tree()})
+
+
+def _optional_id(value):
+    # El formulario envía el valor del <select> como texto
+    if value in (None, ''):
+        return None
+    if isinstance(value, (bool, float)):
+        raise ValueError(value)
+    return int(value)
+
+
+def _quantity(value):
+    # Un renglón vacío del formulario cotiza con cantidad cero
+    quantity = Decimal(str(value or '0'))
+    if not quantity.is_finite() or quantity < 0:
+        raise ValueError(value)
+    return quantity
+
+
+@require_POST
+def price_quote(request):
+    """
+    Precios unitarios de un carrito según los tramos por volumen.
+
+    {"lines": [{"presentation": id, "quantity": "12"}, {"product": id, "quantity": "3"}]}
+    -> {"lines": [{"unit_price": "2.40", "source": "presentation_tier"}, ...]}
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        lines = [
+            (_optional_id(line.get('presentation')), _optional_id(line.get('product')), _quantity(line.get('quantity')))
+            for line in payload.get('lines') or []
+        ]
+    except (ValueError, AttributeError, TypeError, InvalidOperation):
+        return JsonResponse({'errors': {'__all__': ['Solicitud inválida']}}, status=400)
+
+    results = []
+    for resolved in resolve_unit_prices(lines):
+        if resolved is None:
+            results.append({'unit_price': None, 'source': None})
+        else:
+            price, source = resolved
+            results.append({'unit_price': str(price), 'source': source})
+    return JsonResponse({'lines': results})
+
 # Create your views here.